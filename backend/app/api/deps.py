@@ -1,4 +1,4 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 import uuid
 
@@ -8,10 +8,11 @@ from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_engine, engine
 from app.models import TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -24,11 +25,17 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def _token_user_id(token: str) -> uuid.UUID:
     try:
         secret = settings.JWT_SECRET_KEY or settings.SECRET_KEY
         alg = settings.JWT_ALGORITHM
@@ -39,15 +46,27 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user_id = uuid.UUID(token_data.sub) if isinstance(token_data.sub, str) else token_data.sub
-    user = session.get(User, user_id)
+    return uuid.UUID(token_data.sub) if isinstance(token_data.sub, str) else token_data.sub
+
+
+def _active_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
+
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    return _active_user(session.get(User, _token_user_id(token)))
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    """get_current_user for async handlers, without a threadpool hop."""
+    return _active_user(await session.get(User, _token_user_id(token)))
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
     if not current_user.is_superuser:
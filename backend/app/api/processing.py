@@ -1,13 +1,25 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Body, status
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Body, Header, Query, Request, status
+from fastapi.responses import FileResponse, Response
 from sqlmodel import Session
 from typing import List, Optional
-from pydantic import BaseModel, validator
+from pathlib import Path
+from pydantic import BaseModel, ValidationError, validator
 from app.api.deps import SessionDep, CurrentUser
 from app.core.config import settings
 from app.core.utils import get_supported_formats
+from app.core.image_pipeline import IMAGE_OPERATIONS, output_format
+from app.core.image_profiles import PROFILES
+from app.core.ocr import OCR_INPUTS
+from app.core.pdf_engine import parse_page_ranges
+from app.core.thumbnails import ensure_thumbnails, file_hash, page_count
 from app.models import Job
 from app.core.job_manager import manager as job_manager
+from app.core.audit import audit
+from app.core.file_refs import FileReferenceError, link_into, temp_upload
 import os
+import json
+import asyncio
+import shutil
 import uuid
 
 
@@ -18,10 +30,26 @@ def _get_job(session: Session, job_id: str) -> Job | None:
         return None
 
 
+def _temp_upload(file_id: str) -> Path:
+    """Resolve a fileId returned by POST /upload to the stored file."""
+    try:
+        return temp_upload(file_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileReferenceError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+def _batch_name(batch_dir: Path, filename: str, index: int) -> str:
+    """Filename inside a batch directory, prefixed only if the name is taken."""
+    return f"{index:05d}_{filename}" if (batch_dir / filename).exists() else filename
+
+
 router = APIRouter()
 
 
 class PdfCrop(BaseModel):
+    """Points from the top-left corner of the page as displayed."""
     x: float
     y: float
     width: float
@@ -56,11 +84,91 @@ class ProcessOperationPayload(BaseModel):
     output: Optional[str] = None
     type: str
     outputFormat: Optional[str] = None
+    options: Optional[dict] = None
+
+
+class ImageOperation(BaseModel):
+    op: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    scale: Optional[float] = None
+    fit: Optional[str] = None
+    upscale: bool = False
+    quality: Optional[int] = None
+    profile: Optional[str] = None
+    format: Optional[str] = None
+
+    @validator("op")
+    def validate_op(cls, value):
+        if value not in IMAGE_OPERATIONS:
+            raise ValueError(f"Operation must be one of {', '.join(IMAGE_OPERATIONS)}.")
+        return value
+
+    @validator("format")
+    def validate_format(cls, value):
+        if value and value.lower() not in get_supported_formats()['image']['output']:
+            raise ValueError(f"Unsupported image output format: {value}")
+        return value.lower() if value else value
+
+    @validator("profile")
+    def validate_profile(cls, value):
+        if value and value not in PROFILES:
+            raise ValueError(f"Profile must be one of {', '.join(PROFILES)}.")
+        return value
+
+    @validator("quality")
+    def validate_quality(cls, value):
+        if value is not None and not 1 <= value <= 100:
+            raise ValueError("Quality must be between 1 and 100.")
+        return value
+
+
+class ThumbnailRequest(BaseModel):
+    pages: List[int]
+    size: int = 180
+
+
+class ImageBatchPayload(BaseModel):
+    inputs: List[str]
+    operations: List[ImageOperation]
+    output: Optional[str] = None
+
+
+def _image_operations(operation: str, payload: ProcessOperationPayload) -> List[dict]:
+    """Operation list for a single-image request: explicit list or one op from options."""
+    options = dict(payload.options or {})
+    raw = options.pop('operations', None) or [{'op': operation, **options}]
+    if payload.outputFormat:
+        raw.append({'op': 'convert', 'format': payload.outputFormat})
+    try:
+        return [ImageOperation(**op).dict(exclude_none=True) for op in raw]
+    except (ValidationError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _create_image_batch(session: Session, current_user, operations: List[dict], output: Optional[str]) -> Job:
+    fmt = output_format(operations, '')
+    job = Job(
+        input_filename='batch',
+        output_filename=output or 'images.zip',
+        input_format=fmt or 'image',
+        output_format='zip',
+        operation='image_batch',
+        options={'operations': operations},
+        user_id=current_user.id,
+        status='pending',
+        progress=0
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
 
 @router.post('/pdf/merge', status_code=status.HTTP_200_OK)
 async def merge_pdf(
+    request: Request,
     current_user: CurrentUser,
-    session: Session = Depends(SessionDep),
+    session: SessionDep,
     recipe: PdfMergeRecipe = Body(...),
 ):
     """Create a new PDF merge job from a recipe."""
@@ -68,30 +176,47 @@ async def merge_pdf(
     print(f"Output filename: {recipe.outputFilename}")
     print(f"Number of pages to merge: {len(recipe.pages)}")
     
-    # Create a NEW job for the merge operation
+    # link each source PDF into the job directory once, however many pages it gives
+    job_id = uuid.uuid4()
+    sources_dir = settings.UPLOAD_DIR / str(job_id) / 'sources'
+    sources = {}
+    for page in recipe.pages:
+        if page.sourceFileId not in sources:
+            sources[page.sourceFileId] = link_into(
+                _temp_upload(page.sourceFileId), sources_dir, f"{page.sourceFileId}.pdf"
+            )
+
     job = Job(
-        input_filename="merge_operation",  # Generic name since merging multiple files
+        id=job_id,
+        input_filename="sources",  # directory of the source PDFs
         output_filename=recipe.outputFilename,
         input_format="pdf",
         output_format="pdf",
+        operation="pdf_merge",
+        options={
+            "pages": [
+                {
+                    "source": p.sourceFileId,
+                    "page": p.sourcePageIndex,
+                    "rotate": p.transformations.rotate,
+                    "crop": p.transformations.crop.dict() if p.transformations.crop else None,
+                }
+                for p in recipe.pages
+            ]
+        },
+        file_size=sum(path.stat().st_size for path in sources.values()),
         user_id=current_user.id,
         status='pending',
         progress=0
     )
     
-    # Store the merge recipe as JSON in the job (optional - for processing later)
-    job.metadata = {
-        "type": "merge",
-        "recipe": recipe.dict(),
-        "source_files": list(set(p.sourceFileId for p in recipe.pages))
-    }
-    
     session.add(job)
     session.commit()
     session.refresh(job)
     
     # Enqueue for background processing
     job_manager.enqueue(str(job.id))
+    audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation, sources=len(sources))
     
     return {
         'jobId': str(job.id),
@@ -102,8 +227,9 @@ async def merge_pdf(
 
 @router.post('/upload')
 def upload_file(
+    request: Request,
     current_user: CurrentUser,
-    session: Session = Depends(SessionDep),
+    session: SessionDep,
     file: UploadFile = File(...),
 ):
     # store into TEMP_DIR
@@ -113,9 +239,12 @@ def upload_file(
     target = settings.TEMP_DIR / file_id
     os.makedirs(target, exist_ok=True)
     path = target / file.filename
+    size = 0
     with path.open('wb') as buffer:
         for chunk in iter(lambda: file.file.read(1024*64), b''):
+            size += len(chunk)
             buffer.write(chunk)
+    audit.record('file.upload', current_user.id, 'file', file_id, request, filename=file.filename, size=size)
     return {'fileId': file_id, 'filename': file.filename}
 
 
@@ -127,19 +256,103 @@ def get_operations(type: str):
     if type not in formats:
         return []
     if type == 'pdf':
-        return ['merge', 'split', 'compress']
+        return ['merge', 'split', 'compress', 'ocr']
     if type == 'image':
-        return ['resize', 'compress', 'convert']
+        return ['resize', 'compress', 'convert', 'ocr']
     return ['convert']
 
 
 @router.post('/{operation}')
 def process_operation(
     operation: str,
+    request: Request,
     current_user: CurrentUser,
-    session: Session = Depends(SessionDep),
+    session: SessionDep,
     payload: ProcessOperationPayload = Body(...),
 ):
+    # image operations run in-process on the uploaded file
+    if payload.type.lower() == 'image' and operation in IMAGE_OPERATIONS:
+        source = _temp_upload(payload.input)
+        operations = _image_operations(operation, payload)
+        fmt = output_format(operations, source.suffix[1:])
+        job = Job(
+            input_filename=source.name,
+            output_filename=payload.output or f"{source.stem}_{operation}.{fmt}",
+            input_format=source.suffix[1:].lower(),
+            output_format=fmt,
+            operation='image',
+            options={'operations': operations},
+            file_size=source.stat().st_size,
+            user_id=current_user.id
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        link_into(source, settings.UPLOAD_DIR / str(job.id))
+        job_manager.enqueue(str(job.id))
+        audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation)
+        return {'data': {'jobId': str(job.id)}}
+
+    # OCR of scans and PDFs into a searchable PDF or plain text
+    if operation == 'ocr':
+        source = _temp_upload(payload.input)
+        if source.suffix[1:].lower() not in OCR_INPUTS:
+            raise HTTPException(status_code=400, detail=f'Cannot OCR {source.suffix[1:]} files')
+        fmt = (payload.outputFormat or 'pdf').lower()
+        if fmt not in ['pdf', 'txt']:
+            raise HTTPException(status_code=400, detail='OCR output must be pdf or txt')
+        job = Job(
+            input_filename=source.name,
+            output_filename=payload.output or f"{source.stem}_ocr.{fmt}",
+            input_format=source.suffix[1:].lower(),
+            output_format=fmt,
+            operation='ocr',
+            options={name: bool(value) for name, value in (payload.options or {}).items()
+                     if name in ('preprocess', 'use_text_layer')} or None,
+            file_size=source.stat().st_size,
+            user_id=current_user.id
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        link_into(source, settings.UPLOAD_DIR / str(job.id))
+        job_manager.enqueue(str(job.id))
+        audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation)
+        return {'data': {'jobId': str(job.id)}}
+
+    # PDF split/compress copy pages and objects rather than converting
+    if payload.type.lower() == 'pdf' and operation in ['split', 'compress']:
+        source = _temp_upload(payload.input)
+        options = payload.options or {}
+        if operation == 'split':
+            if options.get('ranges'):
+                try:
+                    parse_page_ranges(str(options['ranges']))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            job_options = {'ranges': options.get('ranges'), 'every': options.get('every')}
+            output_filename = payload.output or f"{source.stem}_split.zip"
+        else:
+            job_options = {'dpi': options.get('dpi'), 'quality': options.get('quality')}
+            output_filename = payload.output or f"{source.stem}_compressed.pdf"
+        job = Job(
+            input_filename=source.name,
+            output_filename=output_filename,
+            input_format='pdf',
+            output_format=output_filename.rsplit('.', 1)[-1].lower(),
+            operation=f'pdf_{operation}',
+            options={k: v for k, v in job_options.items() if v is not None},
+            file_size=source.stat().st_size,
+            user_id=current_user.id
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        link_into(source, settings.UPLOAD_DIR / str(job.id))
+        job_manager.enqueue(str(job.id))
+        audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation)
+        return {'data': {'jobId': str(job.id)}}
+
     # create a job that will be processed by the job manager
     input_filename = payload.input
     output_filename = payload.output if payload.output else f"{input_filename.rsplit('.',1)[0]}_{operation}.out"
@@ -155,14 +368,83 @@ def process_operation(
     session.commit()
     session.refresh(job)
     job_manager.enqueue(str(job.id))
+    audit.record('job.create', current_user.id, 'job', job.id, request, operation=operation)
     return {'data': {'jobId': str(job.id)}}
 
 
+@router.post('/image/batch')
+def image_batch(
+    request: Request,
+    current_user: CurrentUser,
+    session: SessionDep,
+    payload: ImageBatchPayload = Body(...),
+):
+    """Run one operation list over many uploaded images as a single job."""
+    if not payload.inputs:
+        raise HTTPException(status_code=400, detail='No inputs')
+    if len(payload.inputs) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f'Batch limited to {settings.MAX_BATCH_FILES} files')
+    sources = [_temp_upload(file_id) for file_id in payload.inputs]
+    operations = [op.dict(exclude_none=True) for op in payload.operations]
+
+    job = _create_image_batch(session, current_user, operations, payload.output)
+    batch_dir = settings.UPLOAD_DIR / str(job.id) / job.input_filename
+    for index, source in enumerate(sources):
+        link_into(source, batch_dir, _batch_name(batch_dir, source.name, index))
+    job.file_size = sum(source.stat().st_size for source in sources)
+    session.add(job)
+    session.commit()
+    job_manager.enqueue(str(job.id))
+    audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation, count=len(sources))
+    return {'data': {'jobId': str(job.id), 'count': len(sources)}}
+
+
+@router.post('/image/batch/upload')
+def image_batch_upload(
+    request: Request,
+    current_user: CurrentUser,
+    session: SessionDep,
+    files: List[UploadFile] = File(...),
+    operations: str = Form(...),
+    output: Optional[str] = Form(None),
+):
+    """Multipart variant of /image/batch: upload the images and the operation list together."""
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f'Batch limited to {settings.MAX_BATCH_FILES} files')
+    try:
+        parsed = [ImageOperation(**op).dict(exclude_none=True) for op in json.loads(operations)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f'Invalid operations: {e}')
+
+    job = _create_image_batch(session, current_user, parsed, output)
+    batch_dir = settings.UPLOAD_DIR / str(job.id) / job.input_filename
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    size = 0
+    for index, file in enumerate(files):
+        dest = batch_dir / _batch_name(batch_dir, Path(file.filename).name, index)
+        with dest.open('wb') as buffer:
+            for chunk in iter(lambda: file.file.read(1024*64), b''):
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    buffer.close()
+                    shutil.rmtree(settings.UPLOAD_DIR / str(job.id), ignore_errors=True)
+                    session.delete(job)
+                    session.commit()
+                    raise HTTPException(status_code=413, detail='Batch too large')
+                buffer.write(chunk)
+    job.file_size = size
+    session.add(job)
+    session.commit()
+    job_manager.enqueue(str(job.id))
+    audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation, count=len(files), size=size)
+    return {'data': {'jobId': str(job.id), 'count': len(files)}}
+
+
 @router.get('/jobs/{job_id}')
 def processing_job_status(
     job_id: str, 
     current_user: CurrentUser, 
-    session: Session = Depends(SessionDep)
+    session: SessionDep
 ):
     job = _get_job(session, job_id)
     if not job:
@@ -173,8 +455,9 @@ def processing_job_status(
 @router.get('/jobs/{job_id}/download')
 def processing_job_download(
     job_id: str, 
+    request: Request,
     current_user: CurrentUser, 
-    session: Session = Depends(SessionDep)
+    session: SessionDep
 ):
     from fastapi.responses import FileResponse
     from pathlib import Path
@@ -189,4 +472,61 @@ def processing_job_download(
     if not result_path.exists():
         raise HTTPException(status_code=404, detail='Result not found')
     
-    return FileResponse(str(result_path), filename=result_path.name)
\ No newline at end of file
+    audit.record('job.download', current_user.id, 'job', job_id, request, filename=result_path.name)
+    return FileResponse(str(result_path), filename=result_path.name)
+
+# thumbnails are addressed by the immutable uploaded file, so clients may keep them
+THUMBNAIL_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def _thumbnail_source(file_id: str) -> Path:
+    source = _temp_upload(file_id)
+    if source.suffix.lower() != '.pdf':
+        raise HTTPException(status_code=400, detail='Thumbnails are only available for PDFs')
+    return source
+
+
+async def _render_thumbnails(source: Path, pages: List[int], size: int):
+    try:
+        return await asyncio.to_thread(ensure_thumbnails, source, pages, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post('/files/{file_id}/thumbnails')
+async def prefetch_thumbnails(
+    file_id: str,
+    current_user: CurrentUser,
+    payload: ThumbnailRequest = Body(...),
+):
+    """Render the requested pages' thumbnails in parallel; returns their URLs."""
+    source = _thumbnail_source(file_id)
+    await _render_thumbnails(source, payload.pages, payload.size)
+    return {
+        'data': {
+            'pageCount': await asyncio.to_thread(page_count, source),
+            'thumbnails': [
+                {'page': page, 'url': f"{settings.API_V1_STR}/processing/files/{file_id}/thumbnails/{page}?size={payload.size}"}
+                for page in payload.pages
+            ],
+        }
+    }
+
+
+@router.get('/files/{file_id}/thumbnails/{page}')
+async def get_thumbnail(
+    file_id: str,
+    page: int,
+    current_user: CurrentUser,
+    size: int = Query(180),
+    if_none_match: Optional[str] = Header(None),
+):
+    source = _thumbnail_source(file_id)
+    etag = f'"{await asyncio.to_thread(file_hash, source)}-{page}-{size}"'
+    headers = {'ETag': etag, 'Cache-Control': THUMBNAIL_CACHE_CONTROL}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    paths = await _render_thumbnails(source, [page], size)
+    return FileResponse(str(paths[page]), media_type='image/webp', headers=headers)
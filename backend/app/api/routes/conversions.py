@@ -1,13 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Form
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Form, BackgroundTasks, Request, Body
+from fastapi.responses import Response
 from sqlmodel import Session
 from app.core.utils import get_supported_formats
 from app.core.config import settings
 from app.api.deps import get_db, CurrentUser, SessionDep
 from app.models import Job
 from app.core.job_manager import manager as job_manager
+from app.core.image_profiles import PROFILES, get_profile
+from app.core.fast_paths import get_fast_path, run_fast_path
+from app.core.inline import InlineConversionError, InlineTooLargeError, convert_bytes, inline_tool
+from app.core.cpu_budget import CpuAllocation
+from app.core.db import engine
+from app.core.audit import audit
+from app.core.file_refs import FileReferenceError, link_into, resolve
+from app.schemas.job import BatchConversionRequest
 import os
 import logging
+import mimetypes
+import shutil
+import uuid
+from datetime import datetime
 from pathlib import Path
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,27 +33,76 @@ def get_formats():
     return get_supported_formats()
 
 
+def _convert_inline(job: Job, source: Path) -> bool:
+    """Run a fast path conversion for `job` now; False leaves it to the queue."""
+    result_dir = Path(settings.RESULTS_DIR) / str(job.id)
+    result_dir.mkdir(parents=True, exist_ok=True)
+    output = result_dir / job.output_filename
+    job.started_at = datetime.utcnow()
+    try:
+        if not run_fast_path(str(source), str(output), job.input_format, job.output_format):
+            return False
+    except Exception as e:
+        logger.warning(f"Fast path failed for job {job.id}, queueing instead: {str(e)}")
+        output.unlink(missing_ok=True)
+        return False
+    job.status = 'completed'
+    job.progress = 100
+    job.completed_at = datetime.utcnow()
+    job.tool_used = 'fast'
+    return True
+
+
+def _reference(user_id: uuid.UUID, file_id: Optional[str], filename: Optional[str]) -> Path:
+    """The stored file behind a fileId or uploaded filename, as an HTTP error if there's none."""
+    try:
+        return resolve(user_id, file_id, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileReferenceError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @router.post('/upload/')
 def upload_conversion(
+    request: Request,
     session: SessionDep,
     current_user: CurrentUser,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    file_id: Optional[str] = Form(None, alias='fileId'),
+    filename: Optional[str] = Form(None),
     input_format: str = Form(...),
     output_format: str = Form(...),
-    
+    profile: Optional[str] = Form(None),
 ):
-    """Upload a file for conversion."""
-    logger.info(f"Upload request from user {current_user.id}: {file.filename} ({input_format}->{output_format})")
-    if not file or not input_format or not output_format:
+    """Upload a file for conversion, or convert one already uploaded (fileId or filename)."""
+    if sum(1 for given in (file, file_id, filename) if given) != 1:
+        raise HTTPException(status_code=400, detail='Send one of file, fileId or filename')
+    # a referenced file is linked into the job, no bytes are sent again
+    source = _reference(current_user.id, file_id, filename) if file is None else None
+    name = file.filename if file is not None else source.name
+    logger.info(f"Upload request from user {current_user.id}: {name} ({input_format}->{output_format})")
+    if not input_format or not output_format:
         raise HTTPException(status_code=400, detail='Missing required fields')
+    if profile and profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile, expected one of {', '.join(PROFILES)}")
 
     size = 0
+    if source is not None:
+        # known up front: refuse before anything is created
+        size = source.stat().st_size
+        if size > settings.MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail='File too large')
+        if current_user.storage_used + size > current_user.storage_quota:
+            raise HTTPException(status_code=413, detail='Storage quota exceeded')
+
     # Create job first
     job = Job(
-        input_filename=file.filename,
-        output_filename=f"{file.filename.rsplit('.',1)[0]}.{output_format}",
+        input_filename=name,
+        output_filename=f"{name.rsplit('.',1)[0]}.{output_format}",
         input_format=input_format.lower(),
         output_format=output_format.lower(),
+        options={'profile': profile} if profile else None,
         user_id=current_user.id,
         status='pending',
         progress=0
@@ -51,30 +114,37 @@ def upload_conversion(
     # Save file to uploads/{job.id}/filename
     upload_dir = Path(settings.UPLOAD_DIR) / str(job.id)
     upload_dir.mkdir(parents=True, exist_ok=True)
-    dest = upload_dir / file.filename
+    dest = upload_dir / name
     
     try:
-        with open(dest, 'wb') as buffer:
-            for chunk in iter(lambda: file.file.read(1024*64), b''):
-                size += len(chunk)
-                if size > settings.MAX_FILE_SIZE:
-                    if dest.exists():
-                        dest.unlink()
-                    session.delete(job)
-                    session.commit()
-                    raise HTTPException(status_code=413, detail='File too large')
-                buffer.write(chunk)
+        if source is not None:
+            link_into(source, upload_dir, name)
+        else:
+            with open(dest, 'wb') as buffer:
+                for chunk in iter(lambda: file.file.read(1024*64), b''):
+                    size += len(chunk)
+                    if size > settings.MAX_FILE_SIZE:
+                        raise HTTPException(status_code=413, detail='File too large')
+                    buffer.write(chunk)
 
-        if current_user.storage_used + size > current_user.storage_quota:
-            dest.unlink(missing_ok=True)
-            session.delete(job)
-            session.commit()
-            raise HTTPException(status_code=413, detail='Storage quota exceeded')
+            if current_user.storage_used + size > current_user.storage_quota:
+                raise HTTPException(status_code=413, detail='Storage quota exceeded')
 
         job.file_size = size
         session.add(job)
         session.commit()
 
+        audit.record('job.create', current_user.id, 'job', job.id, request, input_format=job.input_format,
+                     output_format=job.output_format, size=size, reference=source is not None)
+
+        # Trivial conversions finish here, without a queue hop
+        if size <= settings.FAST_PATH_MAX_BYTES and get_fast_path(job.input_format, job.output_format, job.options):
+            if _convert_inline(job, dest):
+                session.add(job)
+                session.commit()
+                logger.info(f"Job {job.id} completed in-process")
+                return {"data": {"jobId": str(job.id), "status": job.status}}
+
         # Enqueue for processing
         logger.info(f"Job {job.id} created, enqueueing for processing")
         job_manager.enqueue(str(job.id))
@@ -82,13 +152,199 @@ def upload_conversion(
 
         # Return in format frontend expects
         return {"data": {"jobId": str(job.id)}}
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Upload error: {str(e)}", exc_info=True)
-        # Cleanup on error
-        if dest.exists():
-            dest.unlink()
+        # Cleanup on error: no job, no upload directory
+        shutil.rmtree(upload_dir, ignore_errors=True)
         session.delete(job)
         session.commit()
+        if isinstance(e, HTTPException):
+            raise
+        logger.error(f"Upload error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _record_inline_job(user_id: uuid.UUID, filename: str, output_filename: str, input_format: str,
+                       output_format: str, size: int, tool: str, started_at: datetime,
+                       completed_at: datetime):
+    """Account for an inline conversion after its response has been sent."""
+    try:
+        with Session(engine) as session:
+            session.add(Job(
+                input_filename=filename,
+                output_filename=output_filename,
+                input_format=input_format,
+                output_format=output_format,
+                user_id=user_id,
+                status='completed',
+                progress=100,
+                file_size=size,
+                tool_used=f"inline_{tool}",
+                started_at=started_at,
+                completed_at=completed_at,
+            ))
+            session.commit()
+    except Exception as e:
+        logger.error(f"Failed to record inline conversion for user {user_id}: {str(e)}")
+
+
+@router.post('/inline')
+def inline_conversion(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    input_format: str = Form(...),
+    output_format: str = Form(...),
+    profile: Optional[str] = Form(None),
+):
+    """Convert a small file in memory and return the result in this response."""
+    input_format, output_format = input_format.lower(), output_format.lower()
+    if profile and profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile, expected one of {', '.join(PROFILES)}")
+    options = {'profile': profile} if profile else None
+    if not inline_tool(input_format, output_format, options):
+        raise HTTPException(status_code=415, detail=f"{input_format} -> {output_format} is not available inline, use /upload/")
+
+    data = file.file.read(settings.INLINE_MAX_BYTES + 1)
+    if len(data) > settings.INLINE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Inline conversion is limited to {settings.INLINE_MAX_BYTES} bytes, use /upload/")
+
+    started_at = datetime.utcnow()
+    try:
+        # runs on a request thread: one core, outside the job manager's CPU budget
+        with CpuAllocation(threads=1).activate(), get_profile(profile).activate():
+            result, tool = convert_bytes(data, input_format, output_format, options)
+    except InlineTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"{e}, use /upload/")
+    except InlineConversionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    output_filename = f"{(file.filename or 'file').rsplit('.', 1)[0]}.{output_format}"
+    background_tasks.add_task(
+        _record_inline_job, current_user.id, file.filename or output_filename, output_filename,
+        input_format, output_format, len(data), tool, started_at, datetime.utcnow()
+    )
+    audit.record('conversion.inline', current_user.id, 'file', None, request, filename=file.filename,
+                 input_format=input_format, output_format=output_format, size=len(data), tool=tool)
+    logger.info(f"Inline {tool} conversion for user {current_user.id}: {file.filename} "
+                f"({len(data)} -> {len(result)} bytes)")
+    return Response(
+        content=result,
+        media_type=mimetypes.guess_type(output_filename)[0] or 'application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename="{output_filename}"'},
+    )
+
+
+def _batch_job(job_id: uuid.UUID, user_id: uuid.UUID, filename: str, input_format: Optional[str],
+               output_format: str, profile: Optional[str], size: int) -> Job:
+    input_format = (input_format or os.path.splitext(filename)[1][1:]).lower()
+    if not input_format:
+        raise HTTPException(status_code=400, detail=f"No input format for {filename}")
+    if profile and profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile, expected one of {', '.join(PROFILES)}")
+    return Job(
+        id=job_id,
+        input_filename=filename,
+        output_filename=f"{filename.rsplit('.', 1)[0]}.{output_format.lower()}",
+        input_format=input_format,
+        output_format=output_format.lower(),
+        options={'profile': profile} if profile else None,
+        file_size=size,
+        user_id=user_id,
+        status='pending',
+        progress=0,
+    )
+
+
+def _submit_batch(session: Session, current_user, request: Request, jobs: List[Job], source: str):
+    """Create every job of a batch in one transaction, then queue them all at once."""
+    try:
+        if current_user.storage_used + sum(job.file_size for job in jobs) > current_user.storage_quota:
+            raise HTTPException(status_code=413, detail='Storage quota exceeded')
+        session.add_all(jobs)
+        session.commit()
+    except Exception:
+        session.rollback()
+        for job in jobs:
+            shutil.rmtree(Path(settings.UPLOAD_DIR) / str(job.id), ignore_errors=True)
+        raise
+    job_manager.enqueue_many(job.id for job in jobs)
+    audit.record('job.create', current_user.id, 'job', None, request, source=source, count=len(jobs),
+                 size=sum(job.file_size for job in jobs))
+    logger.info(f"Batch of {len(jobs)} jobs ({source}) created for user {current_user.id}")
+    return {"data": {"jobIds": [str(job.id) for job in jobs]}}
+
+
+@router.post('/batch/')
+def upload_batch(
+    request: Request,
+    session: SessionDep,
+    current_user: CurrentUser,
+    files: List[UploadFile] = File(...),
+    output_format: str = Form(...),
+    input_format: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None),
+):
+    """Upload several files and create one conversion job per file."""
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f'Batch limited to {settings.MAX_BATCH_FILES} files')
+
+    jobs = []
+    # checked while streaming, so an over-quota batch stops at the first file past it
+    room = current_user.storage_quota - current_user.storage_used
+    try:
+        for file in files:
+            filename = os.path.basename(file.filename or '')
+            if not filename:
+                raise HTTPException(status_code=400, detail='Missing filename')
+            job = _batch_job(uuid.uuid4(), current_user.id, filename, input_format, output_format, profile, 0)
+            upload_dir = Path(settings.UPLOAD_DIR) / str(job.id)
+            upload_dir.mkdir(parents=True, exist_ok=True)
+            jobs.append(job)
+            with open(upload_dir / filename, 'wb') as buffer:
+                for chunk in iter(lambda: file.file.read(1024*64), b''):
+                    job.file_size += len(chunk)
+                    room -= len(chunk)
+                    if job.file_size > settings.MAX_FILE_SIZE:
+                        raise HTTPException(status_code=413, detail=f'File too large: {filename}')
+                    if room < 0:
+                        raise HTTPException(status_code=413, detail='Storage quota exceeded')
+                    buffer.write(chunk)
+    except Exception:
+        for job in jobs:
+            shutil.rmtree(Path(settings.UPLOAD_DIR) / str(job.id), ignore_errors=True)
+        raise
+    return _submit_batch(session, current_user, request, jobs, 'upload')
+
+
+@router.post('/batch/refs')
+def reference_batch(
+    request: Request,
+    session: SessionDep,
+    current_user: CurrentUser,
+    batch: BatchConversionRequest = Body(...),
+):
+    """Create one conversion job per already-uploaded file, without sending the files again."""
+    if len(batch.items) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f'Batch limited to {settings.MAX_BATCH_FILES} files')
+
+    # resolve every reference before touching the disk, so a bad one fails the whole batch cheaply
+    sources = [_reference(current_user.id, item.fileId, item.filename) for item in batch.items]
+    jobs = [
+        _batch_job(uuid.uuid4(), current_user.id, source.name, item.input_format, item.output_format,
+                   item.profile, source.stat().st_size)
+        for item, source in zip(batch.items, sources)
+    ]
+    for job in jobs:
+        if job.file_size > settings.MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f'File too large: {job.input_filename}')
+    if current_user.storage_used + sum(job.file_size for job in jobs) > current_user.storage_quota:
+        raise HTTPException(status_code=413, detail='Storage quota exceeded')
+    try:
+        for job, source in zip(jobs, sources):
+            link_into(source, Path(settings.UPLOAD_DIR) / str(job.id))
+    except Exception:
+        for job in jobs:
+            shutil.rmtree(Path(settings.UPLOAD_DIR) / str(job.id), ignore_errors=True)
+        raise
+    return _submit_batch(session, current_user, request, jobs, 'reference')
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
 from sqlmodel import Session, select
-from typing import List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import and_, or_
+from typing import List, Optional, Tuple
 from app.core.job_manager import manager as job_manager
 import asyncio
+import base64
+from datetime import datetime
 from pathlib import Path
 import uuid
 
-from app.api.deps import get_db, CurrentUser, SessionDep
+from app.api.deps import get_db, CurrentUser, SessionDep, AsyncCurrentUser, AsyncSessionDep
 from app.models import Job, User
-from app.schemas.job import JobCreate, JobRead, JobUpdate
+from app.schemas.job import JobCreate, JobRead, JobUpdate, JobStatusRequest
 from app.core.config import settings
+from app.core.job_changes import CursorExpired, changes as job_changes
+from app.core.audit import audit
 
 router = APIRouter()
 
@@ -22,9 +28,18 @@ def _get_job(session: Session, job_id: str) -> Job | None:
     return session.get(Job, job_uuid)
 
 
+async def _get_job_async(session: AsyncSession, job_id: str) -> Job | None:
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        return None
+    return await session.get(Job, job_uuid)
+
+
 @router.post("/", response_model=JobRead)
 def create_job(
     job_in: JobCreate,
+    request: Request,
     session: SessionDep,
     current_user: CurrentUser
 ):
@@ -33,33 +48,141 @@ def create_job(
     session.add(job)
     session.commit()
     session.refresh(job)
+    audit.record('job.create', current_user.id, 'job', job.id, request, operation=job.operation)
     return job
     
 
+def _encode_cursor(created_at: datetime, job_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{job_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# cursors are built from these, so projections always include them
+_CURSOR_FIELDS = ["id", "created_at", "version"]
+
+
+def _projection(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in Job.__table__.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return _CURSOR_FIELDS + [f for f in requested if f not in _CURSOR_FIELDS]
+
+
 @router.get("/")
-def list_jobs(
-    session: SessionDep,
-    current_user: CurrentUser,
+async def list_jobs(
+    request: Request,
+    response: Response,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = Query(settings.JOBS_PAGE_SIZE, ge=1, le=settings.JOBS_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
 ):
-    """List jobs for the current user or all jobs for admins."""
-    statement = select(Job)
-    if not current_user.is_superuser:
-        statement = statement.where(Job.user_id == current_user.id)
+    """List jobs for the current user or all jobs for admins, newest first.
+
+    Pages are keyed on (created_at, id): pass the returned `next` as `cursor`
+    for the following page. `fields` is a comma separated column list.
+
+    Every response carries a `sync` version; `since=<sync>` then returns only
+    the jobs changed and the ids deleted after it, oldest change first. The
+    ETag only changes with the caller's jobs, so polling with If-None-Match
+    costs a 304 without touching the jobs table.
+    """
+    if cursor and since is not None:
+        raise HTTPException(status_code=400, detail="cursor and since can't be combined")
+    owner = None if current_user.is_superuser else current_user.id
+    etag = job_changes.etag(owner, str(request.url.query))
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    # read before querying: every change up to here is committed and visible
+    watermark = job_changes.watermark
+    columns = _projection(fields)
+    statement = select(*(getattr(Job, name) for name in columns)) if columns else select(Job)
+    if owner:
+        statement = statement.where(Job.user_id == owner)
     if status:
         statement = statement.where(Job.status == status)
-    jobs = session.exec(statement).all()
-    return {"results": jobs}
+
+    deleted = None
+    if since is not None:
+        try:
+            version = job_changes.parse_token(since)
+            deleted = job_changes.deleted_since(version, owner)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        except CursorExpired:
+            raise HTTPException(status_code=410, detail="Sync token expired, reload the job list")
+        statement = statement.where(Job.version > version).order_by(Job.version)
+    else:
+        if cursor:
+            created_at, job_id = _decode_cursor(cursor)
+            statement = statement.where(or_(
+                Job.created_at < created_at,
+                and_(Job.created_at == created_at, Job.id < job_id),
+            ))
+        statement = statement.order_by(Job.created_at.desc(), Job.id.desc())
+
+    rows = (await session.exec(statement.limit(limit + 1))).all()
+    jobs = [dict(row._mapping) for row in rows] if columns else rows
+    next_cursor, sync = None, watermark
+    if len(jobs) > limit:
+        jobs = jobs[:limit]
+        last = jobs[-1] if columns else jobs[-1].model_dump()
+        if since is not None:
+            # the rest of the delta follows from the last change returned
+            sync = min(last["version"], watermark)
+        else:
+            next_cursor = _encode_cursor(last["created_at"], last["id"])
+    result = {"results": jobs, "next": next_cursor, "sync": job_changes.token(sync)}
+    if deleted is not None:
+        result["deleted"] = deleted
+    return result
+
+
+@router.post("/status")
+async def job_statuses(
+    body: JobStatusRequest,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+):
+    """Status of several jobs at once; ids that don't exist or aren't visible are listed as missing."""
+    if len(body.ids) > settings.JOBS_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {settings.JOBS_MAX_PAGE_SIZE} ids per request")
+    statement = select(
+        Job.id, Job.status, Job.progress, Job.error_message, Job.completed_at, Job.version
+    ).where(Job.id.in_(body.ids))
+    if not current_user.is_superuser:
+        statement = statement.where(Job.user_id == current_user.id)
+    results = [dict(row._mapping) for row in (await session.exec(statement)).all()]
+    found = {row["id"] for row in results}
+    return {"results": results, "missing": [job_id for job_id in body.ids if job_id not in found]}
 
 
 @router.get("/{job_id}", response_model=JobRead)
-def get_job(
+async def get_job(
     job_id: str,
-    session: SessionDep,
-    current_user: CurrentUser
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser
 ):
     """Get a specific job."""
-    job = _get_job(session, job_id)
+    job = await _get_job_async(session, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     if job.user_id != current_user.id and not current_user.is_superuser:
@@ -70,6 +193,7 @@ def get_job(
 @router.post("/{job_id}/start", response_model=JobRead)
 async def start_job(
     job_id: str,
+    request: Request,
     session: SessionDep,
     current_user: CurrentUser
 ):
@@ -89,17 +213,19 @@ async def start_job(
     
     # schedule job via shared manager
     job_manager.enqueue(job_id)
+    audit.record('job.start', current_user.id, 'job', job_id, request)
     return job
 
 
 @router.get("/{job_id}/download/")
-def download_job_result(
+async def download_job_result(
     job_id: str,
-    session: SessionDep,
-    current_user: CurrentUser
+    request: Request,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser
 ):
     """Download the converted file result."""
-    job = _get_job(session, job_id)
+    job = await _get_job_async(session, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     if job.user_id != current_user.id and not current_user.is_superuser:
@@ -111,12 +237,14 @@ def download_job_result(
     result_path = Path(settings.RESULTS_DIR) / str(job_id) / job.output_filename
     if not result_path.exists():
         raise HTTPException(status_code=404, detail='Result file not found')
+    audit.record('job.download', current_user.id, 'job', job_id, request, filename=job.output_filename)
     return FileResponse(str(result_path), filename=job.output_filename)
 
 
 @router.post("/{job_id}/cancel")
 def cancel_job(
     job_id: str,
+    request: Request,
     session: SessionDep,
     current_user: CurrentUser
 ):
@@ -132,6 +260,7 @@ def cancel_job(
     session.add(job)
     session.commit()
     session.refresh(job)
+    audit.record('job.cancel', current_user.id, 'job', job_id, request)
     return job
 
 
@@ -159,6 +288,7 @@ def update_job(
 @router.delete("/{job_id}")
 def delete_job(
     job_id: str,
+    request: Request,
     session: SessionDep,
     current_user: CurrentUser
 ):
@@ -182,5 +312,6 @@ def delete_job(
     # Delete from database
     session.delete(job)
     session.commit()
+    audit.record('job.delete', current_user.id, 'job', job_id, request)
     
     return {"status": "deleted"}
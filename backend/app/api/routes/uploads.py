@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
 from pathlib import Path
 from fastapi.responses import FileResponse
 import shutil
@@ -7,6 +7,7 @@ from sqlmodel import Session
 from app.core.config import settings
 from app.schemas.file import UploadResponse
 from app.api.deps import CurrentUser, get_db
+from app.core.audit import audit
 from app.models import Job
 import uuid
 
@@ -36,7 +37,7 @@ def _job_upload_dir(user_id: str, job_id: str) -> Path:
 
 
 @router.post("/", response_model=UploadResponse)
-def upload_file(file: UploadFile = File(...), current_user=Depends(CurrentUser)):
+def upload_file(request: Request, current_user: CurrentUser, file: UploadFile = File(...)):
     """Upload a file to user's upload directory."""
     # store uploads in a per-user directory and enforce MAX_FILE_SIZE
     user_dir = _user_upload_dir(str(current_user.id))
@@ -52,14 +53,16 @@ def upload_file(file: UploadFile = File(...), current_user=Depends(CurrentUser))
                 raise HTTPException(status_code=400, detail="File too large")
             buffer.write(chunk)
 
+    audit.record('file.upload', current_user.id, 'file', out_path.name, request, filename=out_path.name, size=written)
     return UploadResponse(filename=str(out_path.name), size=written)
 
 
 @router.post("/{job_id}", response_model=UploadResponse)
 def upload_file_for_job(
+    request: Request,
     job_id: str,
+    current_user: CurrentUser,
     file: UploadFile = File(...),
-    current_user=Depends(CurrentUser),
     session: Session = Depends(get_db)
 ):
     """Upload a file for a specific conversion job."""
@@ -84,11 +87,12 @@ def upload_file_for_job(
                 raise HTTPException(status_code=400, detail="File too large")
             buffer.write(chunk)
 
+    audit.record('file.upload', current_user.id, 'job', job.id, request, filename=out_path.name, size=written)
     return UploadResponse(filename=str(out_path.name), size=written)
 
 
 @router.get("/", response_model=list[UploadResponse])
-def list_user_files(current_user=Depends(CurrentUser)):
+def list_user_files(current_user: CurrentUser):
     """List all files in user's upload directory."""
     user_dir = _user_upload_dir(str(current_user.id))
     files = []
@@ -100,7 +104,7 @@ def list_user_files(current_user=Depends(CurrentUser)):
 
 
 @router.get("/{filename}", response_model=UploadResponse)
-def get_file_info(filename: str, current_user=Depends(CurrentUser)):
+def get_file_info(filename: str, current_user: CurrentUser):
     """Get file info."""
     user_dir = _user_upload_dir(str(current_user.id))
     target = user_dir / filename
@@ -110,11 +114,13 @@ def get_file_info(filename: str, current_user=Depends(CurrentUser)):
 
 
 @router.delete("/{filename}")
-def delete_file(filename: str, current_user=Depends(CurrentUser)):
+def delete_file(request: Request, filename: str, current_user: CurrentUser):
     """Delete a file from user's upload directory."""
     user_dir = _user_upload_dir(str(current_user.id))
     target = user_dir / filename
     if not target.exists():
         raise HTTPException(status_code=404, detail="File not found")
+    size = target.stat().st_size
     target.unlink()
+    audit.record('file.delete', current_user.id, 'file', target.name, request, filename=target.name, size=size)
     return {"status": "deleted"}
@@ -4,6 +4,12 @@ from fastapi.middleware.gzip import GZipMiddleware
 from app.core.config import settings
 from app.core.database import engine, Base, init_db
 from app.core.job_manager import manager as job_manager
+from app.core.office_pool import pool as office_pool
+from app.core.ebook_pool import pool as ebook_pool
+from app.core.process_pool import pool as process_pool
+from app.core.audit import audit
+from app.core.job_archive import archiver as job_archiver
+from app.core.cache_prune import pruner as cache_pruner
 from app.api.routes import auth as auth_router
 from app.api.routes import users as users_router
 from app.api.routes import uploads as uploads_router
@@ -72,10 +78,22 @@ async def _startup():
     # start async job workers
     await job_manager.start()
     logger.info(f"Job manager started with {job_manager.concurrency} workers")
+    audit.start()
+    job_archiver.start()
+    cache_pruner.start()
+    # warm LibreOffice servers for office document conversions
+    office_pool.start()
+    ebook_pool.start()
 
 
 @app.on_event("shutdown")
 async def _shutdown():
     logger.info("Application shutting down")
+    await job_archiver.stop()
+    await cache_pruner.stop()
     await job_manager.stop()
-    logger.info("Job manager stopped")
\ No newline at end of file
+    logger.info("Job manager stopped")
+    await audit.stop()
+    office_pool.stop()
+    ebook_pool.stop()
+    process_pool.stop()
\ No newline at end of file
@@ -0,0 +1,524 @@
+"""Streaming archive repacking.
+
+Entries are read one at a time from the source archive and written
+straight into the target, so nothing is extracted to disk and memory stays
+at a few copy buffers whatever the archive size:
+
+    zip           zipfile, member by member
+    tar[.gz|.bz2|.xz|.zst]
+                  tarfile in stream mode over a decompressing pipe
+    7z, rar       converted to a tar stream by bsdtar (libarchive); with only
+                  7z installed they are extracted to scratch space instead
+
+Compressed tar output goes through the multithreaded command line
+compressors (pigz, lbzip2/pbzip2, xz -T, zstd -T) with as many threads as
+the job's CPU allocation, falling back to the single-threaded stdlib
+codecs. 7z output is staged in scratch space because 7z cannot read
+entries from a stream.
+
+ARCHIVE_MAX_ENTRIES and ARCHIVE_MAX_UNPACKED cap the entry count and the
+bytes actually copied, so archive bombs fail early instead of filling the
+disk.
+"""
+import io
+import os
+import bz2
+import time
+import calendar
+import gzip
+import lzma
+import shutil
+import logging
+import tarfile
+import tempfile
+import zipfile
+import subprocess
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.core.cpu_budget import current_allocation
+from app.core.tools import open_tool, run_tool
+from app.core.workspace import scratch_dir
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK = 1024 * 1024
+
+# longest suffixes first so "x.tar.gz" isn't read as "gz"
+_SUFFIXES = [
+    ('.tar.gz', 'tar.gz'), ('.tgz', 'tar.gz'),
+    ('.tar.bz2', 'tar.bz2'), ('.tbz2', 'tar.bz2'),
+    ('.tar.xz', 'tar.xz'), ('.txz', 'tar.xz'),
+    ('.tar.zst', 'tar.zst'), ('.tzst', 'tar.zst'),
+    ('.zip', 'zip'), ('.7z', '7z'), ('.rar', 'rar'), ('.tar', 'tar'),
+    ('.gz', 'gz'), ('.bz2', 'bz2'), ('.xz', 'xz'), ('.zst', 'zst'),
+]
+
+# multithreaded compressors: (tool, threads flag builder)
+_COMPRESSORS = {
+    'gz': [('pigz', lambda n: ['pigz', '-p', str(n), '-c'])],
+    'bz2': [('lbzip2', lambda n: ['lbzip2', '-n', str(n), '-c']),
+            ('pbzip2', lambda n: ['pbzip2', f'-p{n}', '-c'])],
+    'xz': [('xz', lambda n: ['xz', '-T', str(n), '-c'])],
+    'zst': [('zstd', lambda n: ['zstd', f'-T{n}', '-q', '-c'])],
+}
+
+_DECOMPRESSORS = {
+    'xz': [('xz', lambda n: ['xz', '-d', '-T', str(n), '-c'])],
+    'zst': [('zstd', lambda n: ['zstd', '-d', '-q', '-c'])],
+}
+
+
+class ArchiveLimitError(ValueError):
+    pass
+
+
+@dataclass
+class ArchiveEntry:
+    name: str
+    kind: str  # file | dir | symlink | hardlink
+    size: int = 0
+    mode: int = 0o644
+    mtime: float = 0
+    linkname: str = ''
+    open: Optional[Callable[[], io.BufferedIOBase]] = None
+
+
+def archive_format(path: str) -> Optional[str]:
+    name = Path(path).name.lower()
+    for suffix, fmt in _SUFFIXES:
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def _safe_name(name: str) -> Optional[str]:
+    """Entry name made relative; None for names escaping the archive root."""
+    parts = [p for p in PurePosixPath(name.replace('\\', '/')).parts if p not in ('/', '.', '')]
+    if '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+class _Pipe:
+    """A tool's stdin (writing) or stdout (reading) as a file object."""
+
+    def __init__(self, process: subprocess.Popen, stream):
+        self.process = process
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+    def write(self, data) -> int:
+        return self.stream.write(data)
+
+    def close(self) -> None:
+        if self.stream is self.process.stdout:
+            # tarfile stops at the end-of-archive marker; drain the padding so
+            # the tool doesn't die of SIGPIPE
+            while self.stream.read(COPY_CHUNK):
+                pass
+        self.stream.close()
+        stderr = self.process.stderr.read() if self.process.stderr else b''
+        if self.process.wait() != 0:
+            raise RuntimeError(f"{self.process.args[0]} failed: {stderr.decode(errors='replace').strip()}")
+
+    def abort(self) -> None:
+        self.process.kill()
+        self.process.wait()
+        self.stream.close()
+
+
+def _abort(stream) -> None:
+    """Close a stream after a failure without raising over the original error."""
+    try:
+        stream.abort() if isinstance(stream, _Pipe) else stream.close()
+    except Exception:
+        pass
+
+
+def _tool(candidates, threads: int):
+    for name, build in candidates:
+        if shutil.which(name):
+            return build(threads)
+    return None
+
+
+def _open_read(path: str, codec: Optional[str]):
+    """Decompressed stream of `path`."""
+    threads = current_allocation().threads
+    cmd = _tool(_DECOMPRESSORS.get(codec, []), threads)
+    if cmd:
+        process = open_tool(cmd + [path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return _Pipe(process, process.stdout)
+    if codec == 'gz':
+        return gzip.open(path, 'rb')
+    if codec == 'bz2':
+        return bz2.open(path, 'rb')
+    if codec == 'xz':
+        return lzma.open(path, 'rb')
+    if codec == 'zst':
+        if zstandard is None:
+            raise RuntimeError("zstd input needs the zstd tool or the zstandard module")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def _open_write(path: str, codec: Optional[str]):
+    """Compressing writer into `path`; closing it finishes the file."""
+    threads = current_allocation().threads
+    cmd = _tool(_COMPRESSORS.get(codec, []), threads)
+    if cmd:
+        out = open(path, 'wb')
+        process = open_tool(cmd, stdin=subprocess.PIPE, stdout=out, stderr=subprocess.PIPE)
+        out.close()  # the child holds its own descriptor
+        return _Pipe(process, process.stdin)
+    if codec == 'gz':
+        return gzip.open(path, 'wb')
+    if codec == 'bz2':
+        return bz2.open(path, 'wb')
+    if codec == 'xz':
+        return lzma.open(path, 'wb')
+    if codec == 'zst':
+        if zstandard is None:
+            raise RuntimeError("zstd output needs the zstd tool or the zstandard module")
+        return zstandard.ZstdCompressor(threads=threads).stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+
+def _iter_zip(path: str) -> Iterator[ArchiveEntry]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            mode = (info.external_attr >> 16) & 0o7777
+            mtime = calendar.timegm(info.date_time + (0, 0, 0)) if info.date_time[0] >= 1980 else 0
+            yield ArchiveEntry(
+                name=info.filename,
+                kind='dir' if info.is_dir() else 'file',
+                size=info.file_size,
+                mode=mode or (0o755 if info.is_dir() else 0o644),
+                mtime=mtime,
+                open=lambda info=info: archive.open(info),
+            )
+
+
+def _iter_tar(stream) -> Iterator[ArchiveEntry]:
+    # stream mode: each member's data must be consumed before the next
+    with tarfile.open(fileobj=stream, mode='r|') as archive:
+        for member in archive:
+            if member.isdir():
+                kind = 'dir'
+            elif member.issym():
+                kind = 'symlink'
+            elif member.islnk():
+                kind = 'hardlink'
+            elif member.isfile():
+                kind = 'file'
+            else:
+                logger.warning(f"Skipping special archive entry {member.name}")
+                continue
+            yield ArchiveEntry(
+                name=member.name,
+                kind=kind,
+                size=member.size,
+                mode=member.mode,
+                mtime=member.mtime,
+                linkname=member.linkname,
+                open=lambda member=member: archive.extractfile(member),
+            )
+
+
+def _iter_directory(root: Path) -> Iterator[ArchiveEntry]:
+    for path in sorted(root.rglob('*')):
+        stat = path.lstat()
+        name = path.relative_to(root).as_posix()
+        if path.is_symlink():
+            yield ArchiveEntry(name, 'symlink', mode=stat.st_mode & 0o7777, mtime=stat.st_mtime, linkname=os.readlink(path))
+        elif path.is_dir():
+            yield ArchiveEntry(name, 'dir', mode=stat.st_mode & 0o7777, mtime=stat.st_mtime)
+        else:
+            yield ArchiveEntry(name, 'file', stat.st_size, stat.st_mode & 0o7777, stat.st_mtime,
+                               open=lambda path=path: path.open('rb'))
+
+
+def _check_listing(listing: str) -> None:
+    """Apply the entry and size limits to `7z l -slt` output before anything is extracted."""
+    # technical listing: the archive's own properties, a dashed line, then
+    # one "Key = value" block per entry
+    _, _, body = listing.partition('\n----------\n')
+    entries = unpacked = 0
+    for line in body.splitlines():
+        key, _, value = line.partition(' = ')
+        if key == 'Path':
+            entries += 1
+        elif key == 'Size' and value.strip().isdigit():
+            unpacked += int(value)
+    if entries > settings.ARCHIVE_MAX_ENTRIES:
+        raise ArchiveLimitError(f"Archive has more than {settings.ARCHIVE_MAX_ENTRIES} entries")
+    if unpacked > settings.ARCHIVE_MAX_UNPACKED:
+        raise ArchiveLimitError(f"Archive unpacks to more than {settings.ARCHIVE_MAX_UNPACKED} bytes")
+
+
+def _iter_entries(path: str, fmt: str, scratch: Path) -> Iterator[ArchiveEntry]:
+    if fmt == 'zip':
+        yield from _iter_zip(path)
+        return
+    if fmt in ('7z', 'rar'):
+        if shutil.which('bsdtar'):
+            process = open_tool(['bsdtar', '-cf', '-', '--format', 'pax', f'@{path}'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            pipe = _Pipe(process, process.stdout)
+            try:
+                yield from _iter_tar(pipe)
+            except BaseException:
+                _abort(pipe)
+                raise
+            pipe.close()
+            return
+        # 7z can't stream entries out with their metadata; extract instead,
+        # once the listing shows the archive fits the limits
+        _check_listing(run_tool(['7z', 'l', '-slt', path]).stdout.decode(errors='replace'))
+        target = scratch / 'extracted'
+        target.mkdir()
+        run_tool(['7z', 'x', '-y', f'-mmt={current_allocation().threads}', f'-o{target}', path])
+        yield from _iter_directory(target)
+        return
+    codec = fmt.split('.', 1)[1] if fmt.startswith('tar.') else None
+    stream = _open_read(path, codec)
+    try:
+        yield from _iter_tar(stream)
+    except BaseException:
+        _abort(stream)
+        raise
+    stream.close()
+
+
+def _copy(source, target, budget: list) -> int:
+    """Copy a member's data, charging it against the remaining unpacked budget."""
+    copied = 0
+    while True:
+        chunk = source.read(COPY_CHUNK)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        budget[0] -= len(chunk)
+        if budget[0] < 0:
+            raise ArchiveLimitError(f"Archive unpacks to more than {settings.ARCHIVE_MAX_UNPACKED} bytes")
+        target.write(chunk)
+
+
+class _ZipWriter:
+    def __init__(self, path: str):
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6)
+
+    def add(self, entry: ArchiveEntry, budget: list) -> None:
+        if entry.kind in ('symlink', 'hardlink'):
+            logger.warning(f"zip output: skipping link {entry.name} -> {entry.linkname}")
+            return
+        info = zipfile.ZipInfo(entry.name + ('/' if entry.kind == 'dir' else ''))
+        info.external_attr = (entry.mode | (0o040000 if entry.kind == 'dir' else 0o100000)) << 16
+        if entry.mtime:
+            # zip can't represent dates before 1980
+            info.date_time = tuple(time.gmtime(max(entry.mtime, 315532800))[:6])
+        if entry.kind == 'dir':
+            self.archive.writestr(info, b'')
+            return
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with entry.open() as source, self.archive.open(info, 'w', force_zip64=entry.size >= zipfile.ZIP64_LIMIT) as target:
+            _copy(source, target, budget)
+
+    def close(self) -> None:
+        self.archive.close()
+
+    def abort(self) -> None:
+        _abort(self.archive)
+
+
+class _TarWriter:
+    def __init__(self, path: str, codec: Optional[str]):
+        self.stream = _open_write(path, codec)
+        self.archive = tarfile.open(fileobj=self.stream, mode='w|', format=tarfile.PAX_FORMAT)
+
+    def add(self, entry: ArchiveEntry, budget: list) -> None:
+        info = tarfile.TarInfo(entry.name)
+        info.mode = entry.mode
+        info.mtime = entry.mtime
+        if entry.kind == 'dir':
+            info.type = tarfile.DIRTYPE
+            self.archive.addfile(info)
+        elif entry.kind == 'symlink':
+            info.type = tarfile.SYMTYPE
+            info.linkname = entry.linkname
+            self.archive.addfile(info)
+        elif entry.kind == 'hardlink':
+            # hard links name another entry, so they get the same cleanup
+            linked = _safe_name(entry.linkname)
+            if not linked:
+                logger.warning(f"Skipping hard link {entry.name} to unsafe target {entry.linkname!r}")
+                return
+            info.type = tarfile.LNKTYPE
+            info.linkname = linked
+            self.archive.addfile(info)
+        else:
+            info.size = entry.size
+            if entry.size > budget[0]:
+                raise ArchiveLimitError(f"Archive unpacks to more than {settings.ARCHIVE_MAX_UNPACKED} bytes")
+            # tar headers carry the size up front; _copy enforces the budget as data flows
+            with entry.open() as source:
+                self.archive.addfile(info, _Metered(source, budget))
+
+    def close(self) -> None:
+        self.archive.close()
+        self.stream.close()
+
+    def abort(self) -> None:
+        # finish the tar framing first so tarfile has nothing left to flush later
+        _abort(self.archive)
+        _abort(self.stream)
+
+
+class _Metered:
+    """Read side of _copy for tarfile.addfile, which pulls the data itself."""
+
+    def __init__(self, source, budget: list):
+        self.source = source
+        self.budget = budget
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        self.budget[0] -= len(chunk)
+        if self.budget[0] < 0:
+            raise ArchiveLimitError(f"Archive unpacks to more than {settings.ARCHIVE_MAX_UNPACKED} bytes")
+        return chunk
+
+
+class _StagedWriter:
+    """Writes entries to scratch space and packs them with 7z on close.
+
+    Symlinks are recreated only when they point inside the staging root,
+    and nothing is ever written through one, so an archive can't use a
+    link entry to place files outside scratch space.
+    """
+
+    def __init__(self, path: str, scratch: Path):
+        self.path = os.path.abspath(path)
+        self.root = scratch / 'staged'
+        self.root.mkdir()
+
+    def _staged_path(self, name: str) -> Optional[Path]:
+        """Where `name` goes under the root; None if that would pass through a symlink."""
+        target = self.root
+        for part in name.split('/'):
+            if target.is_symlink():
+                return None
+            target = target / part
+        if target.is_symlink() or not target.parent.resolve().is_relative_to(self.root.resolve()):
+            return None
+        return target
+
+    def add(self, entry: ArchiveEntry, budget: list) -> None:
+        target = self._staged_path(entry.name)
+        if target is None:
+            logger.warning(f"Skipping archive entry {entry.name!r} that would be written through a link")
+            return
+        if entry.kind == 'dir':
+            target.mkdir(parents=True, exist_ok=True)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if entry.kind == 'symlink':
+            # relative links that stay inside the root only; 7z stores them as links (-snl)
+            resolved = os.path.normpath(os.path.join(os.path.dirname(entry.name), entry.linkname))
+            if os.path.isabs(entry.linkname) or resolved == '..' or resolved.startswith('../'):
+                logger.warning(f"Skipping symlink {entry.name} to outside target {entry.linkname!r}")
+                return
+            os.symlink(entry.linkname, target)
+            return
+        if entry.kind == 'hardlink':
+            linked = _safe_name(entry.linkname)
+            source = self._staged_path(linked) if linked else None
+            if source is not None and source.is_file():
+                os.link(source, target)
+            return
+        with entry.open() as source, target.open('wb') as out:
+            _copy(source, out, budget)
+        if entry.mtime:
+            os.utime(target, (entry.mtime, entry.mtime))
+
+    def close(self) -> None:
+        run_tool(['7z', 'a', '-y', '-snl', f'-mmt={current_allocation().threads}', self.path, '.'], cwd=self.root)
+
+    def abort(self) -> None:
+        pass
+
+
+def _single_stream(input_file: str, in_fmt: str, output_file: str, out_fmt: str) -> None:
+    """Recompress a bare .gz/.bz2/.xz/.zst stream into another codec."""
+    budget = [settings.ARCHIVE_MAX_UNPACKED]
+    source = _open_read(input_file, in_fmt)
+    target = _open_write(output_file, out_fmt)
+    try:
+        _copy(source, target, budget)
+    except BaseException:
+        _abort(source)
+        _abort(target)
+        raise
+    source.close()
+    target.close()
+
+
+def repack(input_file: str, output_file: str) -> Tuple[int, int]:
+    """Rewrite `input_file` as the archive format named by `output_file`.
+
+    Returns (entries, bytes) copied.
+    """
+    in_fmt, out_fmt = archive_format(input_file), archive_format(output_file)
+    if in_fmt is None or out_fmt is None or out_fmt == 'rar':
+        raise ValueError(f"Unsupported archive conversion: {input_file} -> {output_file}")
+
+    bare = ('gz', 'bz2', 'xz', 'zst')
+    if in_fmt in bare:
+        if out_fmt in bare:
+            _single_stream(input_file, in_fmt, output_file, out_fmt)
+            return 1, os.path.getsize(output_file)
+        # a tarball saved without the .tar in its name
+        in_fmt = f'tar.{in_fmt}'
+    elif out_fmt in bare:
+        # several entries need a container; a bare codec name means a tarball
+        out_fmt = f'tar.{out_fmt}'
+
+    entries, budget = 0, [settings.ARCHIVE_MAX_UNPACKED]
+    with tempfile.TemporaryDirectory(prefix='archive_', dir=scratch_dir()) as tmp:
+        scratch = Path(tmp)
+        if out_fmt == 'zip':
+            writer = _ZipWriter(output_file)
+        elif out_fmt == '7z':
+            writer = _StagedWriter(output_file, scratch)
+        else:
+            writer = _TarWriter(output_file, out_fmt.split('.', 1)[1] if '.' in out_fmt else None)
+        try:
+            with closing(_iter_entries(input_file, in_fmt, scratch)) as source:
+                for entry in source:
+                    name = _safe_name(entry.name)
+                    if name == '':
+                        continue  # the archive root itself, "./"
+                    if name is None:
+                        logger.warning(f"Skipping unsafe archive entry {entry.name!r}")
+                        continue
+                    entries += 1
+                    if entries > settings.ARCHIVE_MAX_ENTRIES:
+                        raise ArchiveLimitError(f"Archive has more than {settings.ARCHIVE_MAX_ENTRIES} entries")
+                    entry.name = name
+                    writer.add(entry, budget)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+    return entries, settings.ARCHIVE_MAX_UNPACKED - budget[0]
@@ -0,0 +1,155 @@
+"""Batched, asynchronous audit logging into AuditLog.
+
+Request handlers call `audit.record(...)`, which only appends the event to
+an in-process buffer: no session, no commit. A background task drains the
+buffer every AUDIT_FLUSH_MS, or as soon as AUDIT_BATCH_SIZE events are
+waiting, and writes each batch with a single multi-row INSERT.
+
+The buffer holds at most AUDIT_QUEUE_SIZE events. When it is full,
+AUDIT_OVERFLOW decides what gives:
+
+- drop_newest  the new event is discarded (the default)
+- drop_oldest  the oldest buffered event is discarded to make room
+- block        the caller waits up to AUDIT_BLOCK_TIMEOUT seconds for room,
+               then drops the event. Only worker threads (sync handlers)
+               wait; on the event loop this behaves like drop_newest.
+
+Dropped events are counted and reported in the log.
+"""
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import Request
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class AuditLogger:
+    def __init__(self, capacity: Optional[int] = None, batch_size: Optional[int] = None,
+                 interval_ms: Optional[int] = None, overflow: Optional[str] = None):
+        self.capacity = capacity or settings.AUDIT_QUEUE_SIZE
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.interval = (interval_ms or settings.AUDIT_FLUSH_MS) / 1000
+        self.overflow = overflow or settings.AUDIT_OVERFLOW
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIT_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.dropped = 0
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._space = threading.Condition()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, action: str, user_id: Optional[uuid.UUID] = None, resource_type: Optional[str] = None,
+               resource_id: Any = None, request: Optional[Request] = None, **details) -> bool:
+        """Queue an audit event; returns False if it was dropped."""
+        event = {
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'action': action,
+            'resource_type': resource_type,
+            'resource_id': str(resource_id) if resource_id is not None else None,
+            'details': details,
+            'ip_address': request.client.host if request is not None and request.client else None,
+            'user_agent': request.headers.get('user-agent') if request is not None else None,
+            'created_at': datetime.utcnow(),
+        }
+        with self._space:
+            if len(self._buffer) >= self.capacity:
+                if self.overflow == 'drop_oldest':
+                    self._buffer.popleft()
+                    self.dropped += 1
+                elif self.overflow == 'block' and not _on_event_loop():
+                    if not self._space.wait_for(lambda: len(self._buffer) < self.capacity,
+                                                timeout=settings.AUDIT_BLOCK_TIMEOUT):
+                        self.dropped += 1
+                        return False
+                else:
+                    self.dropped += 1
+                    return False
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return True
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._space:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._space.notify_all()
+        return batch
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events written."""
+        written = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                break
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(AuditLog.__table__.insert(), batch)
+                written += len(batch)
+            except asyncio.CancelledError:
+                # stopping mid-write: hand the batch back for the final flush
+                with self._space:
+                    self._buffer.extendleft(reversed(batch))
+                raise
+            except Exception as e:
+                # the database is unavailable or rejected the batch; don't retry forever
+                self.dropped += len(batch)
+                logger.error(f"Failed to write {len(batch)} audit events: {str(e)}")
+        return written
+
+    async def _run(self) -> None:
+        reported = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self.dropped != reported:
+                logger.warning(f"Audit log dropped {self.dropped - reported} event(s) ({self.overflow} policy)")
+                reported = self.dropped
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            self._loop = None
+        await self.flush()
+
+
+# module level audit logger instance
+audit = AuditLogger()
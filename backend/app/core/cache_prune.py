@@ -0,0 +1,116 @@
+"""Keeps the result caches under CACHE_DIR within their size caps.
+
+Cached entries are never stale (they are keyed by content hashes), so
+nothing expires on its own; instead every CACHE_PRUNE_INTERVAL seconds
+each cache that has grown past its cap loses its least recently used
+files until it is back under 90% of the cap. A cache hit refreshes the
+entry's mtime through `mark_used()`, which makes mtime the recency the
+pruner sorts by (atime is often off, noatime mounts). Files written in the
+last minute are left alone, as are temporary files still being written.
+"""
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# directory under CACHE_DIR -> (glob of its entries, setting with its cap in bytes)
+CACHES: Dict[str, Tuple[str, str]] = {
+    'ocr': ('*/*', 'OCR_CACHE_MAX_BYTES'),
+    'thumbnails': ('*/*/*', 'THUMBNAIL_CACHE_MAX_BYTES'),
+}
+
+# pruned down to this share of the cap, so the next few writes don't prune again
+_PRUNE_TO = 0.9
+# seconds a new entry is safe, e.g. while the request that made it is served
+_GRACE = 60
+
+
+def mark_used(*paths: Path) -> None:
+    """Record a cache hit on `paths`, moving them to the back of the eviction order."""
+    for path in paths:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def prune(root: Path, pattern: str, max_bytes: int) -> Tuple[int, int]:
+    """Delete the least recently used files matching `pattern` under `root` beyond `max_bytes`.
+
+    Returns (files, bytes) removed.
+    """
+    entries = []
+    total = 0
+    for path in root.glob(pattern):
+        if path.name.startswith('tmp'):
+            continue  # mkstemp/TemporaryDirectory output not published yet
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if not path.is_file():
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    if total <= max_bytes:
+        return 0, 0
+
+    target = int(max_bytes * _PRUNE_TO)
+    cutoff = time.time() - _GRACE
+    removed = freed = 0
+    for mtime, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= target or mtime > cutoff:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+        freed += size
+    # empty directories stay: a writer may have just created one for its entry
+    return removed, freed
+
+
+class CachePruner:
+    def __init__(self, interval: Optional[int] = None):
+        self.interval = settings.CACHE_PRUNE_INTERVAL if interval is None else interval
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> int:
+        """Prune every cache over its cap; returns bytes freed."""
+        freed_total = 0
+        for name, (pattern, cap) in CACHES.items():
+            max_bytes = getattr(settings, cap)
+            root = settings.CACHE_DIR / name
+            if max_bytes <= 0 or not root.is_dir():
+                continue
+            removed, freed = prune(root, pattern, max_bytes)
+            if removed:
+                logger.info(f"Cache pruner removed {removed} {name} entries ({freed // (1024 * 1024)}MB)")
+            freed_total += freed
+        return freed_total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Cache prune failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# module level pruner instance
+pruner = CachePruner()
@@ -0,0 +1,51 @@
+"""Long-lived ebook conversion loop, run inside Calibre's own interpreter.
+
+    calibre-debug -e app/core/calibre_worker.py
+
+Reads one JSON request per line on stdin,
+
+    {"input": "/path/book.epub", "output": "/path/book.mobi", "args": []}
+
+runs it through ebook-convert's entry point in this process and answers
+with one JSON line, {"ok": true} or {"ok": false, "error": "..."}. Calibre
+writes progress to stdout, so the protocol uses a private copy of the
+original stdout and fd 1 is pointed at stderr.
+
+This file is executed by Calibre's Python, not the app's: it must not
+import anything from `app`.
+"""
+import os
+import sys
+import json
+import traceback
+
+
+def main():
+    protocol = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    # paid once per worker: interpreter start-up and plugin loading
+    from calibre.ebooks.conversion.cli import main as ebook_convert
+
+    protocol.write(json.dumps({'ready': True}) + '\n')
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            code = ebook_convert(['ebook-convert', request['input'], request['output']] + list(request.get('args', [])))
+            if code not in (0, None):
+                raise RuntimeError(f"ebook-convert exited with {code}")
+            response = {'ok': os.path.exists(request['output'])}
+        except SystemExit as e:
+            response = {'ok': e.code in (0, None) and os.path.exists(request['output']),
+                        'error': f"ebook-convert exited with {e.code}"}
+        except Exception as e:
+            traceback.print_exc()
+            response = {'ok': False, 'error': str(e)}
+        protocol.write(json.dumps(response) + '\n')
+
+
+if __name__ == '__main__':
+    main()
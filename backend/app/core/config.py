@@ -32,6 +32,13 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = Field(default="", env="DB_PASSWORD")
     DB_HOST: str = Field(default="", env="DB_HOST")
     DB_PORT: str = Field(default="", env="DB_PORT")
+    DB_PROFILE: str = Field(default="", env="DB_PROFILE")  # sqlite | postgres, "" = from DATABASE_URL
+    DB_POOL_SIZE: int = Field(default=10, env="DB_POOL_SIZE")  # postgres connections for requests, on top of one per job worker
+    DB_MAX_OVERFLOW: int = Field(default=10, env="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: int = Field(default=30, env="DB_POOL_TIMEOUT")  # seconds
+    SQLITE_BUSY_TIMEOUT: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT")  # ms a writer waits for the lock
+    SQLITE_MMAP_SIZE: int = Field(default=256 * 1024 * 1024, env="SQLITE_MMAP_SIZE")
+    SQLITE_CACHE_SIZE: int = Field(default=64 * 1024 * 1024, env="SQLITE_CACHE_SIZE")  # bytes of page cache per connection
     
     # JWT Authentication
     JWT_ALGORITHM: str = Field(default="HS256", env="JWT_ALGORITHM")
@@ -47,10 +54,17 @@ class Settings(BaseSettings):
     UPLOAD_DIR: Path = Field(default="data/uploads", env="UPLOAD_DIR")
     RESULTS_DIR: Path = Field(default="data/results", env="RESULTS_DIR")
     TEMP_DIR: Path = Field(default="data/temp", env="TEMP_DIR")
+    CACHE_DIR: Path = Field(default="data/cache", env="CACHE_DIR")
+    CACHE_PRUNE_INTERVAL: int = Field(default=600, env="CACHE_PRUNE_INTERVAL")  # seconds between cache size checks, 0 = never
+    THUMBNAIL_CACHE_MAX_BYTES: int = Field(
+        default=512 * 1024 * 1024,  # CACHE_DIR/thumbnails kept, least recently used go first; 0 = unbounded
+        env="THUMBNAIL_CACHE_MAX_BYTES"
+    )
     MAX_FILE_SIZE: int = Field(
         default=1073741824,  # 1GB
         env="MAX_FILE_SIZE"
     )
+    MAX_BATCH_FILES: int = Field(default=1000, env="MAX_BATCH_FILES")  # files or jobs one batch request may send or create
     
     # Conversion Settings
     MAX_CONCURRENT_PROCESSES: int = Field(
@@ -59,7 +73,113 @@ class Settings(BaseSettings):
     )
     PROCESS_TIMEOUT: int = Field(default=300, env="PROCESS_TIMEOUT")
     MAX_RETRIES: int = Field(default=2, env="MAX_RETRIES")
-    
+    JOB_STATE_FLUSH_MS: int = Field(default=250, env="JOB_STATE_FLUSH_MS")  # batching window for non-terminal job state writes
+    JOB_STATE_MAX_RETRIES: int = Field(default=10, env="JOB_STATE_MAX_RETRIES")  # failed flushes before a job's buffered state is dropped
+    CPU_BUDGET: int = Field(
+        default=0,  # 0 = every core this process may run on
+        env="CPU_BUDGET"
+    )
+    CPU_PINNING: bool = Field(default=False, env="CPU_PINNING")
+    MEMORY_BUDGET: int = Field(
+        default=0,  # bytes; 0 = 75% of the memory available to this container
+        env="MEMORY_BUDGET"
+    )
+    CHILD_ADDRESS_SPACE_FACTOR: float = Field(
+        default=4.0,  # RLIMIT_AS = estimated peak RSS * factor (0 disables)
+        env="CHILD_ADDRESS_SPACE_FACTOR"
+    )
+    LARGE_IMAGE_PIXELS: int = Field(
+        default=100_000_000,  # images above this are converted strip by strip
+        env="LARGE_IMAGE_PIXELS"
+    )
+    IMAGE_STREAM_BAND_BYTES: int = Field(
+        default=64 * 1024 * 1024,  # decoded pixels held per band while streaming
+        env="IMAGE_STREAM_BAND_BYTES"
+    )
+    IMAGE_ENCODE_PROFILE: str = Field(
+        default="balanced",  # fast | balanced | small | smallest
+        env="IMAGE_ENCODE_PROFILE"
+    )
+    OFFICE_POOL_SIZE: int = Field(
+        default=2,  # warm unoserver processes; 0 = one-shot soffice per job
+        env="OFFICE_POOL_SIZE"
+    )
+    OFFICE_POOL_BASE_PORT: int = Field(default=2003, env="OFFICE_POOL_BASE_PORT")
+    OFFICE_MAX_CONVERSIONS: int = Field(
+        default=200,  # recycle a server after this many conversions
+        env="OFFICE_MAX_CONVERSIONS"
+    )
+    OFFICE_START_TIMEOUT: int = Field(default=30, env="OFFICE_START_TIMEOUT")
+    EBOOK_POOL_SIZE: int = Field(
+        default=1,  # warm Calibre workers; 0 = one-shot ebook-convert per job
+        env="EBOOK_POOL_SIZE"
+    )
+    EBOOK_MAX_CONVERSIONS: int = Field(
+        default=100,  # recycle a worker after this many books
+        env="EBOOK_MAX_CONVERSIONS"
+    )
+    EBOOK_START_TIMEOUT: int = Field(default=60, env="EBOOK_START_TIMEOUT")
+    OCR_LANGUAGES: str = Field(default="eng", env="OCR_LANGUAGES")  # tesseract -l, e.g. "eng+deu"
+    OCR_DPI: int = Field(default=300, env="OCR_DPI")
+    OCR_PREPROCESS: bool = Field(default=False, env="OCR_PREPROCESS")  # grayscale/binarise/deskew pages first
+    OCR_MAX_PIXELS: int = Field(
+        default=9_000_000,  # preprocessing downscale cap when the scan has no usable DPI
+        env="OCR_MAX_PIXELS"
+    )
+    OCR_MAX_SKEW: float = Field(default=5.0, env="OCR_MAX_SKEW")  # degrees searched when deskewing
+    OCR_CACHE_MAX_BYTES: int = Field(
+        default=2 * 1024 * 1024 * 1024,  # CACHE_DIR/ocr page results kept, least recently used go first; 0 = unbounded
+        env="OCR_CACHE_MAX_BYTES"
+    )
+    PDF_COMPRESS_DPI: int = Field(default=150, env="PDF_COMPRESS_DPI")  # images above this are downsampled
+    PDF_COMPRESS_QUALITY: int = Field(default=75, env="PDF_COMPRESS_QUALITY")
+    ARCHIVE_MAX_ENTRIES: int = Field(default=100_000, env="ARCHIVE_MAX_ENTRIES")
+    ARCHIVE_MAX_UNPACKED: int = Field(
+        default=20 * 1024 * 1024 * 1024,  # bytes copied out of an archive before it is rejected
+        env="ARCHIVE_MAX_UNPACKED"
+    )
+    PROCESS_POOL_WORKERS: int = Field(
+        default=0,  # 0 = CPU budget
+        env="PROCESS_POOL_WORKERS"
+    )
+    FAST_PATH_MAX_BYTES: int = Field(
+        default=8 * 1024 * 1024,  # in-process conversions up to this size finish inside the upload request
+        env="FAST_PATH_MAX_BYTES"
+    )
+    INLINE_MAX_BYTES: int = Field(
+        default=5 * 1024 * 1024,  # largest upload POST /conversions/inline converts in memory
+        env="INLINE_MAX_BYTES"
+    )
+    INLINE_MAX_PIXELS: int = Field(
+        default=25_000_000,  # largest image (width x height) POST /conversions/inline decodes
+        env="INLINE_MAX_PIXELS"
+    )
+    SCRATCH_DIR: Path = Field(default="/dev/shm/file-converter", env="SCRATCH_DIR")  # tmpfs for job workspaces
+    SCRATCH_MAX_BYTES: int = Field(
+        default=1024 * 1024 * 1024,  # RAM all in-memory workspaces may hold together, 0 = always on disk
+        env="SCRATCH_MAX_BYTES"
+    )
+    SCRATCH_GROWTH: float = Field(default=3.0, env="SCRATCH_GROWTH")  # workspace claimed per job, times its input size
+
+    # Job listing
+    JOBS_PAGE_SIZE: int = Field(default=50, env="JOBS_PAGE_SIZE")
+    JOBS_MAX_PAGE_SIZE: int = Field(default=500, env="JOBS_MAX_PAGE_SIZE")
+    JOB_TOMBSTONES: int = Field(default=10_000, env="JOB_TOMBSTONES")  # deletions remembered for ?since= delta sync
+
+    # Job history
+    JOB_ARCHIVE_AFTER_DAYS: int = Field(default=30, env="JOB_ARCHIVE_AFTER_DAYS")  # finished jobs older than this leave `jobs`, 0 = never
+    JOB_ARCHIVE_MODE: str = Field(default="archive", env="JOB_ARCHIVE_MODE")  # archive (into job_history) | delete
+    JOB_HISTORY_RETENTION_DAYS: int = Field(default=365, env="JOB_HISTORY_RETENTION_DAYS")  # job_history rows kept, 0 = forever
+    JOB_ARCHIVE_BATCH: int = Field(default=500, env="JOB_ARCHIVE_BATCH")  # rows moved per transaction
+    JOB_ARCHIVE_INTERVAL: int = Field(default=3600, env="JOB_ARCHIVE_INTERVAL")  # seconds between archiver runs
+
+    # Audit log
+    AUDIT_QUEUE_SIZE: int = Field(default=10_000, env="AUDIT_QUEUE_SIZE")  # events buffered before AUDIT_OVERFLOW applies
+    AUDIT_BATCH_SIZE: int = Field(default=500, env="AUDIT_BATCH_SIZE")
+    AUDIT_FLUSH_MS: int = Field(default=1000, env="AUDIT_FLUSH_MS")
+    AUDIT_OVERFLOW: str = Field(default="drop_newest", env="AUDIT_OVERFLOW")  # drop_newest | drop_oldest | block
+    AUDIT_BLOCK_TIMEOUT: float = Field(default=0.05, env="AUDIT_BLOCK_TIMEOUT")  # seconds a sync handler waits with "block"
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = Field(
         default=60,
@@ -96,12 +216,14 @@ class Settings(BaseSettings):
         self.UPLOAD_DIR = self.BASE_DIR / self.UPLOAD_DIR
         self.RESULTS_DIR = self.BASE_DIR / self.RESULTS_DIR
         self.TEMP_DIR = self.BASE_DIR / self.TEMP_DIR
+        self.CACHE_DIR = self.BASE_DIR / self.CACHE_DIR
         self.LOG_DIR = self.BASE_DIR / self.LOG_DIR
         
         # Create directories
         self.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         self.RESULTS_DIR.mkdir(parents=True, exist_ok=True)
         self.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
         self.LOG_DIR.mkdir(parents=True, exist_ok=True)
         
         # Handle JWT secret key fallback
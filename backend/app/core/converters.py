@@ -3,8 +3,21 @@ import os
 import subprocess
 import logging
 from pathlib import Path
-from typing import Optional, Callable
+from functools import partial, update_wrapper
+from typing import List, Optional, Callable
 from app.core.config import settings
+from app.core.cpu_budget import current_allocation
+from app.core.tools import run_tool
+from app.core.image_tiles import is_large_image, stream_convert
+from app.core.image_pipeline import run_image_operations, run_image_batch
+from app.core.image_profiles import get_profile
+from app.core.office_pool import pool as office_pool, convert_once as office_convert_once
+from app.core.ebook_pool import pool as ebook_pool, convert_once as ebook_convert_once
+from app.core.ocr import OCR_INPUTS, run_ocr, raster_size
+from app.core.archive_engine import repack
+from app.core.pdf_engine import run_pdf_merge, run_pdf_split, run_pdf_compress
+from app.core.fast_paths import get_fast_path, run_fast_path
+from app.core.memory_budget import path_size
 
 try:
     from PIL import Image
@@ -14,12 +27,23 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
-def get_converter(input_format: str, output_format: str) -> Optional[Callable]:
-    """Select appropriate converter based on format pair."""
+def get_converter(input_format: str, output_format: str, options: Optional[dict] = None) -> Optional[Callable]:
+    """Select appropriate converter based on format pair and job options."""
     input_format = input_format.lower()
     output_format = output_format.lower()
     logger.info(f"Getting converter for: {input_format} -> {output_format}")
     
+    # In-process conversions (same format, txt <-> md) need no external tool
+    if get_fast_path(input_format, output_format, options):
+        logger.info(f"Selected fast path for {input_format} -> {output_format}")
+        return convert_fast
+    
+    # OCR (scans to text, PDFs to searchable PDF). Checked first: image and
+    # PDF inputs would otherwise be claimed by the image/document converters
+    if (output_format == 'txt' and input_format in OCR_INPUTS) or (input_format == output_format == 'pdf'):
+        logger.info(f"Selected OCR converter for {input_format} -> {output_format}")
+        return convert_ocr
+    
     # Audio formats
     if input_format in ['mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a', 'wma', 'opus']:
         logger.info(f"Selected audio converter for {input_format}")
@@ -46,37 +70,79 @@ def get_converter(input_format: str, output_format: str) -> Optional[Callable]:
         return convert_ebook
     
     # Archive formats
-    if input_format in ['zip', '7z', 'rar', 'tar', 'gz', 'bz2', 'xz']:
+    if input_format in ['zip', '7z', 'rar', 'tar', 'gz', 'bz2', 'xz', 'zst']:
         logger.info(f"Selected archive converter for {input_format}")
         return convert_archive
     
-    # OCR (image to text/pdf)
-    if output_format in ['pdf', 'txt'] and input_format in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'tif']:
-        logger.info(f"Selected OCR converter for {input_format} -> {output_format}")
-        return convert_ocr
-    
     logger.warning(f"No converter found for {input_format} -> {output_format}")
     return None
 
 
+# Handlers for Job.operation values other than "convert"; each takes
+# (input_file, output_file, **job.options) minus the job level JOB_OPTIONS
+OPERATION_HANDLERS = {
+    'image': run_image_operations,
+    'image_batch': run_image_batch,
+    'ocr': run_ocr,
+    'pdf_merge': run_pdf_merge,
+    'pdf_split': run_pdf_split,
+    'pdf_compress': run_pdf_compress,
+}
+
+# Job.options keys read by the job manager itself rather than the handler
+JOB_OPTIONS = ('profile',)
+
+
+def get_operation(operation: str, options: Optional[dict] = None) -> Optional[Callable]:
+    """Select the handler for a processing operation, bound to the job's options."""
+    handler = OPERATION_HANDLERS.get(operation)
+    if handler is None:
+        logger.warning(f"No handler found for operation {operation}")
+        return None
+    kwargs = {k: v for k, v in (options or {}).items() if k not in JOB_OPTIONS}
+    return update_wrapper(partial(handler, **kwargs), handler)
+
+
+def workspace_size(converter: Callable, input_file: str) -> int:
+    """Bytes a job's workspace may grow to while `converter` runs on `input_file`."""
+    nbytes = int(path_size(input_file) * settings.SCRATCH_GROWTH)
+    # OCR rasterises every page into the workspace before reading any of them
+    if getattr(converter, '__wrapped__', converter) in (convert_ocr, run_ocr):
+        nbytes += raster_size(input_file)
+    return nbytes
+
+
+def audio_codec_args(output_format: str) -> List[str]:
+    codec = 'libmp3lame' if output_format == 'mp3' else 'pcm_s16le'
+    return ['-acodec', codec, '-ab', '192k', '-ar', '44100']
+
+
+def video_codec_args(output_format: str) -> List[str]:
+    # Only use encoding if format requires it, otherwise copy streams
+    if output_format in ['mp4', 'mkv']:
+        return ['-c:v', 'libx264', '-preset', 'fast', '-c:a', 'aac']
+    if output_format in ['webm']:
+        return ['-c:v', 'libvpx', '-b:v', '1M', '-c:a', 'libopus']
+    # For unknown formats, try to copy streams
+    return ['-c:v', 'copy', '-c:a', 'copy']
+
+
 def convert_audio(input_file: str, output_file: str) -> bool:
     """Convert audio files using FFmpeg."""
     try:
         logger.info(f"Starting audio conversion: {input_file} -> {output_file}")
         output_format = Path(output_file).suffix[1:].lower()
-        codec = 'libmp3lame' if output_format == 'mp3' else 'pcm_s16le'
         
         cmd = [
             'ffmpeg',
             '-i', input_file,
-            '-acodec', codec,
-            '-ab', '192k',
-            '-ar', '44100',
+            *audio_codec_args(output_format),
+            '-threads', str(current_allocation().threads),
             output_file,
             '-y'  # Overwrite
         ]
         logger.info(f"Executing command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
+        result = run_tool(cmd)
         output_exists = os.path.exists(output_file)
         logger.info(f"Audio conversion completed: {output_exists}")
         return output_exists
@@ -96,21 +162,11 @@ def convert_video(input_file: str, output_file: str) -> bool:
         output_format = Path(output_file).suffix[1:].lower()
         
         # Build command based on output format
-        cmd = ['ffmpeg', '-i', input_file]
-        
-        # Only use encoding if format requires it, otherwise copy streams
-        if output_format in ['mp4', 'mkv']:
-            cmd.extend(['-c:v', 'libx264', '-preset', 'fast', '-c:a', 'aac'])
-        elif output_format in ['webm']:
-            cmd.extend(['-c:v', 'libvpx', '-b:v', '1M', '-c:a', 'libopus'])
-        else:
-            # For unknown formats, try to copy streams
-            cmd.extend(['-c:v', 'copy', '-c:a', 'copy'])
-        
-        cmd.extend([output_file, '-y'])
+        cmd = ['ffmpeg', '-i', input_file, *video_codec_args(output_format)]
+        cmd.extend(['-threads', str(current_allocation().threads), output_file, '-y'])
         
         logger.info(f"Executing command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
+        result = run_tool(cmd)
         output_exists = os.path.exists(output_file)
         logger.info(f"Video conversion completed: {output_exists}")
         return output_exists
@@ -125,17 +181,22 @@ def convert_video(input_file: str, output_file: str) -> bool:
 
 def convert_image(input_file: str, output_file: str) -> bool:
     output_format = Path(output_file).suffix[1:].lower()
-    if Image is not None:
+    # Huge rasters are converted band by band instead of decoding the whole bitmap
+    large = is_large_image(input_file)
+    if large:
+        logger.info(f"Large image detected, using streaming conversion: {input_file}")
+        if stream_convert(input_file, output_file):
+            return True
+    if Image is not None and not large:
         try:
             with Image.open(input_file) as img:
                 if img.mode in ('RGBA', 'P') and output_format in ['jpg', 'jpeg']:
                     img = img.convert('RGB')
                 elif img.mode == 'P':
                     img = img.convert('RGBA')
-                save_kwargs = {}
-                if output_format in ['jpg', 'jpeg']:
-                    save_kwargs['quality'] = 85
-                img.save(output_file, **save_kwargs)
+                profile = get_profile()
+                img = profile.prepare(img, output_format)
+                img.save(output_file, **profile.save_kwargs(output_format))
             return os.path.exists(output_file)
         except Exception as e:
             logger.error(f"Image conversion error via Pillow: {str(e)}")
@@ -150,7 +211,11 @@ def convert_image(input_file: str, output_file: str) -> bool:
             '-quality', '85',
             output_file
         ]
-        subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
+        if large:
+            # bound ImageMagick's pixel cache; it spills to disk beyond this
+            limit = str(settings.IMAGE_STREAM_BAND_BYTES)
+            cmd[1:1] = ['-limit', 'memory', limit, '-limit', 'map', limit]
+        run_tool(cmd)
         return os.path.exists(output_file)
     except subprocess.CalledProcessError as e:
         logger.error(f"Image conversion error: Command failed with exit code {e.returncode}")
@@ -161,18 +226,40 @@ def convert_image(input_file: str, output_file: str) -> bool:
         return False
 
 
+# Formats pandoc reads and writes well; everything else goes through LibreOffice
+MARKUP_FORMATS = ['md', 'txt', 'html', 'rst', 'tex']
+PANDOC_READABLE = ['docx', 'odt', 'rtf'] + MARKUP_FORMATS
+
+
+def _use_office(input_format: str, output_format: str) -> bool:
+    if input_format in MARKUP_FORMATS:
+        return False
+    # LibreOffice can't write markdown; pandoc reads these inputs natively
+    if output_format in MARKUP_FORMATS and output_format != 'txt':
+        return input_format not in PANDOC_READABLE
+    return True
+
+
 def convert_document(input_file: str, output_file: str) -> bool:
-    """Convert document files using Pandoc."""
+    """Convert office documents with the warm LibreOffice pool and markup with Pandoc."""
+    input_format = Path(input_file).suffix[1:].lower()
+    output_format = Path(output_file).suffix[1:].lower()
+    if _use_office(input_format, output_format):
+        try:
+            if office_pool.available:
+                return office_pool.convert(input_file, output_file, output_format)
+            return office_convert_once(input_file, output_file, output_format)
+        except Exception as e:
+            logger.error(f"Office document conversion error: {str(e)}")
+            return False
     try:
-        output_format = Path(output_file).suffix[1:].lower()
-        
         cmd = [
             'pandoc',
             input_file,
             '-o', output_file,
             f'--to={output_format}'
         ]
-        subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
+        run_tool(cmd)
         return os.path.exists(output_file)
     except Exception as e:
         logger.error(f"Document conversion error: {str(e)}")
@@ -180,57 +267,36 @@ def convert_document(input_file: str, output_file: str) -> bool:
 
 
 def convert_ebook(input_file: str, output_file: str) -> bool:
-    """Convert ebook files using Calibre."""
+    """Convert ebook files on a warm Calibre worker, or one-shot ebook-convert."""
     try:
-        cmd = [
-            'ebook-convert',
-            input_file,
-            output_file
-        ]
-        subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
-        return os.path.exists(output_file)
+        if ebook_pool.available:
+            return ebook_pool.convert(input_file, output_file)
+        return ebook_convert_once(input_file, output_file)
     except Exception as e:
         logger.error(f"Ebook conversion error: {str(e)}")
         return False
 
 
 def convert_archive(input_file: str, output_file: str) -> bool:
-    """Convert archive files."""
+    """Convert archive files by streaming their entries into the new format."""
     try:
-        output_format = Path(output_file).suffix[1:].lower()
-        
-        if output_format == 'zip':
-            cmd = ['zip', '-r', output_file, input_file]
-        elif output_format == '7z':
-            cmd = ['7z', 'a', output_file, input_file]
-        elif output_format == 'tar':
-            cmd = ['tar', '-cf', output_file, input_file]
-        elif output_format in ['gz', 'tar.gz']:
-            cmd = ['tar', '-czf', output_file, input_file]
-        else:
-            return False
-        
-        subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
+        entries, size = repack(input_file, output_file)
+        logger.info(f"Archive repacked: {entries} entries, {size} bytes")
         return os.path.exists(output_file)
     except Exception as e:
         logger.error(f"Archive conversion error: {str(e)}")
         return False
 
 
-def convert_ocr(input_file: str, output_file: str) -> bool:
-    """OCR conversion using Tesseract."""
+def convert_fast(input_file: str, output_file: str) -> bool:
+    """In-process conversion, see app.core.fast_paths."""
     try:
-        output_format = Path(output_file).suffix[1:].lower()
-        output_base = str(Path(output_file).with_suffix(''))
-        
-        cmd = [
-            'tesseract',
-            input_file,
-            output_base,
-            'pdf' if output_format == 'pdf' else 'txt'
-        ]
-        subprocess.run(cmd, check=True, capture_output=True, timeout=settings.PROCESS_TIMEOUT)
-        return os.path.exists(output_file)
+        return run_fast_path(input_file, output_file)
     except Exception as e:
-        logger.error(f"OCR conversion error: {str(e)}")
+        logger.error(f"Fast path conversion error: {str(e)}")
         return False
+
+
+def convert_ocr(input_file: str, output_file: str) -> bool:
+    """OCR conversion using Tesseract, one page at a time in parallel."""
+    return run_ocr(input_file, output_file)
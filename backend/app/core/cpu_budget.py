@@ -0,0 +1,113 @@
+"""CPU budget shared by all conversion workers.
+
+ffmpeg, x264 and tesseract default to one thread per core, so running
+MAX_CONCURRENT_PROCESSES jobs at once oversubscribes the machine several
+times over. The job manager acquires an allocation per job and the
+converters read it back to pass explicit thread counts to their tools.
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _available_cpus() -> List[int]:
+    """CPU ids this process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class CpuAllocation:
+    threads: int = 1
+    cpus: List[int] = field(default_factory=list)
+
+    def env(self) -> Dict[str, str]:
+        """Environment limiting OpenMP based tools (tesseract, leptonica)."""
+        return {
+            "OMP_THREAD_LIMIT": str(self.threads),
+            "OMP_NUM_THREADS": str(self.threads),
+        }
+
+    def pin(self) -> None:
+        """Restrict the calling process to the allocated CPU set."""
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.cpus)
+
+    @contextmanager
+    def activate(self):
+        """Make this allocation visible to converters run from the current context."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+# Allocation of the job running in the current context. asyncio.to_thread
+# copies context, so converters executed off the event loop still see it.
+_current: ContextVar[Optional[CpuAllocation]] = ContextVar("cpu_allocation", default=None)
+
+
+def current_allocation() -> CpuAllocation:
+    allocation = _current.get()
+    if allocation is None:
+        return CpuAllocation(threads=max(1, settings.CPU_BUDGET or len(_available_cpus())))
+    return allocation
+
+
+class CpuBudget:
+    """Hands out thread counts so the sum across running jobs matches the hardware."""
+
+    def __init__(self, total: Optional[int] = None, pinning: Optional[bool] = None):
+        cpus = _available_cpus()
+        self.total = max(1, total or settings.CPU_BUDGET or len(cpus))
+        self.pinning = settings.CPU_PINNING if pinning is None else pinning
+        self._free_cpus = cpus[: self.total]
+        self._active: Dict[str, CpuAllocation] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def allocated(self) -> int:
+        return sum(a.threads for a in self._active.values())
+
+    def acquire(self, job_id: str, pending: int = 0, slots: Optional[int] = None) -> CpuAllocation:
+        """Reserve threads for a job.
+
+        The free part of the budget is split evenly between this job and the
+        jobs expected to start alongside it (queued jobs, capped by the number
+        of worker slots), so a lone job gets the whole machine while a full
+        queue gets an even share each.
+        """
+        slots = slots or settings.MAX_CONCURRENT_PROCESSES
+        with self._lock:
+            running = len(self._active)
+            expected = max(1, min(slots - running, pending + 1))
+            free = self.total - self.allocated
+            threads = max(1, free // expected)
+            cpus: List[int] = []
+            if self.pinning and self._free_cpus:
+                cpus = self._free_cpus[:threads]
+                del self._free_cpus[: len(cpus)]
+            allocation = CpuAllocation(threads=threads, cpus=cpus)
+            self._active[job_id] = allocation
+        logger.info(f"CPU budget: job {job_id} gets {threads} thread(s), {self.allocated}/{self.total} allocated")
+        return allocation
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            allocation = self._active.pop(job_id, None)
+            if allocation and allocation.cpus:
+                self._free_cpus = sorted(self._free_cpus + allocation.cpus)
+
+
+# module level budget instance
+budget = CpuBudget()
@@ -1,16 +1,151 @@
+"""Database engine, tuned per backend.
+
+The engine profile comes from DB_PROFILE, or from the DATABASE_URL scheme
+when that is empty:
+
+- sqlite: WAL journal so the job manager's writes don't block API reads,
+  synchronous=NORMAL (durable across application crashes, a power loss can
+  drop only the last commits), a busy timeout instead of immediate
+  "database is locked" errors, and memory-mapped reads.
+- postgres: a pool sized to the job workers plus DB_POOL_SIZE connections
+  for request handlers, checked before use and recycled periodically.
+  With the default SQLite DATABASE_URL and DB_ENGINE naming postgres, the
+  URL is built from the DB_* settings (e.g. the compose postgres service).
+
+`async_engine` is the same database through an asyncio driver (aiosqlite
+or asyncpg) with the same profile, for handlers and the job manager that
+shouldn't block the event loop or hold a threadpool slot per query.
+"""
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine
 
 from app.core.config import settings
 
-# Create an engine using the configured DATABASE_URL and expose SQLModel as Base
-engine = create_engine(str(settings.DATABASE_URL), echo=settings.DEBUG)
+DEFAULT_DATABASE_URL = "sqlite:///./db.sqlite3"
+
+
+def database_url() -> URL:
+    if settings.DATABASE_URL == DEFAULT_DATABASE_URL and "postgres" in settings.DB_ENGINE:
+        return URL.create(
+            "postgresql+psycopg",
+            username=settings.DB_USER or None,
+            password=settings.DB_PASSWORD or None,
+            host=settings.DB_HOST or None,
+            port=int(settings.DB_PORT) if settings.DB_PORT else None,
+            database=settings.DB_NAME or None,
+        )
+    return make_url(str(settings.DATABASE_URL))
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: URL) -> URL:
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def engine_profile(url: URL) -> str:
+    if settings.DB_PROFILE:
+        return settings.DB_PROFILE
+    return "postgres" if url.get_backend_name() == "postgresql" else url.get_backend_name()
+
+
+def engine_options(profile: str) -> dict:
+    """create_engine() keyword arguments for a profile."""
+    if profile == "sqlite":
+        # sessions are handed between the event loop and worker threads
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT / 1000}}
+    if profile == "postgres":
+        return {
+            "pool_size": settings.MAX_CONCURRENT_PROCESSES + settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        }
+    return {}
+
+
+def sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE) // 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+url = database_url()
+profile = engine_profile(url)
+engine = create_engine(url, echo=settings.DEBUG, **engine_options(profile))
+async_engine = create_async_engine(async_database_url(url), echo=settings.DEBUG, **engine_options(profile))
+if profile == "sqlite":
+    event.listen(engine, "connect", sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", sqlite_pragmas)
 
 # For compatibility with code which expects a 'Base' with metadata
 Base = SQLModel
 
+def _default_sql(column) -> str:
+    default = column.server_default.arg
+    if isinstance(default, str):
+        return "'" + default.replace("'", "''") + "'"
+    return str(default.compile(dialect=engine.dialect))
+
+
+def add_missing_columns() -> None:
+    """create_all() doesn't alter existing tables; add columns declared later."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {_default_sql(column)}"
+                conn.execute(text(ddl))
+
+
+def fill_missing_defaults() -> None:
+    """Give NULLs in required columns their server default, e.g. columns added before they had one."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for column in table.columns:
+                if column.server_default is not None and not column.nullable:
+                    conn.execute(text(
+                        f"UPDATE {table.name} SET {column.name} = {_default_sql(column)} WHERE {column.name} IS NULL"
+                    ))
+
+
+def create_missing_indexes() -> None:
+    """create_all() only indexes the tables it creates; add indexes declared later."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 def init_db() -> None:
     """Create DB tables (if they don't exist). Call during startup."""
     SQLModel.metadata.create_all(bind=engine)
+    add_missing_columns()
+    fill_missing_defaults()
+    create_missing_indexes()
+
+    from app.core.job_changes import changes as job_changes
+    job_changes.seed(engine)
 
     # Create default superuser if missing
     try:
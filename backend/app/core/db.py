@@ -1,3 +1,3 @@
-from app.core.database import engine
+from app.core.database import async_engine, engine
 
-__all__ = ["engine"]
+__all__ = ["engine", "async_engine"]
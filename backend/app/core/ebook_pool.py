@@ -0,0 +1,167 @@
+"""Pool of warm Calibre processes for ebook conversion.
+
+`ebook-convert` spends most of a small book's conversion starting Calibre's
+interpreter and loading its plugins. Instead EBOOK_POOL_SIZE processes run
+app/core/calibre_worker.py under `calibre-debug -e`, each converting one
+book at a time over a JSON-lines protocol on its stdin/stdout, so start-up
+is paid once per worker. Workers are recycled after EBOOK_MAX_CONVERSIONS
+books or any failure, and a conversion that exceeds PROCESS_TIMEOUT kills
+its worker.
+
+When Calibre isn't installed or the pool is disabled, `convert_once` runs a
+one-shot `ebook-convert` instead.
+"""
+import os
+import json
+import queue
+import select
+import shutil
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.tools import run_tool
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = str(Path(__file__).with_name('calibre_worker.py'))
+
+
+class EbookWorker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[subprocess.Popen] = None
+        self.ready = False
+        self.conversions = 0
+
+    def start(self) -> None:
+        self.ready = False
+        self.conversions = 0
+        self.process = subprocess.Popen(
+            ['calibre-debug', '-e', WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        logger.info(f"Ebook worker {self.index} starting (PID: {self.process.pid})")
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.ready = False
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _read(self, timeout: float) -> Optional[dict]:
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            return None
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Ebook worker {self.index} exited")
+        return json.loads(line)
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready:
+            message = self._read(timeout)
+            self.ready = bool(message and message.get('ready'))
+        return self.ready
+
+    def convert(self, input_file: str, output_file: str, args: List[str]) -> None:
+        request = {'input': os.path.abspath(input_file), 'output': os.path.abspath(output_file), 'args': args}
+        self.process.stdin.write(json.dumps(request) + '\n')
+        self.process.stdin.flush()
+        response = self._read(settings.PROCESS_TIMEOUT)
+        if response is None:
+            raise TimeoutError(f"Ebook conversion timed out after {settings.PROCESS_TIMEOUT}s")
+        self.conversions += 1
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error') or 'conversion failed')
+
+
+class EbookPool:
+    def __init__(self, size: Optional[int] = None):
+        self.size = settings.EBOOK_POOL_SIZE if size is None else size
+        self.workers: List[EbookWorker] = []
+        self._idle: "queue.Queue[EbookWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.workers)
+
+    def start(self) -> None:
+        """Spawn the workers; they load Calibre in the background."""
+        with self._lock:
+            if self.workers or self.size <= 0:
+                return
+            if shutil.which('calibre-debug') is None:
+                logger.info("calibre-debug not installed, ebooks use one-shot ebook-convert")
+                return
+            for i in range(self.size):
+                worker = EbookWorker(i)
+                worker.start()
+                self.workers.append(worker)
+                self._idle.put(worker)
+
+    def stop(self) -> None:
+        with self._lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            self._idle = queue.Queue()
+
+    def convert(self, input_file: str, output_file: str, args: Optional[List[str]] = None) -> bool:
+        """Convert on a warm worker; recycle it on failure or after its conversion quota."""
+        try:
+            worker = self._idle.get(timeout=settings.PROCESS_TIMEOUT)
+        except queue.Empty:
+            logger.error("No ebook worker became idle in time")
+            return False
+        try:
+            if not worker.alive():
+                logger.warning(f"Ebook worker {worker.index} exited, restarting")
+                worker.restart()
+            if not worker.wait_ready(settings.EBOOK_START_TIMEOUT):
+                logger.error(f"Ebook worker {worker.index} failed to start")
+                worker.restart()
+                return False
+            worker.convert(input_file, output_file, args or [])
+            if worker.conversions >= settings.EBOOK_MAX_CONVERSIONS:
+                logger.info(f"Recycling ebook worker {worker.index} after {worker.conversions} conversions")
+                worker.restart()
+            return os.path.exists(output_file)
+        except Exception as e:
+            logger.error(f"Ebook conversion error on worker {worker.index}: {str(e)}")
+            if worker.alive():
+                worker.process.kill()
+            worker.restart()
+            return False
+        finally:
+            self._idle.put(worker)
+
+
+def convert_once(input_file: str, output_file: str, args: Optional[List[str]] = None) -> bool:
+    """Cold-start fallback: one ebook-convert process per book."""
+    run_tool(['ebook-convert', input_file, output_file] + list(args or []))
+    return os.path.exists(output_file)
+
+
+# module level pool instance
+pool = EbookPool()
@@ -0,0 +1,149 @@
+"""In-process converters for conversions that need no external tool.
+
+Same-format "conversions" (including aliases such as jpg/jpeg) and the
+plain text <-> Markdown pair are done in Python, in memory. get_converter
+checks these before any subprocess converter, and the upload endpoint runs
+them inside the request for files up to FAST_PATH_MAX_BYTES, so they never
+wait in the queue. A same-format job that asks for a transform (an image
+profile, say) is a real re-encode and doesn't get the copy.
+"""
+import os
+import re
+import shutil
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ALIASES = {
+    'jpeg': 'jpg',
+    'tif': 'tiff',
+    'htm': 'html',
+    'markdown': 'md',
+    'yml': 'yaml',
+}
+
+# same-format pairs that still do real work: pdf -> pdf means OCR
+_REWRITE_SAME = {'pdf'}
+
+
+def canonical_format(fmt: str) -> str:
+    fmt = fmt.lower().lstrip('.')
+    return _ALIASES.get(fmt, fmt)
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # legacy text files are most often Windows-1252; latin-1 never fails
+        try:
+            return data.decode('cp1252')
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
+
+
+def identity(data: bytes) -> bytes:
+    return data
+
+
+_MD_INLINE = re.compile(r'([\\`*_\[\]<>|])')
+_MD_BLOCK_START = re.compile(r'^(\s*)([#>+=~-]|\d+(?=[.)]))')
+
+
+def text_to_markdown(data: bytes) -> bytes:
+    """Plain text as Markdown that renders to the same text and line breaks."""
+    lines = _decode(data).splitlines()
+    out = []
+    for index, line in enumerate(lines):
+        line = _MD_INLINE.sub(r'\\\1', line)
+        # a leading "#", "-", "1." etc. would start a heading, list or quote
+        match = _MD_BLOCK_START.match(line)
+        if match:
+            end = match.end()
+            if line[end - 1].isdigit():
+                line = line[:end] + '\\' + line[end:]
+            else:
+                line = line[:match.start(2)] + '\\' + line[match.start(2):]
+        next_line = lines[index + 1] if index + 1 < len(lines) else ''
+        if line.strip() and next_line.strip():
+            line += '\\'  # hard line break, text files break lines on purpose
+        out.append(line)
+    return ('\n'.join(out) + '\n').encode('utf-8')
+
+
+_MD_RULES = [
+    (re.compile(r'^\s{0,3}#{1,6}\s+(.*?)(\s+#+)?\s*$'), r'\1'),   # ATX headings
+    (re.compile(r'^\s{0,3}([=-])\1{2,}\s*$'), ''),                  # setext underlines, rules
+    (re.compile(r'^\s{0,3}>\s?'), ''),                               # block quotes
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),                  # images -> alt text
+    (re.compile(r'\[([^\]]+)\]\(\s*<?([^)\s>]+)>?[^)]*\)'), r'\1 (\2)'),  # links
+    (re.compile(r'<((?:https?|mailto):[^>\s]+)>'), r'\1'),           # autolinks
+    (re.compile(r'`([^`]+)`'), r'\1'),                               # inline code
+    (re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1'), r'\2'),           # bold
+    (re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])'), r'\1'),  # italic
+    (re.compile(r'(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])'), r'\1'),
+    (re.compile(r'~~(.+?)~~'), r'\1'),                               # strikethrough
+    (re.compile(r'</?[A-Za-z][^>]*>'), ''),                          # inline HTML
+]
+_HARD_BREAK = re.compile(r'((?:^|[^\\])(?:\\\\)*)\\$')  # odd trailing backslash
+# escaped punctuation is parked in the private use area while the rules run
+_ESCAPED = re.compile(r'\\([!-/:-@\[-`{-~])')
+_PARKED = re.compile('[\ue000-\ue07f]')
+_FENCE = re.compile(r'^\s{0,3}(```|~~~)')
+
+
+def markdown_to_text(data: bytes) -> bytes:
+    """Markdown with its markup stripped: headings, emphasis, links as "text (url)"."""
+    out = []
+    in_code = False
+    for line in _decode(data).splitlines():
+        if _FENCE.match(line):
+            in_code = not in_code
+            continue
+        if not in_code:
+            line = _ESCAPED.sub(lambda m: chr(0xe000 + ord(m.group(1))), _HARD_BREAK.sub(r'\1', line))
+            for pattern, replacement in _MD_RULES:
+                line = pattern.sub(replacement, line)
+            line = _PARKED.sub(lambda m: chr(ord(m.group()) - 0xe000), line)
+        out.append(line.rstrip())
+    return ('\n'.join(out).strip('\n') + '\n').encode('utf-8')
+
+
+FAST_PATHS: Dict[Tuple[str, str], Callable[[bytes], bytes]] = {
+    ('txt', 'md'): text_to_markdown,
+    ('md', 'txt'): markdown_to_text,
+}
+
+
+def get_fast_path(input_format: str, output_format: str,
+                  options: Optional[dict] = None) -> Optional[Callable[[bytes], bytes]]:
+    """In-memory converter for this format pair and job options, if one exists."""
+    source, target = canonical_format(input_format), canonical_format(output_format)
+    if source == target and source not in _REWRITE_SAME:
+        # copying would silently drop whatever the options ask for
+        if options and any(value is not None for value in options.values()):
+            return None
+        return identity
+    return FAST_PATHS.get((source, target))
+
+
+def run_fast_path(input_file: str, output_file: str, input_format: Optional[str] = None,
+                  output_format: Optional[str] = None) -> bool:
+    """Convert `input_file` in memory into `output_file`; formats default to the extensions."""
+    fast = get_fast_path(input_format or os.path.splitext(input_file)[1],
+                         output_format or os.path.splitext(output_file)[1])
+    if fast is None:
+        return False
+    if fast is identity:
+        # nothing to decode; link or copy instead of reading it into memory
+        try:
+            os.link(input_file, output_file)
+        except OSError:
+            shutil.copyfile(input_file, output_file)
+        return os.path.exists(output_file)
+    with open(input_file, 'rb') as fp:
+        data = fast(fp.read())
+    with open(output_file, 'wb') as out:
+        out.write(data)
+    return os.path.exists(output_file)
@@ -0,0 +1,85 @@
+"""Already-uploaded files, referenced instead of sent again.
+
+POST /processing/upload stores a file under TEMP_DIR/<fileId>/ and returns
+the fileId; POST /uploads/ stores it as UPLOAD_DIR/<user>/<filename>.
+Jobs created from either reference get the file linked into their upload
+directory rather than copied: a hardlink, or a reflink (copy-on-write
+clone, on btrfs/XFS) where hardlinks aren't allowed, and a real copy only
+as a last resort. One upload can then feed any number of jobs.
+"""
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl(dest, FICLONE, src) from linux/fs.h
+FICLONE = 0x40049409
+
+
+class FileReferenceError(LookupError):
+    pass
+
+
+def temp_upload(file_id: str) -> Path:
+    """Resolve a fileId returned by POST /processing/upload to the stored file."""
+    try:
+        uuid.UUID(file_id)
+    except ValueError:
+        raise ValueError(f'Invalid fileId: {file_id}')
+    target = settings.TEMP_DIR / file_id
+    files = sorted(p for p in target.iterdir() if p.is_file()) if target.is_dir() else []
+    if not files:
+        raise FileReferenceError(f'File not found: {file_id}')
+    return files[0]
+
+
+def user_upload(user_id, filename: str) -> Path:
+    """Resolve a filename stored by POST /uploads/ for this user."""
+    name = os.path.basename(filename)
+    if not name or name != filename or name in ('.', '..'):
+        raise ValueError(f'Invalid filename: {filename}')
+    path = settings.UPLOAD_DIR / str(user_id) / name
+    if not path.is_file():
+        raise FileReferenceError(f'File not found: {filename}')
+    return path
+
+
+def resolve(user_id, file_id: Optional[str] = None, filename: Optional[str] = None) -> Path:
+    """The stored file a fileId or an uploaded filename refers to."""
+    if file_id:
+        return temp_upload(file_id)
+    if filename:
+        return user_upload(user_id, filename)
+    raise ValueError('A fileId or filename is required')
+
+
+def _reflink(source: Path, dest: Path) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        dest.unlink(missing_ok=True)
+        return False
+
+
+def link_into(source: Path, dest_dir: Path, name: Optional[str] = None) -> Path:
+    """Hardlink, reflink or, failing both, copy an uploaded file into a job directory."""
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / (name or source.name)
+    try:
+        os.link(source, dest)
+    except OSError:
+        if not _reflink(source, dest):
+            shutil.copy2(source, dest)
+    return dest
@@ -0,0 +1,202 @@
+"""In-process image operations (resize, compress, convert).
+
+An operation list such as
+
+    [{"op": "resize", "width": 800}, {"op": "compress", "quality": 70},
+     {"op": "convert", "format": "webp"}]
+
+is applied to a single decode of the source. All resizes are folded into one
+target size up front so JPEG sources can be decoded at reduced scale with
+`draft()` and the remaining downscale is done with `reducing_gap`.
+"""
+import io
+import os
+import json
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.cpu_budget import current_allocation
+from app.core.image_profiles import ImageProfile, get_profile
+from app.core.tools import submit_in_context
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_OPERATIONS = ['resize', 'compress', 'convert']
+
+# `compress` quality when neither a quality nor a profile is given
+COMPRESS_QUALITY = 75
+
+# Pillow format names for output extensions
+_PIL_FORMATS = {
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'gif': 'GIF',
+    'webp': 'WEBP',
+    'bmp': 'BMP',
+    'tiff': 'TIFF',
+    'tif': 'TIFF',
+}
+
+_ORIENTATION = 0x0112
+
+
+def handles_format(fmt: str) -> bool:
+    """Whether the in-process pipeline can decode and encode `fmt`."""
+    return Image is not None and fmt.lower() in _PIL_FORMATS
+
+
+def _fit(size: Tuple[int, int], op: Dict) -> Tuple[int, int]:
+    """Apply a single resize operation to a (width, height) pair."""
+    width, height = size
+    if op.get('scale'):
+        scale = float(op['scale'])
+        return max(1, round(width * scale)), max(1, round(height * scale))
+    target_w, target_h = op.get('width'), op.get('height')
+    if not target_w and not target_h:
+        return size
+    if op.get('fit') == 'exact' and target_w and target_h:
+        return int(target_w), int(target_h)
+    ratio = min(
+        target_w / width if target_w else float('inf'),
+        target_h / height if target_h else float('inf'),
+    )
+    if ratio >= 1 and not op.get('upscale'):
+        return size
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def target_size(size: Tuple[int, int], operations: List[Dict]) -> Optional[Tuple[int, int]]:
+    """Final size after every resize in `operations`, None if unchanged."""
+    result = size
+    for op in operations:
+        if op.get('op') == 'resize':
+            result = _fit(result, op)
+    return None if result == size else result
+
+
+def output_format(operations: List[Dict], default: str) -> str:
+    fmt = default
+    for op in operations:
+        if op.get('op') == 'convert' and op.get('format'):
+            fmt = op['format']
+    return fmt.lower()
+
+
+def _encoding(operations: List[Dict]) -> Tuple[ImageProfile, Optional[int]]:
+    """Encoder profile and quality override; `compress` defaults to the small profile."""
+    profile, quality = get_profile(), None
+    for op in operations:
+        if op.get('op') == 'compress':
+            profile = get_profile(op.get('profile') or 'small')
+            # the profile's quality only applies when one was asked for
+            quality = op.get('quality') or (None if op.get('profile') else COMPRESS_QUALITY)
+    return profile, quality
+
+
+def process_image(source, operations: List[Dict], fmt: str):
+    """Decode `source` once, apply `operations` and return the encoded bytes."""
+    with Image.open(source) as img:
+        size = img.size
+        transposed = img.getexif().get(_ORIENTATION) in (5, 6, 7, 8)
+        oriented = (size[1], size[0]) if transposed else size
+        target = target_size(oriented, operations)
+
+        if target and img.format == 'JPEG':
+            # let libjpeg downscale by 1/2, 1/4 or 1/8 while decoding
+            draft_size = (target[1], target[0]) if transposed else target
+            img.draft(img.mode, draft_size)
+
+        img = ImageOps.exif_transpose(img)
+        if target and img.size != target:
+            img = img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+
+        if img.mode in ('RGBA', 'LA', 'P') and fmt in ['jpg', 'jpeg']:
+            img = img.convert('RGB')
+        elif img.mode == 'P' and fmt != 'gif':
+            img = img.convert('RGBA')
+        elif img.mode == 'CMYK' and fmt not in ['jpg', 'jpeg', 'tiff', 'tif']:
+            img = img.convert('RGB')
+
+        profile, quality = _encoding(operations)
+        img = profile.prepare(img, fmt)
+        buffer = io.BytesIO()
+        img.save(buffer, format=_PIL_FORMATS.get(fmt, fmt.upper()), **profile.save_kwargs(fmt, quality))
+        return buffer.getvalue()
+
+
+def run_image_operations(input_file: str, output_file: str, operations: List[Dict]) -> bool:
+    """Apply an operation list to one image."""
+    if Image is None:
+        logger.error("Image operations require Pillow")
+        return False
+    try:
+        fmt = output_format(operations, Path(output_file).suffix[1:] or Path(input_file).suffix[1:])
+        data = process_image(input_file, operations, fmt)
+        with open(output_file, 'wb') as out:
+            out.write(data)
+        return os.path.exists(output_file)
+    except Exception as e:
+        logger.error(f"Image operation error: {str(e)}")
+        return False
+
+
+def run_image_batch(input_dir: str, output_file: str, operations: List[Dict]) -> bool:
+    """Apply an operation list to every image in `input_dir` and zip the results.
+
+    Pillow releases the GIL while decoding, resampling and encoding, so images
+    are processed on as many threads as the job's CPU allocation allows.
+    """
+    if Image is None:
+        logger.error("Image operations require Pillow")
+        return False
+    sources = sorted(p for p in Path(input_dir).iterdir() if p.is_file())
+    if not sources:
+        return False
+
+    def _one(path: Path):
+        fmt = output_format(operations, path.suffix[1:])
+        return f"{path.stem}.{fmt}", process_image(str(path), operations, fmt)
+
+    failed = {}
+    names = set()
+
+    def _collect(archive: zipfile.ZipFile, path: Path, future) -> None:
+        try:
+            name, data = future.result()
+        except Exception as e:
+            logger.error(f"Batch image operation error for {path.name}: {str(e)}")
+            failed[path.name] = str(e)
+            return
+        stem, ext = name.rsplit('.', 1)
+        counter = 1
+        while name in names:
+            name = f"{stem}_{counter}.{ext}"
+            counter += 1
+        names.add(name)
+        archive.writestr(name, data)
+
+    threads = current_allocation().threads
+    with ThreadPoolExecutor(max_workers=threads) as pool, \
+            zipfile.ZipFile(output_file, 'w', zipfile.ZIP_STORED) as archive:
+        # keep a bounded window in flight so encoded results don't pile up
+        pending = deque()
+        for path in sources:
+            pending.append((path, submit_in_context(pool, _one, path)))
+            if len(pending) >= threads * 2:
+                _collect(archive, *pending.popleft())
+        while pending:
+            _collect(archive, *pending.popleft())
+        if failed:
+            archive.writestr('errors.json', json.dumps(failed, indent=2))
+    logger.info(f"Batch image operations: {len(names)} ok, {len(failed)} failed")
+    return len(names) > 0
@@ -0,0 +1,116 @@
+"""Image encoder profiles trading CPU time for output size.
+
+    fast      cheapest encode: baseline JPEG, WebP method 0, PNG zlib level 1
+    balanced  default: Huffman-optimised JPEG, WebP method 4, PNG level 6
+    small     progressive JPEG, WebP method 6, PNG optimize (zlib level 9)
+    smallest  as `small` with lower JPEG/WebP quality and PNG quantised to a
+              256 colour palette (lossy)
+
+Run benchmarks/bench_image_profiles.py to see bytes against milliseconds per
+profile on your own images.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    name: str
+    jpeg_quality: int = 85
+    jpeg_optimize: bool = False
+    jpeg_progressive: bool = False
+    webp_quality: int = 80
+    webp_method: int = 4
+    png_compress_level: int = 6
+    png_optimize: bool = False
+    png_palette: bool = False
+
+    def save_kwargs(self, fmt: str, quality: Optional[int] = None) -> Dict:
+        """Pillow save() arguments for `fmt`; `quality` overrides the profile's."""
+        fmt = fmt.lower()
+        if fmt in ['jpg', 'jpeg']:
+            return {
+                'quality': quality or self.jpeg_quality,
+                'optimize': self.jpeg_optimize,
+                'progressive': self.jpeg_progressive,
+            }
+        if fmt == 'webp':
+            return {'quality': quality or self.webp_quality, 'method': self.webp_method}
+        if fmt == 'png':
+            return {'compress_level': self.png_compress_level, 'optimize': self.png_optimize}
+        return {}
+
+    def prepare(self, img: 'Image.Image', fmt: str) -> 'Image.Image':
+        """Lossy pre-encode steps (palette quantisation) for this profile."""
+        if fmt.lower() != 'png' or not self.png_palette or img.mode not in ('RGB', 'RGBA'):
+            return img
+        # median cut gives better palettes but only handles RGB
+        method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+        return img.quantize(colors=256, method=method, dither=Image.Dither.FLOYDSTEINBERG)
+
+    @contextmanager
+    def activate(self):
+        """Make this profile visible to converters run from the current context."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+PROFILES: Dict[str, ImageProfile] = {
+    'fast': ImageProfile(
+        name='fast',
+        webp_method=0,
+        png_compress_level=1,
+    ),
+    'balanced': ImageProfile(
+        name='balanced',
+        jpeg_optimize=True,
+    ),
+    'small': ImageProfile(
+        name='small',
+        jpeg_optimize=True,
+        jpeg_progressive=True,
+        webp_method=6,
+        png_compress_level=9,
+        png_optimize=True,
+    ),
+    'smallest': ImageProfile(
+        name='smallest',
+        jpeg_quality=75,
+        jpeg_optimize=True,
+        jpeg_progressive=True,
+        webp_quality=75,
+        webp_method=6,
+        png_compress_level=9,
+        png_optimize=True,
+        png_palette=True,
+    ),
+}
+
+_current: ContextVar[Optional[ImageProfile]] = ContextVar("image_profile", default=None)
+
+
+def get_profile(name: Optional[str] = None) -> ImageProfile:
+    """Profile by name, falling back to the active one and then IMAGE_ENCODE_PROFILE."""
+    if name:
+        if name not in PROFILES:
+            raise ValueError(f"Unknown image profile: {name}")
+        return PROFILES[name]
+    active = _current.get()
+    if active is not None:
+        return active
+    return PROFILES.get(settings.IMAGE_ENCODE_PROFILE, PROFILES['balanced'])
@@ -0,0 +1,226 @@
+"""Strip/tile based conversion of very large rasters.
+
+`Image.open(...).save(...)` decodes the whole bitmap, which for gigapixel
+scans means many GB of RAM. Rasters above LARGE_IMAGE_PIXELS are converted
+band by band instead so memory stays bounded by IMAGE_STREAM_BAND_BYTES:
+
+* libvips (pyvips), when installed, streams any format in sequential mode;
+* otherwise uncompressed strip or tile TIFFs are decoded one band of
+  strips at a time with Pillow and written with a streaming PNG encoder.
+
+Anything else returns False so the caller can fall back to ImageMagick
+with bounded pixel cache limits.
+"""
+import os
+import struct
+import zlib
+import logging
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    from PIL import Image, TiffImagePlugin
+except ImportError:
+    Image = None
+
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+logger = logging.getLogger(__name__)
+
+# source mode -> (streamed mode, PNG colour type)
+_PNG_MODES = {
+    '1': ('L', 0),
+    'L': ('L', 0),
+    'P': ('RGB', 2),
+    'RGB': ('RGB', 2),
+    'CMYK': ('RGB', 2),
+    'YCbCr': ('RGB', 2),
+    'LA': ('LA', 4),
+    'RGBA': ('RGBA', 6),
+}
+
+
+def image_pixels(input_file: str) -> Optional[int]:
+    """Pixel count read from the image header, None if it can't be parsed."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(input_file) as img:
+            width, height = img.size
+            return width * height
+    except Image.DecompressionBombError:
+        # refused by Pillow's own limit, so certainly large
+        return settings.LARGE_IMAGE_PIXELS + 1
+    except Exception:
+        return None
+
+
+def is_large_image(input_file: str) -> bool:
+    pixels = image_pixels(input_file)
+    return pixels is not None and pixels > settings.LARGE_IMAGE_PIXELS
+
+
+def _png_chunk(fp: BinaryIO, tag: bytes, data: bytes) -> None:
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(tag)
+    fp.write(data)
+    fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xffffffff))
+
+
+class PngStreamWriter:
+    """Write an 8-bit PNG incrementally, one band of rows at a time."""
+
+    def __init__(self, fp: BinaryIO, width: int, height: int, mode: str, level: int = 6):
+        self.fp = fp
+        self.mode, colour_type = _PNG_MODES[mode]
+        self.row_bytes = width * len(self.mode)
+        self._compressor = zlib.compressobj(level)
+        fp.write(b'\x89PNG\r\n\x1a\n')
+        _png_chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, colour_type, 0, 0, 0))
+
+    def write(self, band: 'Image.Image') -> None:
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        raw = band.tobytes()
+        rows = bytearray()
+        for start in range(0, len(raw), self.row_bytes):
+            rows.append(0)  # filter type: none
+            rows += raw[start:start + self.row_bytes]
+        data = self._compressor.compress(bytes(rows))
+        if data:
+            _png_chunk(self.fp, b'IDAT', data)
+
+    def close(self) -> None:
+        _png_chunk(self.fp, b'IDAT', self._compressor.flush())
+        _png_chunk(self.fp, b'IEND', b'')
+
+
+def _open_tiff(input_file: str) -> 'TiffImagePlugin.TiffImageFile':
+    # constructing the plugin directly skips Image.open's decompression bomb
+    # check, which is exactly what bounded band decoding makes unnecessary
+    return TiffImagePlugin.TiffImageFile(input_file)
+
+
+def _band_ranges(tiles: List, band_rows: int) -> List[Tuple[int, int]]:
+    """Row ranges aligned to strip/tile boundaries, each about band_rows high."""
+    boundaries = sorted({tile[1][1] for tile in tiles} | {tile[1][3] for tile in tiles})
+    ranges = []
+    top = boundaries[0]
+    for bottom in boundaries[1:]:
+        if bottom - top >= band_rows or bottom == boundaries[-1]:
+            ranges.append((top, bottom))
+            top = bottom
+    return ranges
+
+
+def _retile(tile, extents: Tuple[int, int, int, int], offset: Optional[int] = None):
+    """Copy of a tile descriptor with new extents (and optionally offset)."""
+    offset = tile[2] if offset is None else offset
+    return (tile[0], extents, offset) + tuple(tile[3:])
+
+
+def _shift_tile(tile, top: int):
+    x0, y0, x1, y1 = tile[1]
+    return _retile(tile, (x0, y0 - top, x1, y1 - top))
+
+
+def _row_bytes(img: 'TiffImagePlugin.TiffImageFile') -> int:
+    bits = img.tag_v2.get(TiffImagePlugin.BITSPERSAMPLE, 1)  # TIFF default
+    if isinstance(bits, tuple):
+        bits_per_pixel = sum(bits)
+    else:
+        bits_per_pixel = bits * img.tag_v2.get(TiffImagePlugin.SAMPLESPERPIXEL, 1)
+    return (img.size[0] * bits_per_pixel + 7) // 8
+
+
+def _split_strips(tiles: List, width: int, row_bytes: int, band_rows: int) -> List:
+    """Cut full-width uncompressed strips taller than a band into band-sized pieces.
+
+    Pillow describes contiguous single-strip images as one tile; raw rows sit
+    at fixed offsets so the strip can be addressed a band at a time.
+    """
+    split = []
+    for tile in tiles:
+        x0, y0, x1, y1 = tile[1]
+        if tile[0] != 'raw' or x0 != 0 or x1 != width or y1 - y0 <= band_rows:
+            split.append(tile)
+            continue
+        for top in range(y0, y1, band_rows):
+            bottom = min(top + band_rows, y1)
+            split.append(_retile(tile, (0, top, width, bottom), tile[2] + (top - y0) * row_bytes))
+    return split
+
+
+def iter_tiff_bands(input_file: str, band_bytes: Optional[int] = None) -> Iterator[Tuple[int, 'Image.Image']]:
+    """Yield (top row, band image) decoding only the strips each band covers."""
+    with _open_tiff(input_file) as img:
+        width, height = img.size
+        row_bytes = _row_bytes(img)
+        band_rows = max(1, (band_bytes or settings.IMAGE_STREAM_BAND_BYTES) // max(1, row_bytes))
+        tiles = _split_strips(list(img.tile), width, row_bytes, band_rows)
+
+    for top, bottom in _band_ranges(tiles, band_rows):
+        band_tiles = [_shift_tile(t, top) for t in tiles if t[1][1] >= top and t[1][3] <= bottom]
+        with _open_tiff(input_file) as band:
+            band._size = (width, bottom - top)
+            band.tile = band_tiles
+            band.load()
+            yield top, band
+
+
+def _can_stream_tiff(input_file: str, output_format: str) -> bool:
+    if Image is None or output_format != 'png':
+        return False
+    try:
+        with _open_tiff(input_file) as img:
+            return (
+                img.mode in _PNG_MODES
+                and img.tag_v2.get(TiffImagePlugin.PLANAR_CONFIGURATION, 1) == 1
+                and all(tile[0] == 'raw' for tile in img.tile)
+            )
+    except Exception:
+        return False
+
+
+def _convert_with_vips(input_file: str, output_file: str, output_format: str) -> bool:
+    image = pyvips.Image.new_from_file(input_file, access='sequential')
+    save_kwargs = {}
+    if output_format in ['jpg', 'jpeg']:
+        if image.hasalpha():
+            image = image.flatten(background=255)
+        save_kwargs['Q'] = 85
+    image.write_to_file(output_file, **save_kwargs)
+    return os.path.exists(output_file)
+
+
+def _convert_with_strips(input_file: str, output_file: str) -> bool:
+    with _open_tiff(input_file) as img:
+        width, height = img.size
+        mode = img.mode
+    with open(output_file, 'wb') as fp:
+        writer = PngStreamWriter(fp, width, height, mode)
+        for _, band in iter_tiff_bands(input_file):
+            writer.write(band)
+        writer.close()
+    return os.path.exists(output_file)
+
+
+def stream_convert(input_file: str, output_file: str) -> bool:
+    """Convert a large raster with bounded memory. False if no streaming path applies."""
+    output_format = Path(output_file).suffix[1:].lower()
+    try:
+        if pyvips is not None:
+            logger.info(f"Streaming large image with libvips: {input_file} -> {output_file}")
+            return _convert_with_vips(input_file, output_file, output_format)
+        if _can_stream_tiff(input_file, output_format):
+            logger.info(f"Streaming large TIFF by strips: {input_file} -> {output_file}")
+            return _convert_with_strips(input_file, output_file)
+    except Exception as e:
+        logger.error(f"Streaming image conversion error: {str(e)}")
+        Path(output_file).unlink(missing_ok=True)
+    return False
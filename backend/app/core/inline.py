@@ -0,0 +1,132 @@
+"""Whole-in-memory conversion for POST /conversions/inline.
+
+Small files skip the job queue entirely: the upload is read into memory,
+converted and returned in the same response. Images are decoded from and
+encoded to BytesIO with Pillow, audio and video go through ffmpeg with the
+input on stdin and the output on stdout, and the fast paths need no tool
+at all. Nothing touches the upload or results directories.
+
+Images are checked against INLINE_MAX_PIXELS from their header before
+anything is decoded: a small file can still expand to gigabytes, and
+inline conversions run outside the job manager's memory budget.
+
+Only formats ffmpeg can mux to a pipe are offered; MP4-family outputs are
+written fragmented because a pipe can't be seeked back to the moov atom,
+and MP4-family inputs aren't taken at all for the same reason.
+"""
+import io
+import subprocess
+import logging
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.cpu_budget import current_allocation
+from app.core.tools import run_tool
+from app.core.fast_paths import get_fast_path
+from app.core.image_pipeline import handles_format, process_image
+from app.core.converters import audio_codec_args, video_codec_args
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+AUDIO_INPUTS = ['mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a', 'wma', 'opus']
+VIDEO_INPUTS = ['mp4', 'mkv', 'avi', 'mov', 'flv', 'wmv', 'webm', 'ts', 'mts']
+# MP4-family files usually keep their moov atom at the end, which ffmpeg
+# can't seek back to on stdin; these go through the job queue
+SEEKABLE_INPUTS = {'mp4', 'mov', 'm4a'}
+
+# ffmpeg muxer per output format, for formats that can be written to a pipe
+PIPE_MUXERS = {
+    'mp3': 'mp3',
+    'wav': 'wav',
+    'flac': 'flac',
+    'ogg': 'ogg',
+    'opus': 'opus',
+    'aac': 'adts',
+    'm4a': 'ipod',
+    'mp4': 'mp4',
+    'mov': 'mov',
+    'mkv': 'matroska',
+    'webm': 'webm',
+    'ts': 'mpegts',
+}
+_FRAGMENTED = {'mp4', 'mov', 'm4a'}
+
+
+class InlineConversionError(ValueError):
+    pass
+
+
+class InlineTooLargeError(InlineConversionError):
+    pass
+
+
+def _check_pixels(data: bytes) -> None:
+    """Refuse images whose decoded size is over INLINE_MAX_PIXELS, reading the header only."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+    except Exception:
+        return  # not an image Pillow knows; the conversion reports it
+    if width * height > settings.INLINE_MAX_PIXELS:
+        raise InlineTooLargeError(f"{width}x{height} image is too large to convert inline")
+
+
+def inline_tool(input_format: str, output_format: str, options: Optional[dict] = None) -> str:
+    """Which in-memory converter handles this pair and these options, '' if none does."""
+    input_format, output_format = input_format.lower(), output_format.lower()
+    if get_fast_path(input_format, output_format, options):
+        return 'fast'
+    if handles_format(input_format) and handles_format(output_format):
+        return 'pillow'
+    if input_format in SEEKABLE_INPUTS:
+        return ''
+    if output_format in PIPE_MUXERS and (input_format in AUDIO_INPUTS or input_format in VIDEO_INPUTS):
+        return 'ffmpeg'
+    return ''
+
+
+def _ffmpeg_pipe(data: bytes, input_format: str, output_format: str) -> bytes:
+    if input_format in AUDIO_INPUTS:
+        codec = audio_codec_args(output_format)
+    else:
+        codec = video_codec_args(output_format)
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', *codec,
+           '-threads', str(current_allocation().threads)]
+    if output_format in _FRAGMENTED:
+        cmd.extend(['-movflags', 'frag_keyframe+empty_moov'])
+    cmd.extend(['-f', PIPE_MUXERS[output_format], 'pipe:1'])
+    return run_tool(cmd, input=data).stdout
+
+
+def convert_bytes(data: bytes, input_format: str, output_format: str,
+                  options: Optional[dict] = None) -> Tuple[bytes, str]:
+    """Convert `data` in memory; returns the result and the tool that made it."""
+    input_format, output_format = input_format.lower(), output_format.lower()
+    tool = inline_tool(input_format, output_format, options)
+    if not tool:
+        raise InlineConversionError(f"{input_format} -> {output_format} can't be converted inline")
+    try:
+        if tool == 'fast':
+            result = get_fast_path(input_format, output_format, options)(data)
+        elif tool == 'pillow':
+            _check_pixels(data)
+            result = process_image(io.BytesIO(data), [], output_format)
+        else:
+            result = _ffmpeg_pipe(data, input_format, output_format)
+    except InlineTooLargeError:
+        raise
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors='replace').strip() if e.stderr else ''
+        logger.error(f"Inline {tool} conversion failed with exit code {e.returncode}: {stderr}")
+        raise InlineConversionError(f"Conversion failed: {stderr or 'ffmpeg error'}")
+    except Exception as e:
+        logger.error(f"Inline {tool} conversion error: {str(e)}")
+        raise InlineConversionError(f"Conversion failed: {str(e)}")
+    if not result:
+        raise InlineConversionError("Conversion produced no output")
+    return result, tool
@@ -0,0 +1,139 @@
+"""Moves finished jobs out of the hot `jobs` table.
+
+Completed, failed and cancelled jobs created more than JOB_ARCHIVE_AFTER_DAYS
+ago are copied into `job_history`, which keeps only what's needed to
+account for past work (no options, progress or sync version), and removed
+from `jobs` together with their upload and result directories. With
+JOB_ARCHIVE_MODE=delete they are removed without a history row. History
+rows older than JOB_HISTORY_RETENTION_DAYS are purged as well.
+
+Rows are moved JOB_ARCHIVE_BATCH at a time, oldest first, one short
+transaction per batch with a pause in between, so the job manager's own
+writes are never held up behind one long delete (SQLite has a single
+writer). Jobs are deleted through the ORM so delta-sync clients get
+tombstones for them like for any other deletion.
+"""
+import os
+import shutil
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import Job, JobHistory
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+ARCHIVE_MODES = ('archive', 'delete')
+HISTORY_FIELDS = [name for name in JobHistory.__table__.columns.keys() if name != 'archived_at']
+
+# between batches, so queued writers get the database lock
+_BATCH_PAUSE = 0.05
+
+
+def _remove_job_files(jobs: List[Job]) -> None:
+    for job in jobs:
+        for path in (os.path.join(str(settings.UPLOAD_DIR), str(job.id)),
+                     os.path.join(str(settings.UPLOAD_DIR), str(job.user_id), str(job.id)),
+                     os.path.join(str(settings.RESULTS_DIR), str(job.id))):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class JobArchiver:
+    def __init__(self, after_days: Optional[int] = None, mode: Optional[str] = None,
+                 retention_days: Optional[int] = None, batch_size: Optional[int] = None):
+        self.after_days = settings.JOB_ARCHIVE_AFTER_DAYS if after_days is None else after_days
+        self.mode = mode or settings.JOB_ARCHIVE_MODE
+        if self.mode not in ARCHIVE_MODES:
+            raise ValueError(f"JOB_ARCHIVE_MODE must be one of {', '.join(ARCHIVE_MODES)}")
+        self.retention_days = settings.JOB_HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+        self.batch_size = batch_size or settings.JOB_ARCHIVE_BATCH
+        self._task: Optional[asyncio.Task] = None
+
+    async def archive_batch(self, cutoff: datetime) -> int:
+        """Move one batch of finished jobs created before `cutoff`; returns how many."""
+        async with AsyncSession(async_engine) as session:
+            rows = await session.exec(
+                select(Job)
+                .where(Job.created_at < cutoff, Job.status.in_(TERMINAL_STATES))
+                .order_by(Job.created_at)
+                .limit(self.batch_size)
+            )
+            jobs = rows.all()
+            if not jobs:
+                return 0
+            if self.mode == 'archive':
+                archived_at = datetime.utcnow()
+                await session.execute(insert(JobHistory), [
+                    {**{name: getattr(job, name) for name in HISTORY_FIELDS},
+                     # rows from before the column existed may still hold NULL
+                     'operation': job.operation or 'convert', 'archived_at': archived_at}
+                    for job in jobs
+                ])
+            for job in jobs:
+                await session.delete(job)
+            await session.commit()
+        await asyncio.to_thread(_remove_job_files, jobs)
+        return len(jobs)
+
+    async def purge_batch(self, cutoff: datetime) -> int:
+        """Delete one batch of history rows archived before `cutoff`; returns how many."""
+        async with AsyncSession(async_engine) as session:
+            expired = select(JobHistory.id).where(JobHistory.archived_at < cutoff).limit(self.batch_size)
+            result = await session.execute(delete(JobHistory).where(JobHistory.id.in_(expired)))
+            await session.commit()
+            return result.rowcount
+
+    async def run_once(self) -> int:
+        """Archive and purge everything due now, batch by batch; returns jobs moved."""
+        moved = purged = 0
+        now = datetime.utcnow()
+        if self.after_days > 0:
+            cutoff = now - timedelta(days=self.after_days)
+            while True:
+                count = await self.archive_batch(cutoff)
+                moved += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(_BATCH_PAUSE)
+        if self.retention_days > 0:
+            cutoff = now - timedelta(days=self.retention_days)
+            while True:
+                count = await self.purge_batch(cutoff)
+                purged += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(_BATCH_PAUSE)
+        if moved or purged:
+            action = 'archived' if self.mode == 'archive' else 'deleted'
+            logger.info(f"Job archiver {action} {moved} finished jobs, purged {purged} history rows")
+        return moved
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Job archiver run failed: {str(e)}")
+            await asyncio.sleep(settings.JOB_ARCHIVE_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None and (self.after_days > 0 or self.retention_days > 0):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# module level archiver instance
+archiver = JobArchiver()
@@ -0,0 +1,165 @@
+"""Change tracking for jobs: monotonic versions for delta sync and ETags.
+
+Every insert or update of a Job stamps it with the next value of a
+process-wide counter, seeded from the highest version in the database, and
+every delete leaves an in-memory tombstone with a version of its own.
+GET /jobs/?since=<token> returns the jobs and tombstones newer than a
+version, and ETags of job listings are derived from the same counter, so
+an unchanged listing is answered with 304 before any job row is read.
+
+Versions are handed out at flush time but only become visible at commit,
+so they can commit out of order. `watermark` is the highest version below
+which every transaction has settled; cursors returned to clients never
+pass it, so a later commit of a lower version isn't skipped.
+
+The job queue lives in the API process, so one counter per process sees
+every change. Versions of deleted jobs and their tombstones don't survive
+a restart, so sync tokens carry the id of the run that issued them; tokens
+from a previous run, or from before the oldest retained tombstone, are
+rejected and the client reloads the list.
+"""
+import uuid
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Tombstone:
+    version: int
+    job_id: uuid.UUID
+    user_id: uuid.UUID
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class JobChanges:
+    def __init__(self, retain: Optional[int] = None):
+        self.boot = uuid.uuid4().hex[:8]
+        self.last: Optional[int] = None
+        self.committed = 0
+        self.seeded = 0
+        self.floor = 0
+        self._in_flight: Set[int] = set()
+        self._user_versions: Dict[uuid.UUID, int] = {}
+        self._tombstones: Deque[Tombstone] = deque()
+        self._retain = settings.JOB_TOMBSTONES if retain is None else retain
+        self._lock = threading.Lock()
+
+    def seed(self, bind) -> None:
+        """Continue from the highest version stored; older cursors can't be served."""
+        with bind.connect() as conn:
+            latest = conn.execute(select(func.max(Job.version))).scalar() or 0
+        with self._lock:
+            self.last = max(self.last or 0, latest)
+            self.committed = max(self.committed, latest)
+            self.seeded = self.floor = self.last
+
+    def _next(self) -> int:
+        # caller holds the lock
+        self.last += 1
+        self._in_flight.add(self.last)
+        return self.last
+
+    @property
+    def watermark(self) -> int:
+        with self._lock:
+            if self._in_flight:
+                return min(self._in_flight) - 1
+            return self.last or 0
+
+    def user_version(self, user_id: Optional[uuid.UUID]) -> int:
+        """Latest committed version touching `user_id`'s jobs; any job if None."""
+        with self._lock:
+            if user_id is None:
+                return self.committed
+            # users untouched since start-up share the seeded version
+            return self._user_versions.get(user_id, self.seeded)
+
+    def etag(self, user_id: Optional[uuid.UUID], query: str) -> str:
+        return f'"{self.boot}-{self.user_version(user_id)}-{uuid.uuid5(uuid.NAMESPACE_URL, query).hex[:12]}"'
+
+    def token(self, version: int) -> str:
+        """Sync cursor for clients; versions are only comparable within one run."""
+        return f"{self.boot}.{version}"
+
+    def parse_token(self, token: str) -> int:
+        boot, _, version = token.partition('.')
+        if not version.isdigit():
+            raise ValueError(f"malformed sync token {token!r}")
+        if boot != self.boot:
+            raise CursorExpired(f"sync token {token} is from a previous run")
+        return int(version)
+
+    def deleted_since(self, since: int, user_id: Optional[uuid.UUID]) -> List[uuid.UUID]:
+        """Ids of jobs deleted after `since`, raising CursorExpired if that's no longer known."""
+        with self._lock:
+            if since < self.floor:
+                raise CursorExpired(f"sync version {since} predates {self.floor}")
+            return [t.job_id for t in self._tombstones
+                    if t.version > since and (user_id is None or t.user_id == user_id)]
+
+    # session hooks
+
+    def _before_flush(self, session: Session, flush_context, instances) -> None:
+        changed = [obj for obj in session.new if isinstance(obj, Job)]
+        changed += [obj for obj in session.dirty if isinstance(obj, Job) and session.is_modified(obj)]
+        deleted = [obj for obj in session.deleted if isinstance(obj, Job)]
+        if not changed and not deleted:
+            return
+        if self.last is None:
+            self.seed(session.get_bind())
+        pending = session.info.setdefault('job_versions', [])
+        tombstones = session.info.setdefault('job_tombstones', [])
+        with self._lock:
+            for job in changed:
+                job.version = self._next()
+                pending.append((job.version, job.user_id))
+            for job in deleted:
+                tombstones.append(Tombstone(self._next(), job.id, job.user_id))
+                pending.append((tombstones[-1].version, job.user_id))
+
+    def _settle(self, session: Session, committed: bool) -> None:
+        pending = session.info.pop('job_versions', None)
+        tombstones = session.info.pop('job_tombstones', None)
+        if not pending:
+            return
+        with self._lock:
+            self._in_flight.difference_update(version for version, _ in pending)
+            if committed:
+                # ETags move only once the change is readable
+                for version, user_id in pending:
+                    self._user_versions[user_id] = max(self._user_versions.get(user_id, 0), version)
+                    self.committed = max(self.committed, version)
+            if committed and tombstones:
+                self._tombstones.extend(tombstones)
+                while len(self._tombstones) > self._retain:
+                    self.floor = self._tombstones.popleft().version
+
+    def _transaction_end(self, session: Session, transaction) -> None:
+        # whatever after_commit didn't settle was rolled back, failed to
+        # commit or closed unfinished: release it so the watermark moves on
+        if transaction.parent is None:
+            self._settle(session, False)
+
+    def install(self) -> None:
+        event.listen(Session, 'before_flush', self._before_flush)
+        event.listen(Session, 'after_commit', lambda session: self._settle(session, True))
+        event.listen(Session, 'after_transaction_end', self._transaction_end)
+
+
+# module level change tracker, hooked into every ORM session
+changes = JobChanges()
+changes.install()
@@ -3,13 +3,18 @@ import os
 import shutil
 import logging
 import uuid
-from typing import Optional
+from typing import Iterable, Optional
 from datetime import datetime
-from sqlmodel import Session, select
-from app.core.db import engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.db import async_engine
 from app.models import Job
 from app.core.config import settings
-from app.core.converters import get_converter
+from app.core.converters import get_converter, get_operation, workspace_size
+from app.core.cpu_budget import budget as cpu_budget
+from app.core.memory_budget import budget as memory_budget, estimate_job_memory
+from app.core.image_profiles import get_profile
+from app.core.workspace import scratch
+from app.core.job_state import writer as job_state
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +25,7 @@ class JobManager:
         self.queue: asyncio.Queue[str] = None  # Will be initialized on startup
         self.workers: list[asyncio.Task] = []
         self._running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     async def _worker(self, worker_id: int):
         logger.info(f"Worker {worker_id} started")
@@ -33,14 +39,7 @@ class JobManager:
                     logger.error(f"Worker {worker_id} error processing {job_id}: {str(e)}", exc_info=True)
                     # For now, we just mark as failed and continue
                     try:
-                        with Session(engine) as session:
-                            job_uuid = uuid.UUID(job_id) if isinstance(job_id, str) else job_id
-                            job = session.get(Job, job_uuid)
-                            if job:
-                                job.status = "failed"
-                                job.error_message = str(e)
-                                session.add(job)
-                                session.commit()
+                        await job_state.finish(job_id, status="failed", error_message=str(e))
                     except Exception as db_error:
                         logger.error(f"Failed to update job status: {str(db_error)}")
                 finally:
@@ -56,18 +55,14 @@ class JobManager:
             job_uuid = uuid.UUID(job_id) if isinstance(job_id, str) else job_id
             
             logger.info(f"Processing job {job_id}")
-            # Update job status to processing
-            with Session(engine) as s:
-                job = s.get(Job, job_uuid)
-                if not job:
-                    logger.error(f"Job {job_id} not found in database")
-                    return
-                logger.info(f"Job {job_id} details: input_format={job.input_format}, output_format={job.output_format}, input_file={job.input_filename}")
-                job.status = "processing"
-                job.started_at = datetime.utcnow()
-                s.add(job)
-                s.commit()
-                s.refresh(job)
+            async with AsyncSession(async_engine) as s:
+                job = await s.get(Job, job_uuid)
+            if not job:
+                logger.error(f"Job {job_id} not found in database")
+                return
+            logger.info(f"Job {job_id} details: input_format={job.input_format}, output_format={job.output_format}, input_file={job.input_filename}")
+            # Written with the next batch, or together with the outcome if that comes first
+            job_state.update(job_uuid, status="processing", started_at=datetime.utcnow())
 
             # Get file paths
             upload_dir = os.path.join(str(settings.UPLOAD_DIR), str(job_id))
@@ -86,57 +81,74 @@ class JobManager:
             logger.info(f"Job {job_id} input file exists, size: {os.path.getsize(input_path)} bytes")
 
             # Get appropriate converter
-            converter = get_converter(job.input_format, job.output_format)
+            if job.operation == "convert":
+                converter = get_converter(job.input_format, job.output_format, job.options)
+            else:
+                converter = get_operation(job.operation, job.options)
             if not converter:
-                raise ValueError(f"No converter available for {job.input_format} -> {job.output_format}")
+                raise ValueError(f"No converter available for {job.operation}: {job.input_format} -> {job.output_format}")
+            profile = get_profile((job.options or {}).get("profile"))
             
             logger.info(f"Job {job_id} using converter: {converter.__name__}")
 
-            # Execute conversion
-            logger.info(f"Job {job_id} starting conversion")
-            success = converter(input_path, output_path)
+            # Hold the job back until its estimated peak memory fits the budget
+            estimate = await asyncio.to_thread(estimate_job_memory, input_path, job.input_format, job.output_format)
+            expected_size = await asyncio.to_thread(workspace_size, converter, input_path)
+            async with memory_budget.reserve(str(job_id), estimate) as reservation:
+                # Work in RAM when the job fits the scratch space; only the result goes to RESULTS_DIR
+                with scratch.workspace(str(job_id), expected_size) as workspace:
+                    async def run():
+                        work_input = await asyncio.to_thread(workspace.stage_input, input_path)
+                        work_output = workspace.output_path(output_path)
+
+                        # Execute conversion off the event loop, within this job's share of the CPU budget
+                        logger.info(f"Job {job_id} starting conversion")
+                        allocation = cpu_budget.acquire(str(job_id), pending=self.queue.qsize(), slots=self.concurrency)
+                        try:
+                            with allocation.activate(), reservation.activate(), profile.activate(), workspace.activate():
+                                return await asyncio.to_thread(converter, work_input, work_output), work_output
+                        finally:
+                            cpu_budget.release(str(job_id))
+
+                    error = None
+                    try:
+                        success, work_output = await run()
+                    except OSError as e:
+                        success, error = False, e
+                    if not success and workspace.exhausted(error):
+                        logger.warning(f"Job {job_id} ran out of scratch space in memory, running it again on disk")
+                        scratch.spill(workspace)
+                        success, work_output = await run()
+                    elif error is not None:
+                        raise error
+                    if success and os.path.exists(work_output):
+                        await asyncio.to_thread(workspace.publish, work_output, output_path)
             logger.info(f"Job {job_id} conversion result: {success}")
 
-            # Update job status
-            with Session(engine) as s:
-                job = s.get(Job, job_uuid)
-                if not job:
-                    logger.error(f"Job {job_id} disappeared during processing")
-                    return
-                
-                # Check if job was cancelled during processing
-                if job.status == "cancelled":
-                    logger.info(f"Job {job_id} was cancelled during processing")
-                    return
-
-                if success and os.path.exists(output_path):
-                    job.status = "completed"
-                    job.progress = 100
-                    job.completed_at = datetime.utcnow()
-                    job.tool_used = converter.__name__.replace("convert_", "")
-                    logger.info(f"Job {job_id} marked as completed")
-                else:
-                    job.status = "failed"
-                    job.error_message = "Conversion failed: output file not created"
-                    logger.error(f"Job {job_id} conversion failed: output file does not exist at {output_path}")
-                
-                s.add(job)
-                s.commit()
-                s.refresh(job)
+            # Update job status; terminal states are written before moving on
+            if success and os.path.exists(output_path):
+                tool_used = converter.__name__.replace("convert_", "") if job.operation == "convert" else job.operation
+                status = await job_state.finish(
+                    job_uuid, status="completed", progress=100, completed_at=datetime.utcnow(), tool_used=tool_used
+                )
+            else:
+                logger.error(f"Job {job_id} conversion failed: output file does not exist at {output_path}")
+                status = await job_state.finish(
+                    job_uuid, status="failed", error_message="Conversion failed: output file not created",
+                    completed_at=datetime.utcnow()
+                )
+            if status is None:
+                logger.error(f"Job {job_id} disappeared during processing")
+            elif status == "cancelled":
+                logger.info(f"Job {job_id} was cancelled during processing")
+            else:
+                logger.info(f"Job {job_id} marked as {status}")
 
         except Exception as e:
             logger.error(f"Job {job_id} processing error: {str(e)}", exc_info=True)
             # Mark job as failed
             try:
-                job_uuid = uuid.UUID(job_id) if isinstance(job_id, str) else job_id
-                with Session(engine) as s:
-                    job = s.get(Job, job_uuid)
-                    if job:
-                        job.status = "failed"
-                        job.error_message = str(e)
-                        job.completed_at = datetime.utcnow()
-                        s.add(job)
-                        s.commit()
+                await job_state.finish(job_id, status="failed", error_message=str(e), completed_at=datetime.utcnow())
             except Exception as db_error:
                 logger.error(f"Failed to mark job {job_id} as failed: {str(db_error)}")
 
@@ -145,6 +157,8 @@ class JobManager:
             return
         self._running = True
         self.queue = asyncio.Queue()  # Initialize queue in async context
+        self._loop = asyncio.get_running_loop()
+        job_state.start()
         for i in range(self.concurrency):
             task = asyncio.create_task(self._worker(i))
             self.workers.append(task)
@@ -155,6 +169,7 @@ class JobManager:
         await self.queue.join()
         for w in self.workers:
             w.cancel()
+        await job_state.stop()
 
     def enqueue(self, job_id: str):
         """Enqueue a job for processing (can be called from sync context)."""
@@ -164,6 +179,26 @@ class JobManager:
         logger.info(f"Enqueueing job {job_id}")
         self.queue.put_nowait(job_id)
 
+    def enqueue_many(self, job_ids: Iterable[str]):
+        """Enqueue a batch of jobs in one hop onto the event loop."""
+        if self.queue is None:
+            raise RuntimeError("Job manager not started")
+        job_ids = [str(job_id) for job_id in job_ids]
+        logger.info(f"Enqueueing {len(job_ids)} jobs")
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._put_all(job_ids)
+        else:
+            # sync handlers run in worker threads; wake the queue's waiters from their own loop
+            self._loop.call_soon_threadsafe(self._put_all, job_ids)
+
+    def _put_all(self, job_ids: list[str]):
+        for job_id in job_ids:
+            self.queue.put_nowait(job_id)
+
 
 # module level manager instance
 manager = JobManager()
@@ -0,0 +1,180 @@
+"""Write-behind buffer for job state changes.
+
+The job manager records intermediate state (processing, started_at,
+progress) with `update()`, which only merges the fields into an in-memory
+entry per job. Every JOB_STATE_FLUSH_MS the accumulated entries are
+written in one transaction, so a job that moves through several states
+between flushes costs a single row update. Terminal states go through
+`finish()`, which flushes immediately and returns once the row is
+committed, so clients never see a finished job reported as running; if
+another flush picked the change up first, `finish()` waits for that one.
+
+A failed flush keeps its changes for the next one. A job whose changes
+were part of JOB_STATE_MAX_RETRIES failed flushes is dropped from the
+buffer, so one bad row can't hold everybody else's state back forever.
+
+A job that is already completed, failed or cancelled in the database
+(e.g. cancelled by its owner while converting) is left alone.
+"""
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+
+def _job_uuid(job_id) -> uuid.UUID:
+    return uuid.UUID(job_id) if isinstance(job_id, str) else job_id
+
+
+class JobStateWriter:
+    def __init__(self, interval_ms: Optional[int] = None):
+        self.interval = (settings.JOB_STATE_FLUSH_MS if interval_ms is None else interval_ms) / 1000
+        self.max_retries = settings.JOB_STATE_MAX_RETRIES
+        self._pending: Dict[uuid.UUID, Dict[str, Any]] = {}
+        # finish() calls waiting for the flush that writes their job
+        self._waiters: Dict[uuid.UUID, List[asyncio.Future]] = {}
+        self._failures: Dict[uuid.UUID, int] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, job_id, **fields) -> None:
+        """Record fields for a job; later values for the same field win."""
+        self._pending.setdefault(_job_uuid(job_id), {}).update(fields)
+
+    async def finish(self, job_id, **fields) -> Optional[str]:
+        """Write a terminal state now, with anything still buffered for the job.
+
+        Returns the job's status afterwards, which differs from the one
+        requested if the job had already finished, and None if it's gone.
+        """
+        job_uuid = _job_uuid(job_id)
+        future = asyncio.get_running_loop().create_future()
+        # registered together with the fields, so whichever flush takes these fields settles it
+        self._waiters.setdefault(job_uuid, []).append(future)
+        self.update(job_uuid, **fields)
+        try:
+            await self.flush()
+        except Exception:
+            if not future.done():
+                raise
+        finally:
+            waiters = self._waiters.get(job_uuid, [])
+            if future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[job_uuid]
+        return future.result()
+
+    def _settle(self, waiters: Dict[uuid.UUID, List[asyncio.Future]], job_id: uuid.UUID,
+                status: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+        for future in waiters.get(job_id, []):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(status)
+
+    async def _write(self, batch: Dict[uuid.UUID, Dict[str, Any]]) -> Dict[uuid.UUID, Optional[str]]:
+        outcome: Dict[uuid.UUID, Optional[str]] = {}
+        async with AsyncSession(async_engine) as session:
+            rows = await session.exec(select(Job).where(Job.id.in_(list(batch))))
+            jobs = {job.id: job for job in rows.all()}
+            for job_id, fields in batch.items():
+                job = jobs.get(job_id)
+                if job is None or job.status in TERMINAL_STATES:
+                    outcome[job_id] = job.status if job else None
+                    continue
+                for name, value in fields.items():
+                    setattr(job, name, value)
+                session.add(job)
+                outcome[job_id] = job.status
+            await session.commit()
+        return outcome
+
+    def _restore(self, batch: Dict[uuid.UUID, Dict[str, Any]], waiters: Dict[uuid.UUID, List[asyncio.Future]],
+                 error: Optional[Exception] = None) -> None:
+        """Put changes that weren't written back for the next flush; newer updates win."""
+        for job_id, fields in batch.items():
+            if error is not None:
+                self._failures[job_id] = self._failures.get(job_id, 0) + 1
+                if self._failures[job_id] >= self.max_retries:
+                    logger.error(f"Dropping buffered state of job {job_id} after {self._failures.pop(job_id)} failed flushes: {fields}")
+                    self._settle(waiters, job_id, error=error)
+                    continue
+            self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+            if job_id in waiters:
+                self._waiters[job_id] = waiters.pop(job_id) + self._waiters.get(job_id, [])
+
+    async def flush(self) -> Dict[uuid.UUID, Optional[str]]:
+        """Write every buffered change, in one transaction unless retrying failures; returns job statuses."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending:
+                return {}
+            batch, self._pending = self._pending, {}
+            waiters = {job_id: self._waiters.pop(job_id) for job_id in batch if job_id in self._waiters}
+            # while earlier failures are being retried, write job by job so only the offending rows fail again
+            groups = [{job_id: fields} for job_id, fields in batch.items()] if self._failures else [batch]
+            outcome: Dict[uuid.UUID, Optional[str]] = {}
+            failure: Optional[Exception] = None
+            for index, group in enumerate(groups):
+                try:
+                    written = await self._write(group)
+                except Exception as e:
+                    self._restore(group, waiters, e)
+                    failure = failure or e
+                    continue
+                except BaseException:
+                    # cancelled, possibly mid-commit: keep this group and the ones not written yet
+                    for rest in groups[index:]:
+                        self._restore(rest, waiters)
+                    raise
+                for job_id, status in written.items():
+                    self._failures.pop(job_id, None)
+                    self._settle(waiters, job_id, status)
+                outcome.update(written)
+            if failure is not None:
+                raise failure
+            if len(groups) == 1 and len(batch) > 1:
+                logger.debug(f"Flushed state of {len(batch)} jobs in one transaction")
+            return outcome
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Job state flush failed, retrying: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            # let a flush in progress hand its batch back before the final one
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+# module level writer instance
+writer = JobStateWriter()
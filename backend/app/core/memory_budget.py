@@ -0,0 +1,211 @@
+"""Memory-aware admission control for conversion jobs.
+
+Before a job is dispatched its peak RSS is estimated from header-only probes
+(image dimensions, video resolution, file size). Jobs wait in FIFO order until
+the estimate fits in the node's memory budget, and external tools started for
+the job run under an RLIMIT_AS derived from the same estimate.
+"""
+import os
+import json
+import asyncio
+import logging
+import subprocess
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+IMAGE_FORMATS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'tiff', 'tif', 'ico']
+VIDEO_FORMATS = ['mp4', 'mkv', 'avi', 'mov', 'flv', 'wmv', 'webm', 'ts', 'mts']
+DOCUMENT_FORMATS = ['pdf', 'docx', 'doc', 'xlsx', 'xls', 'pptx', 'ppt', 'odt', 'ods', 'odp', 'rtf']
+
+
+def _system_memory() -> int:
+    """Memory available to this process, honouring a cgroup v2 limit."""
+    try:
+        limit = Path("/sys/fs/cgroup/memory.max").read_text().strip()
+        if limit.isdigit():
+            return int(limit)
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 4096 * MB
+
+
+def _probe_video_size(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'stream=width,height', '-of', 'json', path
+            ],
+            check=True, capture_output=True, timeout=30
+        )
+        stream = json.loads(result.stdout)['streams'][0]
+        return int(stream['width']), int(stream['height'])
+    except Exception:
+        return None
+
+
+def path_size(path: str) -> int:
+    """Size of a file, or of everything under a directory."""
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in Path(path).rglob('*') if entry.is_file())
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def estimate_job_memory(input_path: str, input_format: str, output_format: str) -> int:
+    """Estimate a job's peak RSS in bytes without decoding the input.
+
+    Directory inputs (image batches, PDF merges) are sized by all their files.
+    """
+    input_format = input_format.lower()
+    size = path_size(input_path)
+    probe = os.path.isfile(input_path)
+
+    if input_format in IMAGE_FORMATS and Image is not None and probe:
+        try:
+            # Image.open only parses the header
+            with Image.open(input_path) as img:
+                width, height = img.size
+                bands = len(img.getbands())
+            # decoded source plus one converted copy, 8 bits per band
+            return width * height * max(bands, 3) * 2 + 64 * MB
+        except Exception:
+            pass
+
+    if input_format in VIDEO_FORMATS and probe:
+        dims = _probe_video_size(input_path)
+        if dims:
+            width, height = dims
+            # yuv420 frames held by decoder, lookahead and reference buffers
+            return int(width * height * 1.5 * 96) + 256 * MB
+        return 1024 * MB
+
+    if input_format in DOCUMENT_FORMATS:
+        return size * 8 + 256 * MB
+
+    return size * 2 + 64 * MB
+
+
+@dataclass
+class MemoryReservation:
+    job_id: str
+    nbytes: int
+
+    @property
+    def address_limit(self) -> int:
+        if settings.CHILD_ADDRESS_SPACE_FACTOR <= 0:
+            return 0
+        # never below 512MB; runtimes reserve far more address space than they touch
+        return max(int(self.nbytes * settings.CHILD_ADDRESS_SPACE_FACTOR), 512 * MB)
+
+    def limit(self) -> None:
+        """Apply RLIMIT_AS to the calling (child) process."""
+        limit = self.address_limit
+        if resource is not None and limit:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    @contextmanager
+    def activate(self):
+        """Make this reservation visible to converters run from the current context."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+_current: ContextVar[Optional[MemoryReservation]] = ContextVar("memory_reservation", default=None)
+
+
+def current_reservation() -> Optional[MemoryReservation]:
+    return _current.get()
+
+
+class MemoryBudget:
+    """FIFO admission of jobs against a fixed number of bytes."""
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total or settings.MEMORY_BUDGET or int(_system_memory() * 0.75)
+        self.used = 0
+        self._waiters: Deque[Tuple[asyncio.Future, int]] = deque()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            future, nbytes = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.used + nbytes > self.total:
+                break
+            self._waiters.popleft()
+            self.used += nbytes
+            future.set_result(None)
+
+    def charge(self, nbytes: int) -> bool:
+        """Take `nbytes` more for a job already running, if they fit without queueing.
+
+        For memory a job holds outside its own processes, such as files in a
+        tmpfs workspace. Call on the event loop.
+        """
+        if self._waiters or self.used + nbytes > self.total:
+            return False
+        self.used += nbytes
+        return True
+
+    def discharge(self, nbytes: int) -> None:
+        """Give back what charge() took."""
+        self.used -= nbytes
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, job_id: str, nbytes: int):
+        # a job larger than the whole budget still runs, just on its own
+        nbytes = min(nbytes, self.total)
+        if self._waiters or self.used + nbytes > self.total:
+            logger.info(
+                f"Memory budget: holding job {job_id} back "
+                f"({nbytes // MB}MB needed, {(self.total - self.used) // MB}MB free)"
+            )
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((future, nbytes))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.used -= nbytes
+                self._wake()
+                raise
+        else:
+            self.used += nbytes
+        logger.info(f"Memory budget: job {job_id} admitted with {nbytes // MB}MB, {self.used // MB}/{self.total // MB}MB used")
+        try:
+            yield MemoryReservation(job_id=job_id, nbytes=nbytes)
+        finally:
+            self.used -= nbytes
+            self._wake()
+
+
+# module level budget instance
+budget = MemoryBudget()
@@ -0,0 +1,256 @@
+"""Page-parallel OCR for images, multi-page TIFFs and PDFs.
+
+Each page is rasterised to PNG, OCRed by its own single-threaded tesseract
+process (as many at once as the job's CPU allocation allows) and the page
+results are merged into one searchable PDF or one text file. For PDF to
+text, pages that already carry a text layer are read with pdftotext and
+only the others (scans) are rasterised and OCRed.
+
+Page results are cached under CACHE_DIR/ocr keyed by a hash of the page
+raster and the OCR settings, so re-running a document after an edit only
+OCRs the pages that changed. app.core.cache_prune keeps the cache under
+OCR_CACHE_MAX_BYTES.
+
+With preprocessing on (OCR_PREPROCESS or the job's `preprocess` option)
+each page is cleaned up by app.core.ocr_preprocess in the process pool
+before tesseract sees it.
+"""
+import os
+import re
+import shutil
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.cache_prune import mark_used
+from app.core.cpu_budget import current_allocation
+from app.core.tools import run_tool, submit_in_context
+from app.core.process_pool import pool as process_pool
+from app.core.workspace import scratch_dir
+from app.core.ocr_preprocess import np, preprocess_page
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    Image = None
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+OCR_INPUTS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'tif', 'pdf']
+
+
+def _pdf_page_count(input_file: str) -> int:
+    result = run_tool(['pdfinfo', input_file])
+    match = re.search(rb'^Pages:\s+(\d+)', result.stdout, re.MULTILINE)
+    if not match:
+        raise ValueError(f"Could not read page count of {input_file}")
+    return int(match.group(1))
+
+
+def raster_size(input_file: str) -> int:
+    """Bytes rasterise_pages may write for `input_file`, read from headers only.
+
+    Counts every page uncompressed at OCR_DPI, which the PNGs stay below.
+    """
+    input_format = Path(input_file).suffix[1:].lower()
+    try:
+        if input_format == 'pdf':
+            info = run_tool(['pdfinfo', input_file]).stdout
+            pages = re.search(rb'^Pages:\s+(\d+)', info, re.MULTILINE)
+            # the first page's size stands for all of them; US Letter if unknown
+            size = re.search(rb'^Page size:\s+([\d.]+) x ([\d.]+) pts', info, re.MULTILINE)
+            width, height = (float(size.group(1)), float(size.group(2))) if size else (612.0, 792.0)
+            scale = settings.OCR_DPI / 72
+            return int(pages.group(1)) * int(width * scale) * int(height * scale) * 3 if pages else 0
+        if Image is None:
+            return 0
+        with Image.open(input_file) as img:
+            frames = getattr(img, 'n_frames', 1)
+            if frames == 1 and input_format in ['png', 'jpg', 'jpeg', 'tiff', 'tif']:
+                return 0  # read in place, see rasterise_pages
+            width, height = img.size
+            return frames * width * height * 3
+    except Exception as e:
+        logger.warning(f"Could not estimate page rasters of {input_file}: {str(e)}")
+        return 0
+
+
+def _runs(numbers: List[int]) -> List[Tuple[int, int]]:
+    """Sorted page numbers as (first, last) ranges of consecutive pages."""
+    runs: List[Tuple[int, int]] = []
+    for number in numbers:
+        if runs and runs[-1][1] == number - 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
+
+
+def rasterise_pages(input_file: str, workdir: Path, pages: Optional[List[int]] = None) -> List[Path]:
+    """Render the pages of `input_file` to PNGs in `workdir`, in page order.
+
+    For PDFs `pages` picks 1-based page numbers; all of them by default.
+    """
+    input_format = Path(input_file).suffix[1:].lower()
+    if input_format == 'pdf':
+        numbers = sorted(pages) if pages is not None else list(range(1, _pdf_page_count(input_file) + 1))
+        if not numbers:
+            return []
+        threads = max(1, min(current_allocation().threads, len(numbers)))
+        chunk = -(-len(numbers) // threads)
+
+        def _render(share: List[int]) -> None:
+            for first, last in _runs(share):
+                run_tool([
+                    'pdftoppm', '-r', str(settings.OCR_DPI), '-png',
+                    '-f', str(first), '-l', str(last),
+                    input_file, str(workdir / 'page')
+                ])
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [submit_in_context(pool, _render, numbers[start:start + chunk])
+                       for start in range(0, len(numbers), chunk)]
+            for future in futures:
+                future.result()
+        # pdftoppm zero-pads page numbers to the width of the page count
+        return sorted(workdir.glob('page-*.png'), key=lambda p: int(p.stem.rsplit('-', 1)[1]))
+
+    if Image is None:
+        raise RuntimeError("OCR of images requires Pillow")
+    with Image.open(input_file) as img:
+        if getattr(img, 'n_frames', 1) == 1 and input_format in ['png', 'jpg', 'jpeg', 'tiff', 'tif']:
+            # single-frame formats tesseract reads directly
+            return [Path(input_file)]
+        paths = []
+        for index, frame in enumerate(ImageSequence.Iterator(img), start=1):
+            path = workdir / f"page-{index}.png"
+            frame.convert('RGB' if frame.mode not in ('1', 'L') else frame.mode).save(path)
+            paths.append(path)
+        return paths
+
+
+def _page_key(page: Path, preprocess: bool = False) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{settings.OCR_LANGUAGES}|{settings.OCR_DPI}|{int(preprocess)}|".encode())
+    with page.open('rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ocr_page(page: Path, cache_dir: Optional[Path] = None, preprocess: bool = False) -> Path:
+    """OCR one page into a cached `<hash>.pdf` + `<hash>.txt` pair; returns the base path."""
+    cache_dir = Path(cache_dir or settings.CACHE_DIR / 'ocr')
+    key = _page_key(page, preprocess)
+    base = cache_dir / key[:2] / key
+    if base.with_suffix('.pdf').exists() and base.with_suffix('.txt').exists():
+        logger.info(f"OCR cache hit for {page.name}")
+        mark_used(base.with_suffix('.pdf'), base.with_suffix('.txt'))
+        return base
+    base.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=base.parent) as tmp:
+        tmp_base = Path(tmp) / key
+        source = page
+        if preprocess:
+            source = Path(process_pool.run(preprocess_page, str(page), str(Path(tmp) / 'clean.png')))
+        # one tesseract per page; parallelism comes from running pages side by side
+        run_tool(
+            [
+                'tesseract', str(source), str(tmp_base),
+                '-l', settings.OCR_LANGUAGES,
+                '--dpi', str(settings.OCR_DPI),
+                'pdf', 'txt'
+            ],
+            env={'OMP_THREAD_LIMIT': '1', 'OMP_NUM_THREADS': '1'}
+        )
+        # publish atomically so concurrent jobs never see half-written results
+        for suffix in ('.pdf', '.txt'):
+            os.replace(tmp_base.with_suffix(suffix), base.with_suffix(suffix))
+    return base
+
+
+def _merge_pdfs(pages: List[Path], output_file: str) -> None:
+    if PdfWriter is not None:
+        writer = PdfWriter()
+        for page in pages:
+            writer.append(str(page))
+        with open(output_file, 'wb') as out:
+            writer.write(out)
+        return
+    if len(pages) == 1:
+        shutil.copyfile(pages[0], output_file)
+        return
+    run_tool(['pdfunite'] + [str(p) for p in pages] + [output_file])
+
+
+def text_layer(input_file: str) -> Optional[List[str]]:
+    """Text of each PDF page as pdftotext reads it; None if it can't be read."""
+    try:
+        count = _pdf_page_count(input_file)
+        result = run_tool(['pdftotext', '-enc', 'UTF-8', input_file, '-'])
+    except Exception as e:
+        logger.warning(f"No text layer read from {input_file}, OCRing every page: {str(e)}")
+        return None
+    # every page ends with a form feed
+    texts = result.stdout.decode('utf-8', errors='replace').split('\f')[:count]
+    return texts + [''] * (count - len(texts))
+
+
+def run_ocr(input_file: str, output_file: str, preprocess: Optional[bool] = None,
+            use_text_layer: bool = True) -> bool:
+    """OCR `input_file` page by page into a searchable PDF or a text file.
+
+    For PDF to text, pages with a text layer are taken from it unless
+    `use_text_layer` is off.
+    """
+    output_format = Path(output_file).suffix[1:].lower()
+    preprocess = settings.OCR_PREPROCESS if preprocess is None else preprocess
+    if preprocess and np is None:
+        logger.warning("OCR preprocessing requires numpy, OCRing raw pages")
+        preprocess = False
+    try:
+        texts = None
+        if output_format == 'txt' and use_text_layer and Path(input_file).suffix.lower() == '.pdf':
+            texts = text_layer(input_file)
+        with tempfile.TemporaryDirectory(prefix='ocr_', dir=scratch_dir()) as workdir:
+            if texts is not None:
+                if not texts:
+                    return False
+                scanned = [number for number, text in enumerate(texts, start=1) if not text.strip()]
+                logger.info(f"{len(texts) - len(scanned)} of {len(texts)} page(s) have a text layer")
+                pages = rasterise_pages(input_file, Path(workdir), scanned)
+            else:
+                pages = rasterise_pages(input_file, Path(workdir))
+                if not pages:
+                    return False
+            threads = max(1, min(current_allocation().threads, len(pages) or 1))
+            logger.info(f"OCR of {len(pages)} page(s) on {threads} thread(s)")
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                futures = [submit_in_context(pool, ocr_page, page, preprocess=preprocess) for page in pages]
+                results = [future.result() for future in futures]
+
+            if output_format == 'pdf':
+                _merge_pdfs([r.with_suffix('.pdf') for r in results], output_file)
+            else:
+                if texts is None:
+                    texts = [result.with_suffix('.txt').read_text(encoding='utf-8') for result in results]
+                else:
+                    # OCR results fill in the pages without a text layer, by page number
+                    for page, result in zip(pages, results):
+                        texts[int(page.stem.rsplit('-', 1)[1]) - 1] = result.with_suffix('.txt').read_text(encoding='utf-8')
+                with open(output_file, 'w', encoding='utf-8') as out:
+                    # tesseract's own page separator
+                    out.write('\f'.join(texts))
+        return os.path.exists(output_file)
+    except Exception as e:
+        logger.error(f"OCR conversion error: {str(e)}")
+        return False
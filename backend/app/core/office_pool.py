@@ -0,0 +1,206 @@
+"""Pool of warm headless LibreOffice processes for office documents.
+
+Spawning `soffice --headless` costs 2-5 s per conversion. Instead a few
+`unoserver` processes are kept running, each with its own port and profile
+directory, and conversions are dispatched to an idle one over XML-RPC.
+Servers are health checked before use and recycled after
+OFFICE_MAX_CONVERSIONS conversions or any failure, so a leaking or wedged
+LibreOffice never serves more than a bounded number of jobs.
+
+When unoserver isn't installed or the pool is disabled, `convert_once` runs a
+one-shot `soffice --convert-to` instead.
+"""
+import os
+import queue
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+import time
+import xmlrpc.client
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.tools import run_tool
+from app.core.workspace import scratch_dir
+
+logger = logging.getLogger(__name__)
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC over HTTP whose socket gives up after `timeout` seconds."""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class OfficeServer:
+    """One unoserver process listening on `port` (LibreOffice itself on `port + 1`)."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.profile_dir: Optional[str] = None
+        self.conversions = 0
+
+    def start(self) -> None:
+        self.profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{self.port}_")
+        self.conversions = 0
+        self.process = subprocess.Popen(
+            [
+                'unoserver',
+                '--interface', '127.0.0.1',
+                '--port', str(self.port),
+                '--uno-port', str(self.port + 1),
+                '--user-installation', self.profile_dir,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        logger.info(f"Office server starting on port {self.port} (PID: {self.process.pid})")
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def healthy(self) -> bool:
+        if not self.alive():
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.healthy():
+                return True
+            if not self.alive():
+                return False
+            time.sleep(0.2)
+        return False
+
+    def convert(self, input_file: str, output_file: str, output_format: str) -> None:
+        # a hung LibreOffice would otherwise hold this thread and the pool slot forever
+        proxy = xmlrpc.client.ServerProxy(f"http://127.0.0.1:{self.port}", allow_none=True,
+                                          transport=_TimeoutTransport(settings.PROCESS_TIMEOUT))
+        # inpath, indata, outpath, convert_to, filtername, filter_options, update_index
+        proxy.convert(os.path.abspath(input_file), None, os.path.abspath(output_file), output_format, None, [], True)
+        self.conversions += 1
+
+
+class OfficePool:
+    def __init__(self, size: Optional[int] = None, base_port: Optional[int] = None):
+        self.size = settings.OFFICE_POOL_SIZE if size is None else size
+        self.base_port = base_port or settings.OFFICE_POOL_BASE_PORT
+        self.servers: List[OfficeServer] = []
+        self._idle: "queue.Queue[OfficeServer]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.servers)
+
+    def start(self) -> None:
+        """Spawn the servers; they finish starting in the background."""
+        with self._lock:
+            if self.servers or self.size <= 0:
+                return
+            if shutil.which('unoserver') is None:
+                logger.info("unoserver not installed, office documents use one-shot soffice")
+                return
+            for i in range(self.size):
+                # each server uses two ports: XML-RPC and the UNO socket
+                server = OfficeServer(self.base_port + i * 2)
+                server.start()
+                self.servers.append(server)
+                self._idle.put(server)
+
+    def stop(self) -> None:
+        with self._lock:
+            for server in self.servers:
+                server.stop()
+            self.servers = []
+            self._idle = queue.Queue()
+
+    def convert(self, input_file: str, output_file: str, output_format: str) -> bool:
+        """Convert on a warm server; recycle it on failure or after its conversion quota."""
+        try:
+            server = self._idle.get(timeout=settings.PROCESS_TIMEOUT)
+        except queue.Empty:
+            logger.error("No office server became idle in time")
+            return False
+        try:
+            if not server.alive():
+                logger.warning(f"Office server on port {server.port} exited, restarting")
+                server.restart()
+            # a server still warming up is given time to open its port
+            if not server.wait_ready(settings.OFFICE_START_TIMEOUT):
+                logger.error(f"Office server on port {server.port} failed to start")
+                server.restart()
+                return False
+            server.convert(input_file, output_file, output_format)
+            if server.conversions >= settings.OFFICE_MAX_CONVERSIONS:
+                logger.info(f"Recycling office server on port {server.port} after {server.conversions} conversions")
+                server.restart()
+            return os.path.exists(output_file)
+        except TimeoutError:
+            logger.error(f"Office server on port {server.port} timed out after {settings.PROCESS_TIMEOUT}s, restarting")
+            server.restart()
+            return False
+        except Exception as e:
+            logger.error(f"Office conversion error on port {server.port}: {str(e)}")
+            server.restart()
+            return False
+        finally:
+            self._idle.put(server)
+
+
+def convert_once(input_file: str, output_file: str, output_format: str) -> bool:
+    """Cold-start fallback: one soffice process per conversion."""
+    with tempfile.TemporaryDirectory(prefix='lo_once_', dir=scratch_dir()) as workdir:
+        # a private profile lets several one-shot conversions run side by side
+        profile = Path(workdir) / 'profile'
+        cmd = [
+            'soffice', '--headless', '--norestore', '--nologo',
+            f'-env:UserInstallation={profile.as_uri()}',
+            '--convert-to', output_format,
+            '--outdir', workdir,
+            input_file,
+        ]
+        run_tool(cmd)
+        produced = Path(workdir) / f"{Path(input_file).stem}.{output_format.split(':')[0]}"
+        if not produced.exists():
+            return False
+        shutil.move(str(produced), output_file)
+    return os.path.exists(output_file)
+
+
+# module level pool instance
+pool = OfficePool()
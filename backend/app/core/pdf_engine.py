@@ -0,0 +1,399 @@
+"""Page-level PDF operations that never re-render content.
+
+Merging copies page objects from the source files into a new document with
+qpdf (pikepdf): content streams, fonts and images are carried over as they
+are, objects shared between pages of one source stay shared, and stream
+data is read from the sources while the output is written, so memory is
+bounded by the object graph rather than the page content. Fonts and images
+that are byte-identical across *different* sources (the same logo or
+embedded font in every invoice) are deduplicated to a single object.
+
+Rotation and crop are page-box edits: /Rotate and /CropBox.
+
+pypdf is used for merging when pikepdf isn't installed; it holds the whole
+output in memory and does not deduplicate across sources. Split and
+compress require pikepdf.
+
+Split opens the source once and writes every requested range from it.
+Compress recompresses each embedded image as JPEG at no more than
+PDF_COMPRESS_DPI; the decode, resample and encode of the images run in the
+process pool, a bounded window of them at a time.
+"""
+import io
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import zipfile
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.process_pool import pool as process_pool
+from app.core.workspace import scratch_dir
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    from pypdf import PageObject, PdfReader, PdfWriter
+    from pypdf.generic import NameObject, NumberObject, RectangleObject
+except ImportError:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+# resource categories worth deduplicating across sources
+_SHARED_RESOURCES = ('/Font', '/XObject')
+
+_RANGE = re.compile(r'^\s*(\d+)?\s*(-)?\s*(\d+)?\s*$')
+
+
+def crop_box(box: Tuple[float, float, float, float], rotation: int, crop: Dict) -> Tuple[float, float, float, float]:
+    """Map a crop rectangle in viewer coordinates to a PDF user-space box.
+
+    `crop` is {x, y, width, height} in points, measured from the top-left
+    corner of the page as displayed (its existing /Rotate applied), which
+    is what pdf.js reports at scale 1. The result is clipped to `box`.
+    """
+    x0, y0, x1, y1 = box
+
+    def to_user(u: float, v: float) -> Tuple[float, float]:
+        if rotation == 90:
+            return x0 + v, y0 + u
+        if rotation == 180:
+            return x1 - u, y0 + v
+        if rotation == 270:
+            return x1 - v, y1 - u
+        return x0 + u, y1 - v
+
+    ax, ay = to_user(crop['x'], crop['y'])
+    bx, by = to_user(crop['x'] + crop['width'], crop['y'] + crop['height'])
+    left, right = sorted((ax, bx))
+    bottom, top = sorted((ay, by))
+    left, bottom = max(left, x0), max(bottom, y0)
+    right, top = min(right, x1), min(top, y1)
+    if right <= left or top <= bottom:
+        raise ValueError(f"Crop {crop} lies outside the page")
+    return left, bottom, right, top
+
+
+def _fingerprint(obj, memo: Dict, active: set) -> str:
+    """Content hash of a PDF object graph; indirect objects memoised by id."""
+    objgen = obj.objgen if isinstance(obj, pikepdf.Object) and obj.is_indirect else None
+    if objgen is not None:
+        if objgen in memo:
+            return memo[objgen]
+        if objgen in active:
+            # a reference cycle: identify by object number, never merged
+            return f"cycle:{objgen}"
+        active.add(objgen)
+    digest = hashlib.sha256()
+    if isinstance(obj, pikepdf.Stream):
+        digest.update(b'S')
+        for key in sorted(k for k in obj.keys() if k != '/Length'):
+            digest.update(key.encode() + _fingerprint(obj[key], memo, active).encode())
+        digest.update(obj.read_raw_bytes())
+    elif isinstance(obj, pikepdf.Dictionary):
+        digest.update(b'D')
+        for key in sorted(obj.keys()):
+            if key == '/Parent':
+                continue
+            digest.update(key.encode() + _fingerprint(obj[key], memo, active).encode())
+    elif isinstance(obj, pikepdf.Array):
+        digest.update(b'A')
+        for item in obj:
+            digest.update(_fingerprint(item, memo, active).encode())
+    else:
+        digest.update(repr(obj).encode())
+    result = digest.hexdigest()
+    if objgen is not None:
+        active.discard(objgen)
+        memo[objgen] = result
+    return result
+
+
+def _share_resources(pdf: 'pikepdf.Pdf') -> int:
+    """Point identical fonts and images on every page at a single object."""
+    memo: Dict = {}
+    canonical: Dict[str, 'pikepdf.Object'] = {}
+    replaced = 0
+    for page in pdf.pages:
+        resources = page.obj.get('/Resources')
+        if resources is None:
+            continue
+        for category in _SHARED_RESOURCES:
+            entries = resources.get(category)
+            if not isinstance(entries, pikepdf.Dictionary):
+                continue
+            for name in list(entries.keys()):
+                item = entries[name]
+                if not item.is_indirect:
+                    continue
+                key = _fingerprint(item, memo, set())
+                first = canonical.setdefault(key, item)
+                if first.objgen != item.objgen:
+                    entries[name] = first
+                    replaced += 1
+    return replaced
+
+
+def _merge_pikepdf(sources: Dict[str, Path], output_file: str, pages: List[Dict]) -> None:
+    opened: Dict[str, 'pikepdf.Pdf'] = {}
+    appended: Dict[Tuple[str, int], int] = {}
+    try:
+        with pikepdf.new() as out:
+            for entry in pages:
+                source = entry['source']
+                if source not in opened:
+                    opened[source] = pikepdf.open(sources[source])
+                original = opened[source].pages[entry['page']]
+                key = (source, entry['page'])
+                if key in appended:
+                    # the same source page again: a page dictionary of its own, sharing
+                    # the content and resources, so its rotation and crop are independent
+                    copy = pikepdf.Dictionary({k: v for k, v in out.pages[appended[key]].obj.items() if k != '/Parent'})
+                    out.pages.append(pikepdf.Page(out.make_indirect(copy)))
+                else:
+                    # qpdf copies the page's object graph once per source file,
+                    # so resources shared between its pages stay shared
+                    out.pages.append(original)
+                    appended[key] = len(out.pages) - 1
+                page = out.pages[-1]
+                # absolute values from the source page, never from an earlier copy
+                rotation = int(original.obj.get('/Rotate', 0)) % 360
+                box = [float(v) for v in original.obj.get('/CropBox', original.mediabox)]
+                if entry.get('crop'):
+                    page.obj.CropBox = pikepdf.Array(crop_box(tuple(box), rotation, entry['crop']))
+                elif '/CropBox' in original.obj:
+                    page.obj.CropBox = pikepdf.Array(box)
+                elif '/CropBox' in page.obj:
+                    del page.obj['/CropBox']
+                page.obj.Rotate = (rotation + (entry.get('rotate') or 0)) % 360
+            shared = _share_resources(out)
+            if shared:
+                logger.info(f"PDF merge: {shared} duplicate font/image reference(s) shared")
+            # stream data is pulled from the open sources while writing
+            out.save(output_file, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    finally:
+        for pdf in opened.values():
+            pdf.close()
+
+
+def _merge_pypdf(sources: Dict[str, Path], output_file: str, pages: List[Dict]) -> None:
+    readers: Dict[str, 'PdfReader'] = {}
+    added: Dict[Tuple[str, int], 'PageObject'] = {}
+    writer = PdfWriter()
+    for entry in pages:
+        source = entry['source']
+        if source not in readers:
+            readers[source] = PdfReader(sources[source])
+        original = readers[source].pages[entry['page']]
+        key = (source, entry['page'])
+        if key in added:
+            # pypdf would hand back the page it already cloned; give this occurrence a
+            # page dictionary of its own, sharing content and resources, as with pikepdf
+            copy = PageObject(writer)
+            copy.update({NameObject(k): v for k, v in added[key].items() if k != '/Parent'})
+            page = writer.add_page(copy)
+        else:
+            page = added[key] = writer.add_page(original)
+        # absolute values from the source page, never from an earlier occurrence
+        rotation = int(original.get('/Rotate', 0)) % 360
+        box = tuple(float(v) for v in original.cropbox)
+        if entry.get('crop'):
+            page.cropbox = RectangleObject(crop_box(box, rotation, entry['crop']))
+        else:
+            page.cropbox = RectangleObject(box)
+        page[NameObject('/Rotate')] = NumberObject((rotation + (entry.get('rotate') or 0)) % 360)
+    with open(output_file, 'wb') as out:
+        writer.write(out)
+
+
+def run_pdf_merge(input_dir: str, output_file: str, pages: List[Dict]) -> bool:
+    """Assemble `pages` ({source, page, rotate, crop}) from PDFs in `input_dir`.
+
+    `source` is a file name in `input_dir` (without the .pdf suffix) and
+    `page` a zero-based page index.
+    """
+    try:
+        sources = {p.stem: p for p in Path(input_dir).glob('*.pdf')}
+        missing = {entry['source'] for entry in pages} - set(sources)
+        if missing:
+            raise ValueError(f"Unknown source file(s): {', '.join(sorted(missing))}")
+        if pikepdf is not None:
+            _merge_pikepdf(sources, output_file, pages)
+        elif PdfReader is not None:
+            _merge_pypdf(sources, output_file, pages)
+        else:
+            logger.error("PDF merge requires pikepdf or pypdf")
+            return False
+        logger.info(f"PDF merge: {len(pages)} page(s) from {len(sources)} file(s)")
+        return os.path.exists(output_file)
+    except Exception as e:
+        logger.error(f"PDF merge error: {str(e)}")
+        return False
+
+
+def parse_page_ranges(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """Parse "1-3, 5, 8-" into 1-based inclusive (first, last) pairs; last None = to the end."""
+    ranges = []
+    for part in spec.split(','):
+        match = _RANGE.match(part)
+        if not match or not any(match.groups()) or (match.group(1) is None and match.group(2) is None):
+            raise ValueError(f"Invalid page range: {part.strip()!r}")
+        first = int(match.group(1) or 1)
+        last = int(match.group(3)) if match.group(3) else (None if match.group(2) else first)
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part.strip()!r}")
+        ranges.append((first, last))
+    return ranges
+
+
+def _split_ranges(page_count: int, ranges: Optional[str], every: Optional[int]) -> List[Tuple[int, int]]:
+    if ranges:
+        resolved = []
+        for first, last in parse_page_ranges(ranges):
+            if first > page_count:
+                raise ValueError(f"Page {first} is past the end of the document ({page_count} pages)")
+            resolved.append((first, min(last or page_count, page_count)))
+        return resolved
+    every = max(1, int(every or 1))
+    return [(first, min(first + every - 1, page_count)) for first in range(1, page_count + 1, every)]
+
+
+def run_pdf_split(input_file: str, output_file: str, ranges: Optional[str] = None, every: Optional[int] = None) -> bool:
+    """Split into one PDF per page range (or per `every` pages), zipped."""
+    if pikepdf is None:
+        logger.error("PDF split requires pikepdf")
+        return False
+    try:
+        stem = Path(input_file).stem
+        with pikepdf.open(input_file) as source, \
+                tempfile.TemporaryDirectory(dir=scratch_dir()) as workdir, \
+                zipfile.ZipFile(output_file, 'w', zipfile.ZIP_STORED) as archive:
+            parts = _split_ranges(len(source.pages), ranges, every)
+            for first, last in parts:
+                name = f"{stem}_p{first}.pdf" if first == last else f"{stem}_p{first}-{last}.pdf"
+                part_path = Path(workdir) / name
+                with pikepdf.new() as part:
+                    part.pages.extend(source.pages[first - 1:last])
+                    part.save(part_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+                # PDFs are already compressed; store them as they are
+                archive.write(part_path, name)
+                part_path.unlink()
+        logger.info(f"PDF split: {len(parts)} part(s)")
+        return os.path.exists(output_file)
+    except Exception as e:
+        logger.error(f"PDF split error: {str(e)}")
+        return False
+
+
+def recompress_image(data: bytes, raw: bool, mode: str, size: Tuple[int, int], scale: float, quality: int) -> Optional[bytes]:
+    """Downsample and JPEG-encode one image; None when that wouldn't make it smaller.
+
+    Runs in the process pool. `raw` means `data` is a JPEG stream, otherwise
+    it is decoded 8-bit samples in `mode`.
+    """
+    img = Image.open(io.BytesIO(data)) if raw else Image.frombytes(mode, size, data)
+    if scale < 1:
+        target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        if raw and img.format == 'JPEG':
+            img.draft(img.mode, target)
+        img = img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    result = buffer.getvalue()
+    return result if len(result) < len(data) * 0.9 else None
+
+
+def _image_job(image: 'pikepdf.Stream', page_size: Tuple[float, float], dpi: int, quality: int) -> Optional[Tuple]:
+    """Arguments for recompress_image, or None for images left as they are.
+
+    The effective resolution is measured against the page, so it is a lower
+    bound for images drawn smaller than the page and downsampling errs on
+    the side of keeping detail.
+    """
+    if image.get('/ImageMask') or image.get('/BitsPerComponent') != 8 or '/Decode' in image:
+        return None
+    filters = image.get('/Filter')
+    filters = list(filters) if isinstance(filters, pikepdf.Array) else [filters] if filters else []
+    colorspace = image.get('/ColorSpace')
+    width, height = int(image.Width), int(image.Height)
+    image_dpi = max(width / (page_size[0] / 72), height / (page_size[1] / 72))
+    scale = min(1.0, dpi / image_dpi) if image_dpi else 1.0
+
+    if filters == ['/DCTDecode']:
+        if scale >= 0.95 and image.Length < width * height // 4:
+            return None  # already a reasonably compressed JPEG at target resolution
+        return image.read_raw_bytes(), True, '', (width, height), scale, quality
+    if colorspace not in ('/DeviceGray', '/DeviceRGB') or any(f not in ('/FlateDecode', '/LZWDecode') for f in filters):
+        return None
+    mode = 'L' if colorspace == '/DeviceGray' else 'RGB'
+    return image.read_bytes(), False, mode, (width, height), scale, quality
+
+
+def run_pdf_compress(input_file: str, output_file: str, dpi: Optional[int] = None, quality: Optional[int] = None) -> bool:
+    """Downsample and recompress embedded images; everything else is copied as is."""
+    if pikepdf is None or Image is None:
+        logger.error("PDF compress requires pikepdf and Pillow")
+        return False
+    dpi = int(dpi or settings.PDF_COMPRESS_DPI)
+    quality = int(quality or settings.PDF_COMPRESS_QUALITY)
+    try:
+        with pikepdf.open(input_file) as pdf:
+            seen = set()
+            replaced = 0
+            pending = deque()
+
+            def _apply(image: 'pikepdf.Stream', future) -> None:
+                nonlocal replaced
+                data = future.result()
+                if data is None:
+                    return
+                with Image.open(io.BytesIO(data)) as encoded:
+                    width, height, mode = encoded.width, encoded.height, encoded.mode
+                image.write(data, filter=pikepdf.Name.DCTDecode)
+                image.Width, image.Height = width, height
+                image.ColorSpace = pikepdf.Name.DeviceGray if mode == 'L' else pikepdf.Name.DeviceRGB
+                image.BitsPerComponent = 8
+                if '/DecodeParms' in image:
+                    del image['/DecodeParms']
+                replaced += 1
+
+            for page in pdf.pages:
+                box = page.mediabox
+                page_size = (float(box[2]) - float(box[0]), float(box[3]) - float(box[1]))
+                for image in page.images.values():
+                    if image.objgen in seen:
+                        continue
+                    seen.add(image.objgen)
+                    args = _image_job(image, page_size, dpi, quality)
+                    if args is None:
+                        continue
+                    pending.append((image, process_pool.submit(recompress_image, *args)))
+                    # bound the decoded images held in flight
+                    if len(pending) >= process_pool.workers * 2:
+                        _apply(*pending.popleft())
+            while pending:
+                _apply(*pending.popleft())
+
+            pdf.remove_unreferenced_resources()
+            pdf.save(output_file, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+        before, after = os.path.getsize(input_file), os.path.getsize(output_file)
+        logger.info(f"PDF compress: {replaced} image(s) recompressed, {before} -> {after} bytes")
+        return os.path.exists(output_file)
+    except Exception as e:
+        logger.error(f"PDF compress error: {str(e)}")
+        return False
@@ -0,0 +1,67 @@
+"""Shared process pool for CPU-bound Python work (NumPy, Pillow filters).
+
+Threads are enough while the heavy lifting happens in C code that releases
+the GIL; pure-Python and mixed NumPy pipelines are not, so those steps are
+submitted here instead. The pool is created on first use with
+PROCESS_POOL_WORKERS processes (0 = the CPU budget) and started through
+forkserver where available, so children never inherit the event loop's
+threads or open database connections.
+"""
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.cpu_budget import budget as cpu_budget
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessPool:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.PROCESS_POOL_WORKERS or cpu_budget.total
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"Process pool started with {self.workers} worker(s)")
+            return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule a picklable module-level callable on the pool."""
+        return self._get_executor().submit(fn, *args, **kwargs)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Run `fn` on the pool and wait for its result.
+
+        A worker killed mid-task (OOM killer, segfault in a C extension)
+        breaks the whole executor; it is replaced so later calls succeed.
+        """
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            logger.error("Process pool broke, restarting it")
+            with self._lock:
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+            raise
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# module level pool instance
+pool = ProcessPool()
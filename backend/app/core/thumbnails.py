@@ -0,0 +1,134 @@
+"""PDF page thumbnails rendered on the server and cached on disk.
+
+Thumbnails come in a few fixed widths so the cache stays small and every
+client hits the same entries. They are stored as WebP under
+
+    CACHE_DIR/thumbnails/<sha256 of the PDF>[:2]/<sha256>/<page>_<width>.webp
+
+so identical uploads share thumbnails and an entry never goes stale.
+app.core.cache_prune keeps the cache under THUMBNAIL_CACHE_MAX_BYTES.
+Missing pages are rendered in the process pool, one task per page (pdfium
+is not thread-safe), with pypdfium2 or, when it isn't installed, pdftoppm.
+"""
+import os
+import re
+import hashlib
+import logging
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+from app.core.config import settings
+from app.core.cache_prune import mark_used
+from app.core.process_pool import pool as process_pool
+from app.core.tools import run_tool
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = (120, 180, 360, 720)
+
+
+@lru_cache(maxsize=1024)
+def _hash_file(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file, remembered while its size and mtime don't change."""
+    stat = os.stat(path)
+    return _hash_file(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _page_count(path: str, digest: str) -> int:
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    result = run_tool(['pdfinfo', path])
+    match = re.search(rb'^Pages:\s+(\d+)', result.stdout, re.MULTILINE)
+    if not match:
+        raise ValueError(f"Could not read page count of {path}")
+    return int(match.group(1))
+
+
+def page_count(path: Path) -> int:
+    return _page_count(str(path), file_hash(path))
+
+
+def thumbnail_path(digest: str, page: int, width: int) -> Path:
+    return settings.CACHE_DIR / 'thumbnails' / digest[:2] / digest / f"{page}_{width}.webp"
+
+
+def render_thumbnail(source: str, page: int, width: int, destination: str) -> str:
+    """Render one zero-based page `width` pixels wide as it is displayed. Runs in the process pool."""
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            pdf_page = pdf[page]
+            # pdfium applies the page's /Rotate, so measure the displayed width
+            page_width, page_height = pdf_page.get_size()
+            displayed = page_height if pdf_page.get_rotation() in (90, 270) else page_width
+            img = pdf_page.render(scale=width / displayed).to_pil()
+        finally:
+            pdf.close()
+    else:
+        with tempfile.TemporaryDirectory(dir=settings.TEMP_DIR) as workdir:
+            base = Path(workdir) / 'page'
+            run_tool([
+                'pdftoppm', '-png', '-singlefile',
+                '-f', str(page + 1), '-l', str(page + 1),
+                '-scale-to-x', str(width), '-scale-to-y', '-1',
+                source, str(base)
+            ])
+            with Image.open(base.with_suffix('.png')) as rendered:
+                img = rendered.convert('RGB')
+
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.webp', dir=Path(destination).parent)
+    with os.fdopen(fd, 'wb') as out:
+        img.save(out, format='WEBP', quality=80, method=4)
+    # publish atomically; concurrent renders of the same page just race to replace
+    os.replace(tmp, destination)
+    return destination
+
+
+def ensure_thumbnails(source: Path, pages: List[int], width: int) -> Dict[int, Path]:
+    """Cached thumbnail paths for `pages`, rendering the missing ones in parallel."""
+    if width not in THUMBNAIL_SIZES:
+        raise ValueError(f"Thumbnail width must be one of {', '.join(map(str, THUMBNAIL_SIZES))}")
+    digest = file_hash(source)
+    count = _page_count(str(source), digest)
+    bad = [p for p in pages if not 0 <= p < count]
+    if bad:
+        raise IndexError(f"Page(s) {', '.join(map(str, bad))} out of range for {count} pages")
+
+    paths = {page: thumbnail_path(digest, page, width) for page in pages}
+    futures = {
+        page: process_pool.submit(render_thumbnail, str(source), page, width, str(path))
+        for page, path in paths.items()
+        if not path.exists()
+    }
+    mark_used(*(path for page, path in paths.items() if page not in futures))
+    for page, future in futures.items():
+        future.result()
+    if futures:
+        logger.info(f"Rendered {len(futures)} thumbnail(s) of {source.name} at {width}px")
+    return paths
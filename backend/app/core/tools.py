@@ -0,0 +1,91 @@
+"""Running external conversion tools within the current job's resource limits.
+
+CPU pinning and the address space cap are applied by starting the tool
+through taskset and prlimit, which exec it in place. A preexec_fn does it
+only where those aren't installed: with one, subprocess can't use
+posix_spawn/vfork, and it isn't safe to run in a threaded parent.
+"""
+import os
+import errno
+import shutil
+import contextvars
+import subprocess
+from concurrent.futures import Executor, Future
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.cpu_budget import current_allocation
+from app.core.memory_budget import current_reservation
+from app.core.workspace import current_workspace
+
+
+@lru_cache(maxsize=None)
+def _wrapper(name: str) -> Optional[str]:
+    return shutil.which(name) if os.name == 'posix' else None
+
+
+def _limits(cmd: list, kwargs: dict) -> Tuple[list, dict]:
+    """Command line, env and preexec_fn for a child of the current job."""
+    allocation = current_allocation()
+    reservation = current_reservation()
+    workspace = current_workspace()
+    env = {**os.environ, **allocation.env(), **kwargs.pop('env', {})}
+    if workspace is not None:
+        # intermediates of tesseract, calibre, ffmpeg... land in the job's workspace
+        env['TMPDIR'] = str(workspace.tmp)
+
+    prefix, fallback = [], []
+    if allocation.cpus and hasattr(os, 'sched_setaffinity'):
+        if _wrapper('taskset'):
+            prefix += [_wrapper('taskset'), '--cpu-list', ','.join(map(str, allocation.cpus))]
+        else:
+            fallback.append(allocation.pin)
+    if reservation is not None and reservation.address_limit and os.name == 'posix':
+        if _wrapper('prlimit'):
+            prefix += [_wrapper('prlimit'), f'--as={reservation.address_limit}']
+        else:
+            fallback.append(reservation.limit)
+    if prefix:
+        # a missing tool fails like it would unwrapped, not with the wrapper's exit code 127
+        if shutil.which(cmd[0], path=env.get('PATH')) is None:
+            raise FileNotFoundError(errno.ENOENT, 'No such file or directory', cmd[0])
+        cmd = prefix + list(cmd)
+
+    preexec_fn = None
+    if fallback:
+        def preexec_fn():
+            for apply in fallback:
+                apply()
+
+    return cmd, {'env': env, 'preexec_fn': preexec_fn}
+
+
+def submit_in_context(pool: Executor, fn, *args, **kwargs) -> Future:
+    """pool.submit() that runs `fn` in the caller's job context.
+
+    Executor threads don't inherit ContextVars, so without this the CPU
+    allocation, memory cap, workspace and image profile of the job are
+    lost. Each task gets its own copy: a Context can only be entered by
+    one thread at a time.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def run_tool(cmd: list, **kwargs) -> subprocess.CompletedProcess:
+    """Run an external tool inside the current job's CPU and memory allocation."""
+    cmd, limits = _limits(cmd, kwargs)
+    return subprocess.run(
+        cmd,
+        check=True,
+        capture_output=True,
+        timeout=kwargs.pop('timeout', settings.PROCESS_TIMEOUT),
+        **limits,
+        **kwargs
+    )
+
+
+def open_tool(cmd: list, **kwargs) -> subprocess.Popen:
+    """Start a tool for streaming through its stdin/stdout; the caller waits for it."""
+    cmd, limits = _limits(cmd, kwargs)
+    return subprocess.Popen(cmd, **limits, **kwargs)
@@ -24,8 +24,8 @@ def get_supported_formats() -> Dict:
             'output': ['epub', 'mobi', 'azw3', 'pdf']
         },
         'archive': {
-            'input': ['zip', '7z', 'rar', 'tar', 'gz', 'tar.gz', 'bz2', 'tar.bz2', 'xz', 'tar.xz'],
-            'output': ['zip', '7z', 'tar', 'tar.gz', 'tar.bz2', 'tar.xz']
+            'input': ['zip', '7z', 'rar', 'tar', 'gz', 'tar.gz', 'bz2', 'tar.bz2', 'xz', 'tar.xz', 'zst', 'tar.zst'],
+            'output': ['zip', '7z', 'tar', 'tar.gz', 'tar.bz2', 'tar.xz', 'tar.zst']
         },
         'pdf': {
             'input': ['pdf'],
@@ -0,0 +1,188 @@
+"""Per-job scratch workspaces, in RAM when they fit.
+
+Each job gets a private directory for its input, output and whatever its
+tools write along the way. When SCRATCH_DIR (a tmpfs such as /dev/shm) is
+usable and the job's expected workspace size (SCRATCH_GROWTH times the
+input size, plus whatever its converter is known to write, e.g. page
+rasters for OCR) fits under the SCRATCH_MAX_BYTES shared by all jobs and
+in the memory budget, which tmpfs pages count against like any other RAM,
+the input is copied there, the
+converter writes its output there and only the finished result is moved to
+RESULTS_DIR. Otherwise the workspace lives under TEMP_DIR, the input is
+read in place from UPLOAD_DIR and the output is written straight to
+RESULTS_DIR, which is what every job did before. A job that runs out of
+room in RAM anyway (ENOSPC) is moved to disk and run again.
+
+Either way, external tools started for the job get TMPDIR pointed at the
+workspace, and in-process code asks scratch_dir() for somewhere to put its
+temporary files.
+"""
+import os
+import errno
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+from app.core.memory_budget import budget as memory_budget
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class Workspace:
+    job_id: str
+    root: Path
+    in_memory: bool
+    nbytes: int = 0
+
+    @property
+    def tmp(self) -> Path:
+        return self.root / 'tmp'
+
+    def stage_input(self, path: str) -> str:
+        """Where the converter should read `path` from; copied into RAM if in memory."""
+        if not self.in_memory:
+            return path
+        staged = self.root / 'input' / os.path.basename(path)
+        staged.parent.mkdir(exist_ok=True)
+        if os.path.isdir(path):
+            shutil.copytree(path, staged)
+        else:
+            shutil.copyfile(path, staged)
+        return str(staged)
+
+    def output_path(self, result_path: str) -> str:
+        """Where the converter should write the result destined for `result_path`."""
+        if not self.in_memory:
+            return result_path
+        output = self.root / 'output'
+        output.mkdir(exist_ok=True)
+        return str(output / os.path.basename(result_path))
+
+    def exhausted(self, error: Optional[BaseException] = None) -> bool:
+        """Whether a failure in this workspace may be the tmpfs having filled up."""
+        if not self.in_memory:
+            return False
+        if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+            return True
+        # external tools only report failure; look at what's left
+        try:
+            return shutil.disk_usage(self.root).free < MB
+        except OSError:
+            return False
+
+    def publish(self, output: str, result_path: str) -> None:
+        """Move a finished output to durable storage."""
+        if output != result_path:
+            os.makedirs(os.path.dirname(result_path), exist_ok=True)
+            shutil.move(output, result_path)
+
+    @contextmanager
+    def activate(self):
+        """Make this workspace visible to converters and tools run from the current context."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+_current: ContextVar[Optional[Workspace]] = ContextVar("workspace", default=None)
+
+
+def current_workspace() -> Optional[Workspace]:
+    return _current.get()
+
+
+def scratch_dir() -> Path:
+    """Directory for temporary files of the job running in this context."""
+    workspace = _current.get()
+    return workspace.tmp if workspace is not None else settings.TEMP_DIR
+
+
+class ScratchSpace:
+    """Hands out workspaces, keeping the RAM-backed ones under a shared cap."""
+
+    def __init__(self, root: Optional[Path] = None, capacity: Optional[int] = None):
+        self.root = Path(root or settings.SCRATCH_DIR)
+        self.capacity = settings.SCRATCH_MAX_BYTES if capacity is None else capacity
+        self.used = 0
+        self._lock = threading.Lock()
+        self._usable: Optional[bool] = None
+
+    @property
+    def usable(self) -> bool:
+        if self._usable is None:
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._usable = self.capacity > 0 and os.access(self.root, os.W_OK)
+            except OSError as e:
+                logger.info(f"Scratch directory {self.root} unavailable, workspaces use {settings.TEMP_DIR}: {str(e)}")
+                self._usable = False
+        return self._usable
+
+    def _claim(self, nbytes: int) -> bool:
+        if not self.usable:
+            return False
+        with self._lock:
+            if self.used + nbytes > self.capacity:
+                return False
+            try:
+                if shutil.disk_usage(self.root).free < nbytes:
+                    return False
+            except OSError:
+                return False
+            if not memory_budget.charge(nbytes):
+                return False
+            self.used += nbytes
+            return True
+
+    def _release(self, nbytes: int) -> None:
+        with self._lock:
+            self.used -= nbytes
+        memory_budget.discharge(nbytes)
+
+    def spill(self, workspace: Workspace) -> None:
+        """Move an in-memory workspace that ran out of room to TEMP_DIR, emptied."""
+        if not workspace.in_memory:
+            return
+        shutil.rmtree(workspace.root, ignore_errors=True)
+        self._release(workspace.nbytes)
+        workspace.in_memory = False
+        workspace.root = Path(tempfile.mkdtemp(prefix=f"job_{workspace.job_id}_", dir=settings.TEMP_DIR))
+        workspace.tmp.mkdir()
+
+    @contextmanager
+    def workspace(self, job_id: str, expected_size: int):
+        """A workspace for one job, removed with everything in it on exit.
+
+        Must be entered on the event loop: RAM-backed workspaces are charged
+        to the memory budget.
+        """
+        nbytes = expected_size + MB
+        in_memory = self._claim(nbytes)
+        base = self.root if in_memory else settings.TEMP_DIR
+        root = Path(tempfile.mkdtemp(prefix=f"job_{job_id}_", dir=base))
+        (root / 'tmp').mkdir()
+        if in_memory:
+            logger.info(f"Job {job_id} workspace in memory ({nbytes // MB}MB, {self.used // MB}/{self.capacity // MB}MB used)")
+        workspace = Workspace(job_id=job_id, root=root, in_memory=in_memory, nbytes=nbytes)
+        try:
+            yield workspace
+        finally:
+            shutil.rmtree(workspace.root, ignore_errors=True)
+            if workspace.in_memory:
+                self._release(nbytes)
+
+
+# module level scratch space instance
+scratch = ScratchSpace()
@@ -1,6 +1,6 @@
 from .user import User
-from .job import Job
+from .job import Job, JobHistory
 from .file import AuditLog
 from .token import TokenPayload
 
-__all__ = ["User", "Job", "AuditLog", "TokenPayload"]
+__all__ = ["User", "Job", "JobHistory", "AuditLog", "TokenPayload"]
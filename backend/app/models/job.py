@@ -1,11 +1,21 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional
+from sqlalchemy import Column, JSON, Index
 import uuid
 from datetime import datetime
 
 
 class Job(SQLModel, table=True):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # job listings page through created_at newest first (keyset), per user and status
+        Index("ix_jobs_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+        Index("ix_jobs_created", "created_at"),
+        # delta sync: jobs changed after a version
+        Index("ix_jobs_user_version", "user_id", "version"),
+        Index("ix_jobs_version", "version"),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="users.id")
@@ -13,6 +23,8 @@ class Job(SQLModel, table=True):
     output_filename: str
     input_format: str
     output_format: str
+    operation: str = Field(default="convert", sa_column_kwargs={"server_default": "convert"})
+    options: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     status: str = Field(default="pending")
     progress: int = Field(default=0)
     file_size: int = Field(default=0)
@@ -21,8 +33,38 @@ class Job(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    # bumped on every change by app.core.job_changes
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     user: Optional["User"] = Relationship(back_populates="jobs")
 
     def __repr__(self) -> str:  # pragma: no cover - trivial
         return f"<Job {self.input_filename} -> {self.output_filename} ({self.status})>"
+
+
+class JobHistory(SQLModel, table=True):
+    """Finished job moved out of `jobs` by app.core.job_archive."""
+    __tablename__ = "job_history"
+    __table_args__ = (
+        Index("ix_job_history_user_created", "user_id", "created_at"),
+        Index("ix_job_history_archived", "archived_at"),
+    )
+
+    id: uuid.UUID = Field(primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="users.id")
+    input_filename: str
+    output_filename: str
+    input_format: str
+    output_format: str
+    operation: str
+    status: str
+    file_size: int = Field(default=0)
+    error_message: Optional[str] = None
+    tool_used: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+    def __repr__(self) -> str:  # pragma: no cover - trivial
+        return f"<JobHistory {self.input_filename} -> {self.output_filename} ({self.status})>"
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import uuid
 from datetime import datetime
 
@@ -17,6 +17,7 @@ class JobCreate(JobBase):
 
 class JobRead(JobBase):
     id: uuid.UUID
+    operation: Optional[str] = "convert"
     status: str
     progress: int
     file_size: Optional[int] = None
@@ -25,6 +26,23 @@ class JobRead(JobBase):
     created_at: datetime
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    version: int = 0
+
+
+class JobStatusRequest(BaseModel):
+    ids: List[uuid.UUID]
+
+
+class BatchConversionItem(BaseModel):
+    fileId: Optional[str] = None  # from POST /processing/upload
+    filename: Optional[str] = None  # or a file stored by POST /uploads/
+    output_format: str
+    input_format: Optional[str] = None  # default: the file's extension
+    profile: Optional[str] = None
+
+
+class BatchConversionRequest(BaseModel):
+    items: List[BatchConversionItem]
 
 
 class JobUpdate(BaseModel):
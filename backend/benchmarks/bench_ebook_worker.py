@@ -0,0 +1,81 @@
+"""Per-book overhead of one-shot ebook-convert against a warm Calibre worker.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_ebook_worker [--books N] [--format epub] [book ...]
+
+Without books, N small generated text books are converted. Each book is
+converted once with a fresh `ebook-convert` process and once on a warm
+worker from app.core.ebook_pool; the difference per book is the start-up
+cost the pool saves. Worker start-up itself is reported separately.
+"""
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from typing import List
+
+from app.core.ebook_pool import EbookPool, convert_once
+
+
+def sample_books(workdir: Path, count: int) -> List[Path]:
+    books = []
+    for index in range(count):
+        path = workdir / f"book_{index}.txt"
+        chapters = [f"Chapter {c}\n\n" + ("Lorem ipsum dolor sit amet. " * 200) for c in range(1, 6)]
+        path.write_text(f"Sample Book {index}\n\n" + "\n\n".join(chapters), encoding='utf-8')
+        books.append(path)
+    return books
+
+
+def timed(convert, books: List[Path], workdir: Path, fmt: str, label: str) -> List[float]:
+    timings = []
+    for book in books:
+        output = workdir / f"{book.stem}_{label}.{fmt}"
+        start = time.perf_counter()
+        if not convert(str(book), str(output)):
+            raise RuntimeError(f"{label} conversion of {book.name} failed")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=10)
+    parser.add_argument('--format', default='epub')
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args(argv)
+    if not shutil.which('ebook-convert') or not shutil.which('calibre-debug'):
+        sys.exit("Calibre (ebook-convert and calibre-debug) is not installed")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        books = [Path(p) for p in args.paths] or sample_books(workdir, args.books)
+
+        once = timed(convert_once, books, workdir, args.format, 'once')
+
+        pool = EbookPool(size=1)
+        start = time.perf_counter()
+        pool.start()
+        if not pool.workers[0].wait_ready(120):
+            sys.exit("Calibre worker did not start")
+        startup = (time.perf_counter() - start) * 1000
+        try:
+            warm = timed(pool.convert, books, workdir, args.format, 'warm')
+        finally:
+            pool.stop()
+
+    print(f"{len(books)} book(s) -> {args.format}")
+    print(f"{'mode':<10} {'median ms':>10} {'mean ms':>10} {'total s':>9}")
+    for label, timings in (('one-shot', once), ('warm', warm)):
+        print(f"{label:<10} {statistics.median(timings):>10.0f} {statistics.mean(timings):>10.0f} {sum(timings) / 1000:>9.1f}")
+    saved = statistics.median(once) - statistics.median(warm)
+    print(f"worker start-up {startup:.0f} ms, saved per book {saved:.0f} ms, "
+          f"break-even after {startup / saved:.1f} book(s)" if saved > 0 else f"worker start-up {startup:.0f} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
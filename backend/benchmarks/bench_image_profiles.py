@@ -0,0 +1,65 @@
+"""Bytes saved against milliseconds spent for each image encoder profile.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_image_profiles [image ...]
+
+Without arguments a synthetic photo-like and a screenshot-like image are
+used. Savings and extra time are relative to the `fast` profile.
+"""
+import io
+import sys
+import time
+import statistics
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.core.image_profiles import PROFILES
+
+FORMATS = ['jpeg', 'webp', 'png']
+REPEATS = 3
+
+
+def synthetic_images() -> List[Tuple[str, Image.Image]]:
+    photo = Image.effect_mandelbrot((1600, 1200), (-2.0, -1.2, 1.0, 1.2), 64).convert('RGB')
+    noise = Image.effect_noise((1600, 1200), 24).convert('RGB')
+    photo = Image.blend(photo.filter(ImageFilter.GaussianBlur(3)), noise, 0.15)
+
+    screenshot = Image.new('RGB', (1600, 1200), 'white')
+    draw = ImageDraw.Draw(screenshot)
+    for row in range(0, 1200, 24):
+        draw.rectangle((0, row, 1600, row + 2), fill=(230, 230, 235))
+        draw.text((20, row + 6), 'Private Converter benchmark line %d' % row, fill=(20, 20, 20))
+    draw.rectangle((1200, 100, 1550, 400), fill=(40, 110, 200))
+    return [('photo', photo), ('screenshot', screenshot)]
+
+
+def encode(img: Image.Image, fmt: str, profile) -> Tuple[int, float]:
+    """Median encode time in ms and output size in bytes."""
+    timings = []
+    size = 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        prepared = profile.prepare(img, fmt)
+        buffer = io.BytesIO()
+        prepared.save(buffer, format=fmt.upper(), **profile.save_kwargs(fmt))
+        timings.append((time.perf_counter() - start) * 1000)
+        size = buffer.tell()
+    return size, statistics.median(timings)
+
+
+def main(paths: List[str]) -> None:
+    images = [(p, Image.open(p).convert('RGB')) for p in paths] or synthetic_images()
+    print(f"{'image':<12} {'format':<6} {'profile':<9} {'bytes':>10} {'saved':>7} {'ms':>8} {'+ms':>8}")
+    for name, img in images:
+        for fmt in FORMATS:
+            base_size, base_ms = encode(img, fmt, PROFILES['fast'])
+            for profile in PROFILES.values():
+                size, ms = encode(img, fmt, profile)
+                saved = 100.0 * (base_size - size) / base_size
+                print(f"{name[:12]:<12} {fmt:<6} {profile.name:<9} {size:>10} {saved:>6.1f}% {ms:>8.1f} {ms - base_ms:>+8.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,54 @@
+"""Test settings: a throwaway SQLite database and data directories.
+
+The environment is set before `app` is imported, since settings and the
+engines are created at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_root = tempfile.mkdtemp(prefix='file_converter_tests_')
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{_root}/test.sqlite3',
+    'UPLOAD_DIR': f'{_root}/uploads',
+    'RESULTS_DIR': f'{_root}/results',
+    'TEMP_DIR': f'{_root}/temp',
+    'CACHE_DIR': f'{_root}/cache',
+    'SCRATCH_DIR': f'{_root}/scratch',
+    'OFFICE_POOL_SIZE': '0',
+    'EBOOK_POOL_SIZE': '0',
+    'JOB_ARCHIVE_AFTER_DAYS': '0',
+    'JOB_HISTORY_RETENTION_DAYS': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope='session')
+def auth_headers(client):
+    r = client.post('/api/auth/login', json={
+        'email': settings.FIRST_SUPERUSER, 'password': settings.FIRST_SUPERUSER_PASSWORD,
+    })
+    assert r.status_code == 200, r.text
+    return {'Authorization': f"Bearer {r.json()['access']}"}
+
+
+@pytest.fixture
+def user(client):
+    from sqlmodel import Session
+    from app.core.db import engine
+    from app.crud import get_user_by_email
+    with Session(engine) as session:
+        return get_user_by_email(session, settings.FIRST_SUPERUSER)
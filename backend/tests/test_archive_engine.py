@@ -0,0 +1,76 @@
+import tarfile
+import zipfile
+
+import pytest
+
+from app.core import archive_engine
+from app.core.archive_engine import ArchiveLimitError, repack
+from app.core.config import settings
+
+LISTING = """7-Zip [64] 16.02
+
+Listing archive: a.7z
+
+--
+Path = a.7z
+Type = 7z
+Physical Size = 300
+
+----------
+Path = docs
+Size = 0
+Folder = +
+
+Path = docs/a.txt
+Size = 100
+Folder = -
+
+Path = docs/b.txt
+Size = 200
+Folder = -
+"""
+
+
+def _zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def test_repack_counts_entries_and_bytes(tmp_path):
+    source, target = tmp_path / 'in.zip', tmp_path / 'out.tar.gz'
+    _zip(source, {'a.txt': b'a' * 10, 'dir/b.txt': b'b' * 20})
+    assert repack(str(source), str(target)) == (2, 30)
+    with tarfile.open(target) as archive:
+        assert sorted(archive.getnames()) == ['a.txt', 'dir/b.txt']
+
+
+def test_repack_entry_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'ARCHIVE_MAX_ENTRIES', 2)
+    source, target = tmp_path / 'in.zip', tmp_path / 'out.tar'
+    _zip(source, {f'{n}.txt': b'x' for n in range(3)})
+    with pytest.raises(ArchiveLimitError):
+        repack(str(source), str(target))
+
+
+def test_repack_unpacked_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'ARCHIVE_MAX_UNPACKED', 1000)
+    source, target = tmp_path / 'in.zip', tmp_path / 'out.tar'
+    # compresses to a few bytes, expands past the limit
+    _zip(source, {'bomb.txt': b'\0' * 10_000})
+    with pytest.raises(ArchiveLimitError):
+        repack(str(source), str(target))
+
+
+def test_7z_listing_within_limits():
+    archive_engine._check_listing(LISTING)
+
+
+def test_7z_listing_over_limits(monkeypatch):
+    monkeypatch.setattr(settings, 'ARCHIVE_MAX_ENTRIES', 2)
+    with pytest.raises(ArchiveLimitError):
+        archive_engine._check_listing(LISTING)
+    monkeypatch.setattr(settings, 'ARCHIVE_MAX_ENTRIES', 3)
+    monkeypatch.setattr(settings, 'ARCHIVE_MAX_UNPACKED', 299)
+    with pytest.raises(ArchiveLimitError):
+        archive_engine._check_listing(LISTING)
@@ -0,0 +1,64 @@
+import time
+import uuid
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.audit import AuditLogger
+from app.core.db import async_engine, engine
+from app.models import AuditLog
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def _events(**filters):
+    with Session(engine) as session:
+        query = select(AuditLog)
+        for name, value in filters.items():
+            query = query.where(getattr(AuditLog, name) == value)
+        return session.exec(query).all()
+
+
+@pytest.mark.anyio
+async def test_flush_writes_buffered_events_in_batches(user):
+    logger = AuditLogger(capacity=10, batch_size=2)
+    resource = str(uuid.uuid4())
+    for n in range(5):
+        assert logger.record('test.flush', user.id, 'file', resource, n=n)
+    assert _events(resource_id=resource) == []
+    assert await logger.flush() == 5
+    assert sorted(event.details['n'] for event in _events(resource_id=resource)) == list(range(5))
+    assert await logger.flush() == 0
+    await async_engine.dispose()
+
+
+def test_overflow_policies():
+    newest = AuditLogger(capacity=2, overflow='drop_newest')
+    assert [newest.record('test.overflow', n=n) for n in range(3)] == [True, True, False]
+    assert [event['details']['n'] for event in newest._buffer] == [0, 1]
+    assert newest.dropped == 1
+
+    oldest = AuditLogger(capacity=2, overflow='drop_oldest')
+    assert all(oldest.record('test.overflow', n=n) for n in range(3))
+    assert [event['details']['n'] for event in oldest._buffer] == [1, 2]
+    assert oldest.dropped == 1
+
+
+def test_user_uploads_are_audited(client, auth_headers, user):
+    name = f'{uuid.uuid4()}.txt'
+    r = client.post('/api/uploads/', headers=auth_headers, files={'file': (name, b'hello', 'text/plain')})
+    assert r.status_code == 200, r.text
+    r = client.delete(f'/api/uploads/{name}', headers=auth_headers)
+    assert r.status_code == 200, r.text
+    # written by the app's background flush
+    for _ in range(50):
+        events = _events(resource_id=name)
+        if len(events) == 2:
+            break
+        time.sleep(0.1)
+    assert sorted(event.action for event in events) == ['file.delete', 'file.upload']
+    assert all(event.user_id == user.id and event.ip_address and event.user_agent for event in events)
+    assert all(event.details == {'filename': name, 'size': 5} for event in events)
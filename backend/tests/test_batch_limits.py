@@ -0,0 +1,77 @@
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import User
+
+
+@pytest.fixture
+def two_file_batches(monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_BATCH_FILES', 2)
+
+
+def _uploads():
+    return set(settings.UPLOAD_DIR.iterdir()) if settings.UPLOAD_DIR.exists() else set()
+
+
+def _files(count, data=b'hello'):
+    return [('files', (f'{n}.txt', data, 'text/plain')) for n in range(count)]
+
+
+def _file_id(client, auth_headers):
+    r = client.post('/api/processing/upload', headers=auth_headers,
+                    files={'file': ('a.png', b'not really a png', 'image/png')})
+    assert r.status_code == 200, r.text
+    return r.json()['fileId']
+
+
+def test_every_batch_endpoint_caps_the_count_with_413(client, auth_headers, two_file_batches):
+    before = _uploads()
+    r = client.post('/api/conversions/batch/', headers=auth_headers, files=_files(3),
+                    data={'output_format': 'md'})
+    assert r.status_code == 413, r.text
+
+    file_id = _file_id(client, auth_headers)
+    r = client.post('/api/conversions/batch/refs', headers=auth_headers,
+                    json={'items': [{'fileId': file_id, 'output_format': 'jpg'}] * 3})
+    assert r.status_code == 413, r.text
+
+    r = client.post('/api/processing/image/batch', headers=auth_headers,
+                    json={'inputs': [file_id] * 3, 'operations': [{'op': 'compress'}]})
+    assert r.status_code == 413, r.text
+
+    r = client.post('/api/processing/image/batch/upload', headers=auth_headers, files=_files(3),
+                    data={'operations': '[{"op": "compress"}]'})
+    assert r.status_code == 413, r.text
+    assert _uploads() == before
+
+
+def test_batch_upload_file_size_limit(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 4)
+    before = _uploads()
+    r = client.post('/api/conversions/batch/', headers=auth_headers, files=_files(2),
+                    data={'output_format': 'md'})
+    assert r.status_code == 413, r.text
+    assert _uploads() == before
+
+
+def test_batch_quota_limit(client, auth_headers, user):
+    with Session(engine) as session:
+        db_user = session.get(User, user.id)
+        quota, db_user.storage_quota = db_user.storage_quota, db_user.storage_used + 8
+        session.add(db_user)
+        session.commit()
+    try:
+        before = _uploads()
+        r = client.post('/api/conversions/batch/', headers=auth_headers, files=_files(2),
+                        data={'output_format': 'md'})
+        assert r.status_code == 413, r.text
+        assert r.json()['detail'] == 'Storage quota exceeded'
+        assert _uploads() == before
+    finally:
+        with Session(engine) as session:
+            db_user = session.get(User, user.id)
+            db_user.storage_quota = quota
+            session.add(db_user)
+            session.commit()
@@ -0,0 +1,44 @@
+import os
+import time
+
+from app.core.cache_prune import CachePruner, mark_used, prune
+from app.core.config import settings
+
+
+def _entry(root, name, size, age):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_prune_removes_least_recently_used_first(tmp_path):
+    oldest = _entry(tmp_path, 'aa/aa1', 100, 3000)
+    older = _entry(tmp_path, 'bb/bb1', 100, 2000)
+    old = _entry(tmp_path, 'cc/cc1', 100, 1000)
+    assert prune(tmp_path, '*/*', 300) == (0, 0)
+    # a hit on the oldest entry makes it the most recently used
+    mark_used(oldest)
+    assert prune(tmp_path, '*/*', 150) == (2, 200)
+    assert oldest.exists() and not older.exists() and not old.exists()
+
+
+def test_prune_spares_new_and_temporary_files(tmp_path):
+    fresh = _entry(tmp_path, 'aa/aa1', 100, 0)
+    partial = _entry(tmp_path, 'tm/tmpabc.webp', 100, 3000)
+    old = _entry(tmp_path, 'bb/bb1', 100, 3000)
+    assert prune(tmp_path, '*/*', 50) == (1, 100)
+    assert fresh.exists() and partial.exists() and not old.exists()
+
+
+def test_pruner_applies_each_cache_cap(monkeypatch):
+    thumbnails = settings.CACHE_DIR / 'thumbnails'
+    old = _entry(thumbnails, 'ab/abcdef/0_180.webp', 100, 3000)
+    kept = _entry(thumbnails, 'ab/abcdef/1_180.webp', 100, 1000)
+    monkeypatch.setattr(settings, 'THUMBNAIL_CACHE_MAX_BYTES', 150)
+    assert CachePruner(interval=0).run_once() == 100
+    assert not old.exists() and kept.exists()
+    monkeypatch.setattr(settings, 'THUMBNAIL_CACHE_MAX_BYTES', 0)
+    assert CachePruner(interval=0).run_once() == 0
@@ -0,0 +1,31 @@
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Job
+
+
+def _state():
+    uploads = set(settings.UPLOAD_DIR.iterdir()) if settings.UPLOAD_DIR.exists() else set()
+    with Session(engine) as session:
+        return uploads, session.exec(select(func.count()).select_from(Job)).one()
+
+
+def test_oversized_uploads_leave_nothing_behind(client, auth_headers, monkeypatch):
+    r = client.post('/api/processing/upload', headers=auth_headers,
+                    files={'file': ('big.txt', b'0123456789', 'text/plain')})
+    assert r.status_code == 200, r.text
+    file_id = r.json()['fileId']
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 4)
+    before = _state()
+
+    r = client.post('/api/conversions/upload/', headers=auth_headers,
+                    data={'fileId': file_id, 'input_format': 'txt', 'output_format': 'md'})
+    assert r.status_code == 413, r.text
+    assert _state() == before
+
+    r = client.post('/api/conversions/upload/', headers=auth_headers,
+                    files={'file': ('big.txt', b'0123456789', 'text/plain')},
+                    data={'input_format': 'txt', 'output_format': 'md'})
+    assert r.status_code == 413, r.text
+    assert _state() == before
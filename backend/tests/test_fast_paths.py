@@ -0,0 +1,55 @@
+import io
+import time
+
+from PIL import Image
+
+from app.core.converters import convert_fast, get_converter
+from app.core.fast_paths import get_fast_path, identity, markdown_to_text, text_to_markdown
+from app.core.inline import inline_tool
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def test_fast_path_selection():
+    assert get_fast_path('png', 'png') is identity
+    assert get_fast_path('jpeg', 'JPG') is identity
+    assert get_fast_path('txt', 'md') is text_to_markdown
+    assert get_fast_path('markdown', 'txt') is markdown_to_text
+    # pdf -> pdf is OCR, not a copy
+    assert get_fast_path('pdf', 'pdf') is None
+    assert get_fast_path('png', 'jpg') is None
+
+
+def test_transform_options_skip_the_identity_copy():
+    assert get_fast_path('png', 'png', {'profile': None}) is identity
+    assert get_fast_path('png', 'png', {'profile': 'smallest'}) is None
+    assert get_fast_path('txt', 'md', {'profile': 'smallest'}) is text_to_markdown
+    assert get_converter('png', 'png') is convert_fast
+    assert get_converter('png', 'png', {'profile': 'smallest'}) is not convert_fast
+    assert inline_tool('png', 'png') == 'fast'
+    assert inline_tool('png', 'png', {'profile': 'smallest'}) == 'pillow'
+
+
+def test_upload_runs_identity_inline_but_queues_a_profile(client, auth_headers):
+    files = {'file': ('a.png', _png(), 'image/png')}
+    r = client.post('/api/conversions/upload/', headers=auth_headers, files=files,
+                    data={'input_format': 'png', 'output_format': 'png'})
+    assert r.status_code == 200, r.text
+    assert r.json()['data']['status'] == 'completed'
+
+    r = client.post('/api/conversions/upload/', headers=auth_headers, files=files,
+                    data={'input_format': 'png', 'output_format': 'png', 'profile': 'smallest'})
+    assert r.status_code == 200, r.text
+    assert 'status' not in r.json()['data']
+    job_id = r.json()['data']['jobId']
+    # let the worker finish it before other tests watch the job counters
+    for _ in range(100):
+        job = client.get(f'/api/jobs/{job_id}', headers=auth_headers).json()
+        if job['status'] not in ('pending', 'processing'):
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'completed' and job['tool_used'] != 'fast'
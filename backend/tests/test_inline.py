@@ -0,0 +1,29 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.core.inline import InlineTooLargeError, convert_bytes
+
+
+def _png(width, height) -> bytes:
+    buf = io.BytesIO()
+    Image.new('L', (width, height)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def test_pixel_cap_is_checked_before_decoding(monkeypatch):
+    monkeypatch.setattr(settings, 'INLINE_MAX_PIXELS', 100 * 100)
+    result, tool = convert_bytes(_png(100, 100), 'png', 'webp')
+    assert tool == 'pillow' and result
+    with pytest.raises(InlineTooLargeError):
+        convert_bytes(_png(101, 100), 'png', 'webp')
+
+
+def test_inline_endpoint_answers_413_for_huge_images(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, 'INLINE_MAX_PIXELS', 1000)
+    r = client.post('/api/conversions/inline', headers=auth_headers,
+                    files={'file': ('a.png', _png(100, 100), 'image/png')},
+                    data={'input_format': 'png', 'output_format': 'webp'})
+    assert r.status_code == 413, r.text
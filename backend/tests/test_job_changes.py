@@ -0,0 +1,71 @@
+import uuid
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.core.job_changes import changes
+from app.models import Job
+
+
+def _job(user_id) -> Job:
+    return Job(user_id=user_id, input_filename='a.txt', output_filename='a.md',
+               input_format='txt', output_format='md')
+
+
+def test_commit_stamps_increasing_versions(user):
+    with Session(engine) as session:
+        first, second = _job(user.id), _job(user.id)
+        session.add(first)
+        session.commit()
+        session.add(second)
+        session.commit()
+        assert second.version > first.version
+    assert changes.watermark >= second.version
+    assert changes.user_version(user.id) >= second.version
+
+
+def test_flush_without_commit_releases_version(user):
+    before = changes.watermark
+    session = Session(engine)
+    session.add(_job(user.id))
+    session.flush()
+    assert changes.watermark == before  # held back while the version is in flight
+    session.close()
+    with Session(engine) as session:
+        job = _job(user.id)
+        session.add(job)
+        session.commit()
+        version = job.version
+    assert changes.watermark >= version > before
+
+
+def test_rollback_releases_version_without_moving_etags(user):
+    committed = changes.user_version(user.id)
+    with Session(engine) as session:
+        session.add(_job(user.id))
+        session.flush()
+        session.rollback()
+    assert changes.user_version(user.id) == committed
+    assert not changes._in_flight
+
+
+def test_delete_leaves_tombstone(user):
+    with Session(engine) as session:
+        job = _job(user.id)
+        session.add(job)
+        session.commit()
+        since = changes.watermark
+        session.delete(job)
+        session.commit()
+    assert job.id in changes.deleted_since(since, user.id)
+    assert job.id not in changes.deleted_since(since, uuid.uuid4())
+
+
+def test_token_round_trip_and_foreign_boot():
+    assert changes.parse_token(changes.token(42)) == 42
+    try:
+        changes.parse_token('deadbeef.1')
+    except Exception as e:
+        assert type(e).__name__ == 'CursorExpired'
+    else:
+        raise AssertionError('token from another run accepted')
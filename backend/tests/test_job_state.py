@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from sqlmodel import Session
+
+from app.core.db import async_engine, engine
+from app.core.job_state import JobStateWriter
+from app.models import Job
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def jobs(user):
+    created = [Job(user_id=user.id, input_filename=f'{n}.txt', output_filename=f'{n}.md',
+                   input_format='txt', output_format='md') for n in range(2)]
+    with Session(engine) as session:
+        for job in created:
+            session.add(job)
+        session.commit()
+        ids = [job.id for job in created]
+    yield ids
+    # connections belong to this test's event loop
+    await async_engine.dispose()
+
+
+def _status(job_id):
+    with Session(engine) as session:
+        return session.get(Job, job_id).status
+
+
+@pytest.mark.anyio
+async def test_updates_are_written_by_flush(jobs):
+    writer = JobStateWriter(interval_ms=0)
+    writer.update(jobs[0], status='processing')
+    writer.update(jobs[0], progress=40)
+    assert _status(jobs[0]) == 'pending'
+    assert await writer.flush() == {jobs[0]: 'processing'}
+    assert _status(jobs[0]) == 'processing'
+    assert await writer.flush() == {}
+
+
+@pytest.mark.anyio
+async def test_finish_leaves_finished_jobs_alone(jobs):
+    writer = JobStateWriter(interval_ms=0)
+    assert await writer.finish(jobs[0], status='cancelled') == 'cancelled'
+    assert await writer.finish(jobs[0], status='completed') == 'cancelled'
+    assert _status(jobs[0]) == 'cancelled'
+
+
+@pytest.mark.anyio
+async def test_finish_waits_for_a_concurrent_flush(jobs):
+    writer = JobStateWriter(interval_ms=0)
+    writer._lock = asyncio.Lock()
+    await writer._lock.acquire()
+    # a periodic flush queued on the lock ahead of finish takes finish's fields
+    periodic = asyncio.create_task(writer.flush())
+    await asyncio.sleep(0)
+    finish = asyncio.create_task(writer.finish(jobs[0], status='completed'))
+    await asyncio.sleep(0)
+    writer._lock.release()
+    assert (await periodic)[jobs[0]] == 'completed'
+    assert await finish == 'completed'
+    assert _status(jobs[0]) == 'completed'
+
+
+@pytest.mark.anyio
+async def test_failing_job_is_dropped_without_holding_others_back(jobs):
+    writer = JobStateWriter(interval_ms=0)
+    writer.max_retries = 2
+    writer.update(jobs[0], status='processing')
+    # NOT NULL column: this job can never be written
+    writer.update(jobs[1], input_filename=None)
+    with pytest.raises(Exception):
+        await writer.flush()
+    assert _status(jobs[0]) == 'pending'
+    # retried job by job: the good row goes through, the bad one is dropped
+    with pytest.raises(Exception):
+        await writer.flush()
+    assert _status(jobs[0]) == 'processing'
+    assert writer._pending == {} and writer._failures == {}
+    assert await writer.finish(jobs[1], status='completed') == 'completed'
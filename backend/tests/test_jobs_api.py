@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.models import Job
+
+
+@pytest.fixture
+def paged_jobs(user):
+    """Five jobs under a status of their own, one second apart, newest last."""
+    status = f'test-{uuid.uuid4().hex[:8]}'
+    start = datetime.utcnow() - timedelta(hours=1)
+    jobs = [Job(user_id=user.id, input_filename=f'{n}.txt', output_filename=f'{n}.md', input_format='txt',
+                output_format='md', status=status, created_at=start + timedelta(seconds=n)) for n in range(5)]
+    with Session(engine) as session:
+        session.add_all(jobs)
+        session.commit()
+        ids = [str(job.id) for job in jobs]
+    return status, ids
+
+
+def test_keyset_pages_cover_every_job_once(client, auth_headers, paged_jobs):
+    status, ids = paged_jobs
+    seen, cursor = [], None
+    while True:
+        params = {'status': status, 'limit': 2, **({'cursor': cursor} if cursor else {})}
+        r = client.get('/api/jobs/', headers=auth_headers, params=params)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        assert len(page['results']) <= 2
+        seen += [job['id'] for job in page['results']]
+        cursor = page['next']
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+
+def test_field_projection_keeps_cursor_fields(client, auth_headers, paged_jobs):
+    status, _ = paged_jobs
+    r = client.get('/api/jobs/', headers=auth_headers, params={'status': status, 'fields': 'status', 'limit': 1})
+    assert r.status_code == 200, r.text
+    assert set(r.json()['results'][0]) == {'id', 'created_at', 'version', 'status'}
+    r = client.get('/api/jobs/', headers=auth_headers, params={'fields': 'nope'})
+    assert r.status_code == 400
+    r = client.get('/api/jobs/', headers=auth_headers, params={'cursor': 'not-a-cursor'})
+    assert r.status_code == 400
+
+
+def test_etag_and_since(client, auth_headers, paged_jobs):
+    status, ids = paged_jobs
+    params = {'status': status}
+    r = client.get('/api/jobs/', headers=auth_headers, params=params)
+    etag, sync = r.headers['ETag'], r.json()['sync']
+    r = client.get('/api/jobs/', headers={**auth_headers, 'If-None-Match': etag}, params=params)
+    assert r.status_code == 304
+
+    with Session(engine) as session:
+        changed = session.get(Job, uuid.UUID(ids[1]))
+        changed.progress = 50
+        session.add(changed)
+        session.delete(session.get(Job, uuid.UUID(ids[3])))
+        session.commit()
+
+    r = client.get('/api/jobs/', headers={**auth_headers, 'If-None-Match': etag}, params=params)
+    assert r.status_code == 200 and r.headers['ETag'] != etag
+    r = client.get('/api/jobs/', headers=auth_headers, params={**params, 'since': sync})
+    assert r.status_code == 200, r.text
+    delta = r.json()
+    assert [job['id'] for job in delta['results']] == [ids[1]]
+    assert delta['deleted'] == [ids[3]]
+
+    r = client.get('/api/jobs/', headers=auth_headers, params={**params, 'since': delta['sync']})
+    assert r.json()['results'] == [] and r.json()['deleted'] == []
+
+
+def test_since_rejects_bad_tokens(client, auth_headers):
+    r = client.get('/api/jobs/', headers=auth_headers, params={'since': 'garbage'})
+    assert r.status_code == 400
+    r = client.get('/api/jobs/', headers=auth_headers, params={'since': 'previous-run.1'})
+    assert r.status_code == 410
+    r = client.get('/api/jobs/', headers=auth_headers, params={'since': 'x.1', 'cursor': 'abc'})
+    assert r.status_code == 400
@@ -0,0 +1,17 @@
+from app.core.memory_budget import MB, estimate_job_memory
+
+
+def test_directory_inputs_are_sized_by_their_files(tmp_path):
+    batch = tmp_path / 'batch'
+    (batch / 'nested').mkdir(parents=True)
+    for name in ('a.png', 'b.png', 'nested/c.png'):
+        (batch / name).write_bytes(b'x' * MB)
+    assert estimate_job_memory(str(batch), 'image', 'png') == 3 * MB * 2 + 64 * MB
+    # a PDF merge: a directory of source PDFs
+    assert estimate_job_memory(str(batch), 'pdf', 'pdf') == 3 * MB * 8 + 256 * MB
+
+
+def test_file_inputs_unchanged(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'x' * MB)
+    assert estimate_job_memory(str(path), 'txt', 'md') == MB * 2 + 64 * MB
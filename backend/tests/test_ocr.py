@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from app.core import ocr
+
+
+def test_runs_groups_consecutive_pages():
+    assert ocr._runs([1, 2, 3, 5, 7, 8]) == [(1, 3), (5, 5), (7, 8)]
+    assert ocr._runs([]) == []
+
+
+def test_pdf_to_text_only_ocrs_pages_without_a_text_layer(tmp_path, monkeypatch):
+    source, output = tmp_path / 'scan.pdf', tmp_path / 'scan.txt'
+    source.write_bytes(b'%PDF-1.4')
+    rendered = []
+
+    def rasterise(input_file, workdir, pages=None):
+        rendered.append(pages)
+        paths = []
+        for number in pages:
+            path = workdir / f'page-{number:02d}.png'
+            path.write_bytes(b'')
+            paths.append(path)
+        return paths
+
+    def ocr_page(page, preprocess=False):
+        base = tmp_path / f'ocr-{page.stem}'
+        base.with_suffix('.txt').write_text(f'ocr of {page.stem}', encoding='utf-8')
+        return base
+
+    monkeypatch.setattr(ocr, 'text_layer', lambda path: ['first\n', ' \n', 'third\n', ''])
+    monkeypatch.setattr(ocr, 'rasterise_pages', rasterise)
+    monkeypatch.setattr(ocr, 'ocr_page', ocr_page)
+    assert ocr.run_ocr(str(source), str(output))
+    assert rendered == [[2, 4]]
+    assert output.read_text(encoding='utf-8') == 'first\n\focr of page-02\fthird\n\focr of page-04'
+
+
+def test_pdf_to_text_with_full_text_layer_runs_no_ocr(tmp_path, monkeypatch):
+    source, output = tmp_path / 'doc.pdf', tmp_path / 'doc.txt'
+    source.write_bytes(b'%PDF-1.4')
+    monkeypatch.setattr(ocr, 'text_layer', lambda path: ['one', 'two'])
+    monkeypatch.setattr(ocr, 'rasterise_pages', lambda input_file, workdir, pages=None: [])
+
+    def no_ocr(page, preprocess=False):
+        raise AssertionError('OCR ran')
+
+    monkeypatch.setattr(ocr, 'ocr_page', no_ocr)
+    assert ocr.run_ocr(str(source), str(output))
+    assert Path(output).read_text(encoding='utf-8') == 'one\ftwo'
@@ -0,0 +1,41 @@
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+from app.core import pdf_engine
+
+CROP = {'x': 0, 'y': 0, 'width': 100, 'height': 100}
+PAGES = [
+    {'source': 'a', 'page': 0, 'rotate': 90},
+    {'source': 'a', 'page': 0, 'crop': CROP},
+    {'source': 'a', 'page': 0},
+    {'source': 'a', 'page': 1, 'rotate': 180},
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=300)
+    writer.add_blank_page(width=200, height=300).rotate(90)
+    path = tmp_path / 'a.pdf'
+    with open(path, 'wb') as out:
+        writer.write(out)
+    return {'a': path}
+
+
+def _layout(path):
+    return [(int(page.get('/Rotate', 0)), [float(v) for v in page.cropbox]) for page in PdfReader(path).pages]
+
+
+@pytest.mark.parametrize('merge', ['_merge_pypdf', '_merge_pikepdf'])
+def test_repeated_pages_are_independent(tmp_path, source, merge):
+    if merge == '_merge_pikepdf' and pdf_engine.pikepdf is None:
+        pytest.skip('pikepdf not installed')
+    output = tmp_path / 'out.pdf'
+    getattr(pdf_engine, merge)(source, str(output), PAGES)
+    assert _layout(output) == [
+        (90, [0, 0, 200, 300]),
+        (0, [0, 200, 100, 300]),
+        (0, [0, 0, 200, 300]),
+        (270, [0, 0, 200, 300]),
+    ]
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from app.core import tools
+from app.core.cpu_budget import CpuAllocation
+from app.core.memory_budget import MemoryReservation
+from app.core.tools import run_tool
+
+GB = 1024 * 1024 * 1024
+PROBE = ['sh', '-c', 'grep Cpus_allowed_list /proc/self/status; ulimit -v']
+
+
+def test_no_limits_no_wrapper_and_no_preexec_fn():
+    cmd, limits = tools._limits(['true'], {})
+    assert cmd == ['true']
+    assert limits['preexec_fn'] is None
+
+
+@pytest.mark.skipif(not (tools._wrapper('taskset') and tools._wrapper('prlimit')), reason='needs taskset and prlimit')
+def test_limits_applied_through_wrappers():
+    reservation = MemoryReservation(job_id='a', nbytes=GB)
+    with CpuAllocation(threads=1, cpus=[0]).activate(), reservation.activate():
+        cmd, limits = tools._limits(PROBE, {})
+        assert cmd[-len(PROBE):] == PROBE and len(cmd) > len(PROBE)
+        assert limits['preexec_fn'] is None
+        out = run_tool(PROBE).stdout.decode().split()
+    assert out[1] == '0'
+    assert int(out[2]) * 1024 == reservation.address_limit
+
+
+def test_preexec_fn_only_without_wrappers(monkeypatch):
+    monkeypatch.setattr(tools, '_wrapper', lambda name: None)
+    with CpuAllocation(threads=1, cpus=[0]).activate():
+        cmd, limits = tools._limits(PROBE, {})
+    assert cmd == PROBE
+    assert limits['preexec_fn'] is not None
+
+
+@pytest.mark.skipif(not tools._wrapper('taskset'), reason='needs taskset')
+def test_missing_tool_is_not_found_when_wrapped():
+    with CpuAllocation(threads=1, cpus=[0]).activate():
+        with pytest.raises(FileNotFoundError):
+            run_tool(['no-such-tool-' + str(os.getpid())])
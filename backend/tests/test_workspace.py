@@ -0,0 +1,42 @@
+import errno
+
+from app.core import workspace as workspace_module
+from app.core.config import settings
+from app.core.memory_budget import MemoryBudget
+from app.core.workspace import MB, ScratchSpace
+
+
+def test_in_memory_workspace_is_charged_to_the_memory_budget(tmp_path, monkeypatch):
+    budget = MemoryBudget(total=100 * MB)
+    monkeypatch.setattr(workspace_module, 'memory_budget', budget)
+    space = ScratchSpace(root=tmp_path / 'shm', capacity=50 * MB)
+    with space.workspace('a', 10 * MB) as workspace:
+        assert workspace.in_memory
+        assert budget.used == workspace.nbytes == space.used
+    assert budget.used == space.used == 0
+
+
+def test_workspace_on_disk_when_memory_budget_is_full(tmp_path, monkeypatch):
+    budget = MemoryBudget(total=100 * MB)
+    budget.used = 95 * MB
+    monkeypatch.setattr(workspace_module, 'memory_budget', budget)
+    space = ScratchSpace(root=tmp_path / 'shm', capacity=50 * MB)
+    with space.workspace('a', 10 * MB) as workspace:
+        assert not workspace.in_memory
+        assert workspace.root.parent == settings.TEMP_DIR
+    assert budget.used == 95 * MB
+
+
+def test_spill_moves_workspace_to_disk(tmp_path, monkeypatch):
+    budget = MemoryBudget(total=100 * MB)
+    monkeypatch.setattr(workspace_module, 'memory_budget', budget)
+    space = ScratchSpace(root=tmp_path / 'shm', capacity=50 * MB)
+    with space.workspace('a', 10 * MB) as workspace:
+        memory_root = workspace.root
+        assert workspace.exhausted(OSError(errno.ENOSPC, 'No space left on device'))
+        space.spill(workspace)
+        assert not workspace.in_memory and not memory_root.exists()
+        assert workspace.tmp.is_dir() and workspace.root.parent == settings.TEMP_DIR
+        assert budget.used == space.used == 0
+        assert not workspace.exhausted(OSError(errno.ENOSPC, 'No space left on device'))
+    assert not workspace.root.exists()